@@ -0,0 +1,157 @@
+"""
+Measures how much slower a command gets when it is recorded with `scl log`, for every logger backend that works on this machine.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_recording --repeat 20 --results recording.json
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .common import SRC_DIR, summarize, write_results, print_comparison
+from shell_command_logger.config import DEFAULT_CONFIG, config_to_parser, parser_to_text
+from shell_command_logger.logger import get_logger_backend_names
+from shell_command_logger.logger.python_logger import LoggerBasicPython
+
+SCL_SCRIPT = os.path.join(SRC_DIR, "scl")
+
+
+class Workload:
+    def __init__(self, name: str, command: List[str], output_bytes: int = 0) -> None:
+        self.name = name
+        self.command = command
+        # If set, the throughput is reported
+        self.output_bytes = output_bytes
+
+
+def get_workloads(temp_dir: str, throughput_bytes: int) -> List[Workload]:
+    large_file = os.path.join(temp_dir, "large-file.txt")
+    with open(large_file, "wb") as f:
+        line = b"The quick brown fox jumps over the lazy dog 0123456789\n"
+        f.write(line * (throughput_bytes // len(line)))
+    file_size = os.path.getsize(large_file)
+
+    return [
+        # Startup latency
+        Workload("true", ["true"]),
+        Workload("echo", ["echo", "hello world"]),
+        # Throughput
+        Workload("cat_large_file", ["cat", large_file], file_size),
+        Workload("yes_head", ["sh", "-c", f"yes | head -c {throughput_bytes}"], throughput_bytes),
+    ]
+
+
+def setup_backend(home_dir: str, backend_name: str) -> str:
+    """
+    Creates a configuration that uses the given backend. Returns the data directory
+    """
+    data_dir = os.path.join(home_dir, "data")
+    config_dir = os.path.join(home_dir, ".config", "shell-command-logger")
+    os.makedirs(config_dir, exist_ok=True)
+    config = DEFAULT_CONFIG._replace(output_dir=data_dir, backend_name=backend_name, add_readme=False)
+    with open(os.path.join(config_dir, "config"), "w") as f:
+        f.write(parser_to_text(config_to_parser(config)))
+    return data_dir
+
+
+def run(command: List[str], env: Optional[Dict[str, str]] = None) -> float:
+    start = time.perf_counter()
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    duration = time.perf_counter() - start
+    if result.returncode != 0:
+        raise Exception(f"Command {command} failed with code {result.returncode}")
+    return duration
+
+
+def clear_directory(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def benchmark_backend(backend_name: str, workloads: List[Workload], repeat: int, temp_dir: str) -> Optional[Dict[str, Any]]:
+    home_dir = os.path.join(temp_dir, f"home-{backend_name}")
+    data_dir = setup_backend(home_dir, backend_name)
+    env = dict(os.environ, HOME=home_dir)
+    scl_log = [sys.executable, SCL_SCRIPT, "log"]
+
+    # Backends, that do not work on this system (like the macOS backend on Linux), are skipped
+    try:
+        run(scl_log + ["true"], env)
+    except Exception:
+        return None
+
+    results: Dict[str, Any] = {}
+    for workload in workloads:
+        direct, wrapped, overhead = [], [], []
+        for _ in range(repeat):
+            # Alternate both variants, so that changes in the system load affect both of them
+            direct_time = run(workload.command)
+            wrapped_time = run(scl_log + workload.command, env)
+            clear_directory(data_dir)
+            direct.append(direct_time)
+            wrapped.append(wrapped_time)
+            overhead.append(wrapped_time - direct_time)
+
+        workload_results = {
+            "direct": summarize(direct),
+            "wrapped": summarize(wrapped),
+            "overhead": summarize(overhead),
+        }
+        if workload.output_bytes:
+            megabytes = workload.output_bytes / 1_000_000
+            workload_results["direct_mb_per_second"] = summarize([megabytes / x for x in direct])
+            workload_results["wrapped_mb_per_second"] = summarize([megabytes / x for x in wrapped])
+        results[workload.name] = workload_results
+    return results
+
+
+def print_backend_results(backend_name: str, results: Dict[str, Any]) -> None:
+    print(f"\nBackend: {backend_name}")
+    print(f"{'workload':<16} {'direct p50':>11} {'scl p50':>10} {'overhead p50':>13} {'p90':>9} {'p99':>9} {'MB/s direct':>12} {'MB/s scl':>10}")
+    for name, values in results.items():
+        line = f"{name:<16} {values['direct']['median'] * 1000:>9.1f}ms {values['wrapped']['median'] * 1000:>8.1f}ms"
+        line += f" {values['overhead']['median'] * 1000:>11.1f}ms {values['overhead']['p90'] * 1000:>7.1f}ms {values['overhead']['p99'] * 1000:>7.1f}ms"
+        if "direct_mb_per_second" in values:
+            line += f" {values['direct_mb_per_second']['median']:>12.1f} {values['wrapped_mb_per_second']['median']:>10.1f}"
+        print(line)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark the overhead of recording commands with `scl log`")
+    ap.add_argument("-r", "--repeat", type=int, default=20, help="how often each workload is run (default: 20)")
+    ap.add_argument("-b", "--backends", help="comma separated list of backends to test. Defaults to all backends")
+    ap.add_argument("--throughput-bytes", type=int, default=50_000_000, help="the amount of output generated by the throughput workloads (default: 50000000)")
+    ap.add_argument("-o", "--results", help="write the results as JSON to this file")
+    ap.add_argument("-c", "--compare", metavar="RESULTS_FILE", help="compare the results with an older result file")
+    args = ap.parse_args()
+
+    # The Python backend is not registered yet, but it should be measured as soon as it works
+    all_backends = get_logger_backend_names() + [LoggerBasicPython.name]
+    backends = [x.strip() for x in args.backends.split(",")] if args.backends else all_backends
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="scl-benchmark-") as temp_dir:
+        workloads = get_workloads(temp_dir, args.throughput_bytes)
+        for backend_name in backends:
+            print(f"Running benchmarks for backend {backend_name}")
+            backend_results = benchmark_backend(backend_name, workloads, args.repeat, temp_dir)
+            if backend_results is None:
+                print(f"Skipping backend {backend_name}, since it does not work on this system")
+            else:
+                results[backend_name] = backend_results
+                print_backend_results(backend_name, backend_results)
+
+    if args.results:
+        parameters = {"repeat": args.repeat, "backends": backends, "throughput_bytes": args.throughput_bytes}
+        write_results(args.results, "recording", parameters, results)
+    if args.compare:
+        print_comparison(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Times searching on synthetic data directories of different sizes.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_search --scales 1k,100k --results results.json
+"""
+import argparse
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from .common import time_call, write_results, print_results, print_comparison
+from .corpus import CorpusParameters, ensure_corpus
+from shell_command_logger.cli.search import populate_filter_arguments, apply_filters, filter_by_grep
+from shell_command_logger.config import DEFAULT_CONFIG, SclConfig, config_to_parser, parser_to_text, parse_config_file, sanitize_config
+from shell_command_logger.journal import rebuild_journal
+from shell_command_logger.replay import build_labels, format_command_builder
+from shell_command_logger.search import get_all_searchable_commands
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+# The arguments passed to `scl search` for each filter benchmark
+FILTERS = {
+    "status_code": ["-s", "0"],
+    "exclude_status_code": ["-S", "0"],
+    "user": ["-u", "alice"],
+    "host": ["--hosts", "kali"],
+    "errors": ["-e", "interrupted"],
+    "program": ["-p", "git", "curl"],
+    "arguments": ["-a", "error"],
+    "days": ["-d", "2022-03-01 00:00:00"],
+    "running": ["--running"],
+}
+
+
+def get_config(output_dir: str, metadata_journal: bool) -> SclConfig:
+    return sanitize_config(DEFAULT_CONFIG._replace(output_dir=output_dir, add_readme=False, metadata_journal=metadata_journal))
+
+
+def benchmark_config_loading(work_dir: str, repeat: int) -> Dict[str, Any]:
+    config_file = os.path.join(work_dir, "config")
+    with open(config_file, "w") as f:
+        f.write(parser_to_text(config_to_parser(DEFAULT_CONFIG._replace(output_dir=os.path.join(work_dir, "unused"), add_readme=False))))
+    return time_call(lambda: sanitize_config(parse_config_file(config_file)), repeat)
+
+
+def benchmark_scale(output_dir: str, recordings: int, repeat: int, grep_sample: int, label_sample: int) -> Dict[str, Any]:
+    ensure_corpus(output_dir, CorpusParameters(recordings))
+    results: Dict[str, Any] = {}
+
+    # Searching by reading every metadata file
+    file_config = get_config(output_dir, metadata_journal=False)
+    results["load_from_files"] = time_call(lambda: get_all_searchable_commands(file_config), repeat)
+
+    # Searching by reading the journal
+    results["journal_rebuild"] = time_call(lambda: rebuild_journal(output_dir), 1)
+    journal_config = get_config(output_dir, metadata_journal=True)
+    results["load_from_journal"] = time_call(lambda: get_all_searchable_commands(journal_config), repeat)
+
+    commands = get_all_searchable_commands(journal_config)
+    filter_parser = argparse.ArgumentParser()
+    populate_filter_arguments(filter_parser)
+    results["filters"] = {}
+    for name, arguments in FILTERS.items():
+        filter_args = filter_parser.parse_args(arguments)
+        results["filters"][name] = time_call(lambda: apply_filters(filter_args, commands), repeat)
+
+    # grep is started once per recording, so only a sample is used
+    grep_commands = commands[:grep_sample]
+    results["grep_output"] = time_call(lambda: filter_by_grep(grep_commands, "-q error"), repeat)
+    results["grep_output"]["recordings"] = len(grep_commands)
+    # The same with a single grep process at a time, to show the effect of running them in parallel
+    results["grep_output_serial"] = time_call(lambda: filter_by_grep(grep_commands, "-q error", jobs=1), repeat)
+    results["grep_output_serial"]["recordings"] = len(grep_commands)
+
+    label_files = [x.file_path for x in commands[:label_sample]]
+    format_function = format_command_builder(journal_config)
+    results["build_labels"] = time_call(lambda: build_labels(journal_config, format_function, label_files), repeat)
+    results["build_labels"]["recordings"] = len(label_files)
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark searching on synthetic data directories")
+    ap.add_argument("-s", "--scales", default="1k", help=f"comma separated list of corpus sizes. Supported values: {', '.join(SCALES)} (default: 1k)")
+    ap.add_argument("-w", "--work-dir", help="the directory to store the generated corpora in. Corpora are reused if they already exist. Defaults to a temporary directory")
+    ap.add_argument("-r", "--repeat", type=int, default=3, help="how often each measurement is repeated (default: 3)")
+    ap.add_argument("--grep-sample", type=int, default=1000, help="the number of recordings searched with grep (default: 1000)")
+    ap.add_argument("--label-sample", type=int, default=100_000, help="the maximum number of recordings to build labels for (default: 100000)")
+    ap.add_argument("-o", "--results", help="write the results as JSON to this file")
+    ap.add_argument("-c", "--compare", metavar="RESULTS_FILE", help="compare the results with an older result file")
+    args = ap.parse_args()
+
+    scales: List[str] = [x.strip().lower() for x in args.scales.split(",")]
+    for scale in scales:
+        if scale not in SCALES:
+            ap.error(f"Unknown scale '{scale}'")
+
+    with tempfile.TemporaryDirectory(prefix="scl-benchmark-") as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        results: Dict[str, Any] = {"config_loading": benchmark_config_loading(temp_dir, max(args.repeat, 100))}
+        for scale in scales:
+            print(f"Running benchmarks for {scale} recordings")
+            output_dir = os.path.join(work_dir, f"corpus-{scale}")
+            results[scale] = benchmark_scale(output_dir, SCALES[scale], args.repeat, args.grep_sample, args.label_sample)
+
+    print_results(results)
+    if args.results:
+        parameters = {"scales": scales, "repeat": args.repeat, "grep_sample": args.grep_sample, "label_sample": args.label_sample}
+        write_results(args.results, "search", parameters, results)
+    if args.compare:
+        print_comparison(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
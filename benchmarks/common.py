@@ -0,0 +1,107 @@
+"""
+Helpers shared by the benchmarks: timing, result files and comparing two result files.
+"""
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Makes `import shell_command_logger` work without installing the package
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+RESULTS_FORMAT_VERSION = 1
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Linear interpolation between the closest ranks
+    position = fraction * (len(sorted_values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    values = sorted(samples)
+    return {
+        "runs": len(values),
+        "min": values[0],
+        "median": statistics.median(values),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": values[-1],
+        "mean": statistics.fmean(values),
+    }
+
+
+def time_call(function: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    Calls the function `repeat` times and returns statistics about the durations in seconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SRC_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return result.stdout.decode().strip() if result.returncode == 0 else None
+    except FileNotFoundError:
+        return None
+
+
+def write_results(path: str, benchmark: str, parameters: Dict[str, Any], results: Dict[str, Any]) -> None:
+    data = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "benchmark": benchmark,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    # {"1k": {"filter": {"median": ...}}} -> {"1k/filter": {"median": ...}}
+    flat: Dict[str, Dict[str, Any]] = {}
+    for key, value in results.items():
+        if isinstance(value, dict) and "median" in value:
+            flat[prefix + key] = value
+        elif isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}/"))
+    return flat
+
+
+def print_comparison(old_path: str, new_results: Dict[str, Any], metric: str = "median") -> None:
+    """
+    Prints the change of each measurement compared to an older result file
+    """
+    with open(old_path, "r") as f:
+        old_results = _flatten(json.load(f)["results"])
+    print(f"\nComparison with {old_path} ({metric}):")
+    for name, new_value in _flatten(new_results).items():
+        old_value = old_results.get(name)
+        if old_value and old_value[metric] > 0:
+            ratio = new_value[metric] / old_value[metric]
+            print(f"  {name}: {old_value[metric]:.6f} -> {new_value[metric]:.6f} ({(ratio - 1) * 100:+.1f}%)")
+        else:
+            print(f"  {name}: {new_value[metric]:.6f} (new)")
+
+
+def print_results(results: Dict[str, Any], metric: str = "median") -> None:
+    for name, value in _flatten(results).items():
+        print(f"{name}: {value[metric]:.6f}s ({value['runs']} run(s))")
@@ -0,0 +1,142 @@
+"""
+Generates synthetic data directories, that look like they were created by `scl log`.
+Every recording consists of a metadata file, a log file in the `script` format and a timing file.
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import random
+import time
+from typing import List, NamedTuple
+
+PROGRAMS = [
+    "ls", "cat", "grep", "git", "make", "python3", "curl", "nmap", "ssh", "docker",
+    "find", "tar", "ping", "dig", "journalctl", "kubectl", "npm", "cargo", "gcc", "rsync",
+]
+USERS = ["alice", "bob", "root"]
+HOSTS = ["laptop", "build-server", "kali"]
+WORDS = ["error", "warning", "done", "connected", "open", "closed", "found", "/etc/passwd", "200 OK", "timeout"]
+# Written to the corpus directory. Contains the parameters, so that an existing corpus can be reused
+PARAMETERS_FILE_NAME = ".corpus-parameters.json"
+
+
+class CorpusParameters(NamedTuple):
+    recordings: int
+    programs: int = 10
+    # Average size of the command output. Sizes are exponentially distributed
+    mean_output_bytes: int = 2048
+    # Recordings are spread evenly over this many days before `end_date`
+    days: int = 365
+    # Fraction of commands with a non-zero status code
+    failure_rate: float = 0.1
+    seed: int = 0
+    end_date: str = "2022-06-01"
+
+
+def get_timestamp_filename(start: datetime, rng: random.Random) -> str:
+    # Same layout as recorder.get_timestamp_filename()
+    day = "abcdefg"[start.weekday()]
+    return f"{start.strftime('%Gw%V')}{day}_{start.strftime('%H%M%S')}_{rng.getrandbits(16):04x}"
+
+
+def _format_time(value: datetime) -> str:
+    # Same format as pretty_exec.current_timestamp()
+    return value.isoformat("Z", timespec="seconds")
+
+
+def _generate_output(rng: random.Random, size: int) -> bytes:
+    lines: List[str] = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+        lines.append(line)
+        length += len(line) + 2
+    return "\r\n".join(lines).encode()[:size]
+
+
+def generate_corpus(output_dir: str, parameters: CorpusParameters) -> None:
+    rng = random.Random(parameters.seed)
+    programs = PROGRAMS[:parameters.programs] + [f"tool{i}" for i in range(len(PROGRAMS), parameters.programs)]
+    end = datetime.fromisoformat(parameters.end_date).replace(tzinfo=timezone.utc)
+    spread_seconds = parameters.days * 24 * 60 * 60
+
+    for program in programs:
+        os.makedirs(os.path.join(output_dir, program), exist_ok=True)
+
+    for _ in range(parameters.recordings):
+        program = rng.choice(programs)
+        start = end - timedelta(seconds=rng.randrange(spread_seconds))
+        duration = int(rng.expovariate(1 / 30))
+        status_code = rng.choice([1, 2, 127]) if rng.random() < parameters.failure_rate else 0
+        command = [f"/usr/bin/{program}"] + [rng.choice(WORDS) for _ in range(rng.randint(0, 4))]
+        base_path = os.path.join(output_dir, program, get_timestamp_filename(start, rng))
+        while os.path.exists(base_path + ".json"):
+            # Name collision (same second and same random value)
+            base_path = os.path.join(output_dir, program, get_timestamp_filename(start, rng))
+
+        metadata = {
+            "command": command,
+            "user": rng.choice(USERS),
+            "hostname": rng.choice(HOSTS),
+            "start_time": _format_time(start),
+            "working_dir": "/home/user",
+            "end_time": _format_time(start + timedelta(seconds=duration)),
+            "error_message": None,
+            "status_code": status_code,
+        }
+        output = _generate_output(rng, int(rng.expovariate(1 / parameters.mean_output_bytes)))
+        header = f"Script started on {start.strftime('%Y-%m-%d %H:%M:%S+00:00')} [COMMAND=\"{' '.join(command)}\"]\n".encode()
+        footer = f"\nScript done on {start.strftime('%Y-%m-%d %H:%M:%S+00:00')} [COMMAND_EXIT_CODE=\"{status_code}\"]\n".encode()
+        metadata["output_bytes"] = len(header) + len(output) + len(footer)
+
+        with open(base_path + ".log", "wb") as f:
+            f.write(header + output + footer)
+        with open(base_path + ".time", "w") as f:
+            # One chunk per 4 KiB of output
+            for offset in range(0, len(output), 4096):
+                f.write(f"{rng.random():.6f} {min(4096, len(output) - offset)}\n")
+        with open(base_path + ".json", "w") as f:
+            json.dump(metadata, f)
+
+
+def ensure_corpus(output_dir: str, parameters: CorpusParameters) -> bool:
+    """
+    Generates the corpus, unless the directory already contains a corpus with the same parameters. Returns True if it was generated
+    """
+    parameters_file = os.path.join(output_dir, PARAMETERS_FILE_NAME)
+    try:
+        with open(parameters_file, "r") as f:
+            if json.load(f) == parameters._asdict():
+                return False
+    except FileNotFoundError:
+        pass
+
+    if os.path.exists(output_dir) and os.listdir(output_dir):
+        raise Exception(f"Directory '{output_dir}' is not empty and does not contain a corpus with the same parameters")
+    os.makedirs(output_dir, exist_ok=True)
+    generate_corpus(output_dir, parameters)
+    # Written last, so that an interrupted generation is not reused
+    with open(parameters_file, "w") as f:
+        json.dump(parameters._asdict(), f)
+    return True
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Generate a synthetic data directory for benchmarks")
+    ap.add_argument("output_dir", help="the directory to create. It must not exist or be empty")
+    ap.add_argument("-n", "--recordings", type=int, default=1000, help="the number of recordings (default: 1000)")
+    ap.add_argument("-p", "--programs", type=int, default=10, help="the number of distinct programs (default: 10)")
+    ap.add_argument("-s", "--mean-output-bytes", type=int, default=2048, help="the average size of the outputs in bytes (default: 2048)")
+    ap.add_argument("-d", "--days", type=int, default=365, help="the number of days the recordings are spread over (default: 365)")
+    ap.add_argument("--seed", type=int, default=0, help="the seed for the random number generator (default: 0)")
+    args = ap.parse_args()
+
+    parameters = CorpusParameters(args.recordings, args.programs, args.mean_output_bytes, args.days, seed=args.seed)
+    start = time.perf_counter()
+    ensure_corpus(args.output_dir, parameters)
+    print(f"Generated {args.recordings} recordings in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
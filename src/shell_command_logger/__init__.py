@@ -1,5 +1,8 @@
+import time
 import traceback
 from typing import Optional, Callable
+# Measured as early as possible: the package is imported before anything else happens. Stored in the timings of recordings
+PROCESS_START_TIME = time.monotonic()
 # pip dependency
 try:
     from termcolor import colored as _colored
@@ -1,13 +1,21 @@
+import hashlib
+import json
 import os
 import shlex
 import shutil
 import sys
+from typing import Optional
 # local files
+import shell_command_logger
 from shell_command_logger.list_manager import ListManager
-from shell_command_logger.main_file import get_binary_name_or_path
+from shell_command_logger.main_file import get_binary_name_or_path, get_python_main_file
+from shell_command_logger.backports import List, Tuple
 
 _CONFIG_FILE = os.path.expanduser("~/.config/shell-command-logger/aliases.txt")
 _DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(__file__), "default_aliases.txt")
+# The generated alias commands are cached, since they are created for every new shell. Checking all programs requires searching $PATH for each of them
+_CACHE_DIR = os.path.expanduser("~/.cache/shell-command-logger")
+_CACHE_VERSION = 1
 
 
 def check_program_name(program: str) -> None:
@@ -17,9 +25,9 @@ def check_program_name(program: str) -> None:
         raise Exception(f"Program '{program}' is not installed")
 
 
-def shell_alias(shell: str, program: str) -> str:
+def shell_alias(shell: str, program: str, scl: Optional[str] = None) -> str:
     # This allows to use aliases, even if 'scl' is not in $PATH
-    scl = shlex.quote(get_binary_name_or_path())
+    scl = scl or shlex.quote(get_binary_name_or_path())
 
     if shell in ["bash", "fish", "zsh"]:
         return f"alias {program}=\"{scl} log {program}\""
@@ -27,18 +35,84 @@ def shell_alias(shell: str, program: str) -> str:
         raise ValueError(f"Unknown shell '{shell}'. Supported are bash, fish and zsh")
 
 
-def print_text_to_source(shell: str) -> None:
+def print_text_to_source(shell: str, use_cache: bool = True) -> None:
     """
     Return the text that contains the alias commands for the given shell.
     The result should be passed to `source`.
     """
-    for program in ALIAS_MANAGER.get_read_only_list():
+    programs = ALIAS_MANAGER.get_read_only_list()
+    cache_key = get_alias_cache_key(shell, programs)
+    cached = _read_alias_cache(shell, cache_key) if use_cache else None
+    if cached:
+        lines, errors = cached
+    else:
+        lines, errors = create_alias_lines(shell, programs)
+        _write_alias_cache(shell, cache_key, lines, errors)
+
+    for line in lines:
+        print(line)
+    for error in errors:
+        # Print to stderr so that this will not be sourced but instea shown to the user
+        print(error, file=sys.stderr)
+
+
+def create_alias_lines(shell: str, programs: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Returns the alias commands and the error messages for programs, that can not be aliased
+    """
+    scl = shlex.quote(get_binary_name_or_path())
+    lines, errors = [], []
+    for program in programs:
         try:
             check_program_name(program)
-            print(shell_alias(shell, program))
+            lines.append(shell_alias(shell, program, scl))
         except Exception as ex:
-            # Print to stderr so that this will not be sourced but instea shown to the user
-            print(f"Error creating alias for '{program}':", ex, file=sys.stderr)
+            errors.append(f"Error creating alias for '{program}': {ex}")
+    return (lines, errors)
+
+
+def get_alias_cache_key(shell: str, programs: List[str]) -> str:
+    """
+    The alias commands depend on the alias list, which programs are installed in $PATH and where scl is installed.
+    Installing or removing a program changes the modification time of its directory, so that is checked instead of searching each program
+    """
+    path_directories = os.environ.get("PATH", "").split(os.pathsep)
+    path_mtimes = []
+    for directory in path_directories:
+        try:
+            path_mtimes.append(os.stat(directory).st_mtime_ns)
+        except OSError:
+            path_mtimes.append(None)
+    key_data = [_CACHE_VERSION, shell_command_logger.__version__, shell, programs, get_python_main_file(), path_directories, path_mtimes]
+    return hashlib.sha256(json.dumps(key_data).encode()).hexdigest()
+
+
+def _get_alias_cache_file(shell: str) -> str:
+    return os.path.join(_CACHE_DIR, f"aliases-{shell}.json")
+
+
+def _read_alias_cache(shell: str, cache_key: str) -> Optional[Tuple[List[str], List[str]]]:
+    try:
+        with open(_get_alias_cache_file(shell), "r") as f:
+            data = json.load(f)
+        if data.get("key") == cache_key:
+            return (data["lines"], data["errors"])
+    except Exception:
+        # A missing or broken cache is just created again
+        pass
+    return None
+
+
+def _write_alias_cache(shell: str, cache_key: str, lines: List[str], errors: List[str]) -> None:
+    cache_file = _get_alias_cache_file(shell)
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        with open(f"{cache_file}.{os.getpid()}.tmp", "w") as f:
+            json.dump({"key": cache_key, "lines": lines, "errors": errors}, f)
+        # Multiple shells may be started at the same time, so the file is replaced atomically
+        os.replace(f"{cache_file}.{os.getpid()}.tmp", cache_file)
+    except OSError as ex:
+        print(f"Error writing alias cache '{cache_file}': ", ex, file=sys.stderr)
 
 
 
@@ -0,0 +1,557 @@
+from datetime import datetime, timezone
+import hashlib
+import io
+import json
+import os
+import re
+import secrets
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from typing import BinaryIO, Iterable, Iterator, Optional
+import zipfile
+# local files
+from .dedup import get_output_digest
+from .journal import append_journal_events, build_record_event, get_recording_id_from_metadata_path
+from .search import Metadata, SearchableCommand, get_searchable_commands_from_directory, parse_metadata_dict
+from .storage import get_recording_extensions, get_recording_file_size, list_metadata_files, open_recording_file
+from .backports import Dict, List, Tuple
+
+# A bundle is a tar or zip archive containing recordings as normal files (`<program>/<name>.json`, `<program>/<name>.log`, ...).
+# Recordings stored in segments or in the deduplicated blob store are extracted while they are written.
+# Members are written in this order:
+# - BUNDLE_INFO_NAME: the format version and the time range of the exported recordings
+# - the recordings: the metadata file of each recording comes first, so that a reader knows which recording follows
+# - MANIFEST_NAME: the SHA-512 digest of every member in the format of `sha512sum`. The digests are computed while the members are written, so every file is only read once
+# - SIGNATURE_NAME: an optional detached gpg signature of the manifest
+BUNDLE_FORMAT_TAR = "tar"
+BUNDLE_FORMAT_TAR_GZ = "tar.gz"
+BUNDLE_FORMAT_ZIP = "zip"
+BUNDLE_FORMATS = [BUNDLE_FORMAT_TAR, BUNDLE_FORMAT_TAR_GZ, BUNDLE_FORMAT_ZIP]
+BUNDLE_INFO_NAME = "scl-bundle.json"
+MANIFEST_NAME = "SHA512SUMS"
+SIGNATURE_NAME = "SHA512SUMS.asc"
+BUNDLE_FORMAT_NAME = "scl-bundle"
+BUNDLE_FORMAT_VERSION = 1
+_BUFFER_SIZE = 1024 * 1024
+# Recording members look like <program>/<name>.<extension>. Directories starting with a dot are used by scl itself (like .blobs)
+_RECORDING_MEMBER_REGEX = re.compile(r"^([^./][^/]*)/([^./]+)(\.[A-Za-z0-9_]+)$")
+# Keys of imported recordings, so that importing the same recordings again skips them, even if they had to be renamed.
+# The key is the digest of the content of the recording: the metadata fields, that never change after a command finished, and the digest of the output.
+# The name is not part of it, so recordings renamed on another machine are recognized. Fields added later (like the output digest of `scl dedup` or timings) are left out.
+# The output is needed, since the metadata alone can be identical for short commands started in the same second.
+# Different recordings can still have the same key (like a health check, that runs twice in a second), so the index stores how many recordings with each key were imported.
+# It also stores the output digests of local recordings, that were computed to compare them with the bundle, so that they are only read once
+IMPORT_INDEX_FILE_NAME = ".import-index.json"
+_IMPORT_INDEX_VERSION = 3
+# Only a prefix of each key is stored. 128 bits are plenty to tell recordings apart.
+# The first half is the prefix of the digest of the metadata, so that the index shows, which recordings in a bundle may have been imported before
+_INDEX_DIGEST_LENGTH = 32
+# The files of recordings, that may already exist, are kept in memory up to this size until it is known, whether they are imported
+_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+class BundleException(Exception):
+    pass
+
+
+def get_bundle_format(path: str) -> str:
+    """
+    Guesses the format from the file name. Defaults to tar
+    """
+    if path.endswith(".zip"):
+        return BUNDLE_FORMAT_ZIP
+    elif path.endswith(".tar.gz") or path.endswith(".tgz"):
+        return BUNDLE_FORMAT_TAR_GZ
+    else:
+        return BUNDLE_FORMAT_TAR
+
+
+class _HashingReader:
+    """
+    Computes the digest of everything, that is read through it
+    """
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.hash = hashlib.sha512()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.hash.update(data)
+        return data
+
+
+class BundleWriter:
+    """
+    Writes members to an archive and remembers their digests for the manifest
+    """
+    def __init__(self) -> None:
+        # (member name, hex digest)
+        self.digests: List[Tuple[str, str]] = []
+
+    def add_file(self, name: str, f: BinaryIO, size: int, mtime: float) -> None:
+        reader = _HashingReader(f)
+        self._write_member(name, reader, size, mtime)
+        self.digests.append((name, reader.hash.hexdigest()))
+
+    def add_bytes(self, name: str, data: bytes, include_in_manifest: bool = True) -> None:
+        reader = _HashingReader(io.BytesIO(data))
+        self._write_member(name, reader, len(data), time.time())
+        if include_in_manifest:
+            self.digests.append((name, reader.hash.hexdigest()))
+
+    def get_manifest(self) -> bytes:
+        # Two spaces: the separator used by sha512sum for binary and text mode
+        return "".join(f"{digest}  {name}\n" for name, digest in self.digests).encode()
+
+    def _write_member(self, name: str, reader: _HashingReader, size: int, mtime: float) -> None:
+        raise Exception("Needs to be overwritten by subclass")
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "BundleWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class TarBundleWriter(BundleWriter):
+    def __init__(self, f: BinaryIO, compress: bool) -> None:
+        super().__init__()
+        # Stream mode ("w|") never seeks, so the output can also be a pipe
+        self.tar = tarfile.open(fileobj=f, mode="w|gz" if compress else "w|", format=tarfile.PAX_FORMAT, bufsize=_BUFFER_SIZE)
+
+    def _write_member(self, name: str, reader: _HashingReader, size: int, mtime: float) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        # Reads exactly `size` bytes and fails, if the file is shorter
+        self.tar.addfile(info, reader) # type: ignore
+
+    def close(self) -> None:
+        self.tar.close()
+
+
+class ZipBundleWriter(BundleWriter):
+    def __init__(self, f: BinaryIO) -> None:
+        super().__init__()
+        # Works with pipes too: the sizes and checksums are written after the data of each member
+        self.zip = zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def _write_member(self, name: str, reader: _HashingReader, size: int, mtime: float) -> None:
+        info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.file_size = size
+        with self.zip.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as member:
+            while chunk := reader.read(_BUFFER_SIZE):
+                member.write(chunk)
+
+    def close(self) -> None:
+        self.zip.close()
+
+
+def create_bundle_writer(f: BinaryIO, bundle_format: str) -> BundleWriter:
+    if bundle_format == BUNDLE_FORMAT_ZIP:
+        return ZipBundleWriter(f)
+    elif bundle_format in [BUNDLE_FORMAT_TAR, BUNDLE_FORMAT_TAR_GZ]:
+        return TarBundleWriter(f, compress=bundle_format == BUNDLE_FORMAT_TAR_GZ)
+    else:
+        raise BundleException(f"Unknown bundle format '{bundle_format}'. Supported formats: {', '.join(BUNDLE_FORMATS)}")
+
+
+def check_gpg_available() -> None:
+    if not shutil.which("gpg"):
+        raise BundleException("Signing and verifying bundles requires 'gpg'. Please install it and add it to your $PATH")
+
+
+def sign_manifest(manifest: bytes, gpg_key: Optional[str]) -> bytes:
+    """
+    Returns an ASCII armored detached signature of the manifest
+    """
+    check_gpg_available()
+    command = ["gpg", "--detach-sign", "--armor", "--output", "-"]
+    if gpg_key:
+        command += ["--local-user", gpg_key]
+    # stderr is passed through, so that gpg can ask for the passphrase
+    result = subprocess.run(command, input=manifest, stdout=subprocess.PIPE)
+    if result.returncode != 0:
+        raise BundleException(f"Signing the manifest with gpg failed with code {result.returncode}")
+    return result.stdout
+
+
+def _get_member_extensions(metadata_file: str) -> List[str]:
+    extensions = get_recording_extensions(metadata_file[:-len(".json")])
+    # The metadata comes first, the other files in a stable order
+    return [".json"] + sorted(x for x in extensions if x != ".json")
+
+
+def write_recording(output_dir: str, command: SearchableCommand, writer: BundleWriter) -> None:
+    metadata_file = command.file_path
+    base_path = metadata_file[:-len(".json")]
+    # program/name, also for recordings stored in segments
+    member_base_name = get_recording_id_from_metadata_path(output_dir, metadata_file)
+    mtime = command.metadata.end_time_utc.timestamp()
+    for extension in _get_member_extensions(metadata_file):
+        path = base_path + extension
+        with open_recording_file(path) as f:
+            writer.add_file(member_base_name + extension, f, get_recording_file_size(path), mtime)
+
+
+def export_bundle(output_dir: str, commands: Iterable[SearchableCommand], writer: BundleWriter, since: Optional[int], until: int,
+        sign: bool = False, gpg_key: Optional[str] = None) -> int:
+    """
+    Writes all recordings, that finished in the time range [since, until), followed by the manifest. Returns the number of exported recordings
+    """
+    info = {
+        "format": BUNDLE_FORMAT_NAME,
+        "version": BUNDLE_FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat("Z", timespec="seconds"),
+        "since": since,
+        "until": until,
+    }
+    writer.add_bytes(BUNDLE_INFO_NAME, json.dumps(info).encode())
+
+    count = 0
+    for command in commands:
+        if command.metadata.running:
+            continue
+        end_time = int(command.metadata.end_time_utc.timestamp())
+        if (since == None or end_time >= since) and end_time < until:
+            write_recording(output_dir, command, writer)
+            count += 1
+
+    manifest = writer.get_manifest()
+    writer.add_bytes(MANIFEST_NAME, manifest, include_in_manifest=False)
+    if sign:
+        writer.add_bytes(SIGNATURE_NAME, sign_manifest(manifest, gpg_key), include_in_manifest=False)
+    return count
+
+
+class ImportResult:
+    def __init__(self) -> None:
+        # The ids (like echo/2022w22g_123504_1144) of the new recordings in the data directory
+        self.imported: List[str] = []
+        # Recordings, that already existed
+        self.skipped = 0
+        # Recordings with the same name as a different recording in the data directory: id in the bundle -> new id
+        self.renamed: Dict[str, str] = {}
+
+
+class _StagedRecording:
+    def __init__(self, recording_id: str, target_id: str, metadata: dict, metadata_key: str, may_exist: bool) -> None:
+        self.recording_id = recording_id
+        self.target_id = target_id
+        self.metadata = metadata
+        self.metadata_key = metadata_key
+        # If a local recording has the same metadata, the files are spooled instead of written to the staging directory
+        self.may_exist = may_exist
+        self.extensions: List[str] = []
+        self.spooled_files: Dict[str, BinaryIO] = {}
+
+    def close_spooled_files(self) -> None:
+        for f in self.spooled_files.values():
+            f.close()
+        self.spooled_files.clear()
+
+
+def _get_metadata_key(metadata: Metadata) -> str:
+    values = [metadata.command, metadata.user, metadata.hostname, metadata.start_time_utc.isoformat(), metadata.end_time_utc.isoformat(),
+        metadata.working_dir, metadata.status_code, metadata.error_message]
+    return hashlib.sha512(json.dumps(values).encode()).hexdigest()
+
+
+def _get_content_key(metadata_key: str, output_digest: Optional[str]) -> str:
+    half_length = _INDEX_DIGEST_LENGTH // 2
+    return metadata_key[:half_length] + hashlib.sha512(f"{metadata_key}\n{output_digest or ''}".encode()).hexdigest()[:half_length]
+
+
+def _get_local_output_digest(command: SearchableCommand, recording_id: str, digest_cache: Dict[str, str]) -> Optional[str]:
+    """
+    The digests of recordings, that were not deduplicated, are stored in the cache, since their logs do not change
+    """
+    if command.metadata.output_digest:
+        return command.metadata.output_digest
+    if not command.metadata.output_recorded:
+        # Only the metadata was stored, there is no log file
+        return None
+    if recording_id in digest_cache:
+        return digest_cache[recording_id]
+
+    log_file = command.file_path[:-len(".json")] + ".log"
+    try:
+        if os.path.isfile(log_file):
+            with open(log_file, "rb") as f:
+                digest = get_output_digest(f)
+        else:
+            with open_recording_file(log_file) as source:
+                # Segment members can not be seeked
+                with tempfile.TemporaryFile() as f:
+                    shutil.copyfileobj(source, f, _BUFFER_SIZE)
+                    digest = get_output_digest(f)
+    except FileNotFoundError:
+        # For example a recording, that was deleted in the meantime
+        return None
+    digest_cache[recording_id] = digest
+    return digest
+
+
+def iterate_tar_members(f: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yields the name and contents of each file in the tar archive (optionally compressed). The contents need to be read before the next member is requested
+    """
+    # Stream mode: no seeking, members that are not read are skipped
+    with tarfile.open(fileobj=f, mode="r|*") as tar:
+        for info in tar:
+            if info.isfile():
+                yield (info.name, tar.extractfile(info)) # type: ignore
+
+
+def iterate_zip_members(path: str) -> Iterator[Tuple[str, BinaryIO]]:
+    # Zip files have their table of contents at the end, so they can not be read from a pipe
+    with zipfile.ZipFile(path) as zip_file:
+        for info in zip_file.infolist():
+            if not info.is_dir():
+                with zip_file.open(info) as member:
+                    yield (info.filename, member) # type: ignore
+
+
+def verify_manifest_signature(manifest: bytes, signature: bytes) -> None:
+    check_gpg_available()
+    with tempfile.NamedTemporaryFile(prefix="scl-", suffix=".asc") as signature_file:
+        signature_file.write(signature)
+        signature_file.flush()
+        # "-" reads the signed data from stdin
+        result = subprocess.run(["gpg", "--verify", signature_file.name, "-"], input=manifest)
+    if result.returncode != 0:
+        raise BundleException("The signature of the manifest is not valid")
+
+
+def _parse_manifest(manifest: bytes) -> Dict[str, str]:
+    digests: Dict[str, str] = {}
+    for line in manifest.decode().splitlines():
+        if line.strip():
+            digest, name = line.split("  ", 1)
+            digests[name] = digest
+    return digests
+
+
+def _check_bundle_info(data: bytes) -> None:
+    try:
+        info = json.loads(data)
+    except ValueError:
+        raise BundleException(f"'{BUNDLE_INFO_NAME}' is not valid JSON")
+    if info.get("format") != BUNDLE_FORMAT_NAME:
+        raise BundleException("The archive is not a bundle created by 'scl export'")
+    if info.get("version", 0) > BUNDLE_FORMAT_VERSION:
+        raise BundleException(f"The bundle has version {info.get('version')}, but only versions up to {BUNDLE_FORMAT_VERSION} are supported. Please update scl")
+
+
+def _load_import_index(index_file: str) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    Returns the number of imported recordings per key and the cached output digests of local recordings
+    """
+    try:
+        with open(index_file, "r") as f:
+            data = json.load(f)
+        if data.get("version") == _IMPORT_INDEX_VERSION:
+            return (data["keys"], data["local_digests"])
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        print(f"Error loading import index '{index_file}': ", ex, file=sys.stderr)
+    return ({}, {})
+
+
+def _save_import_index(index_file: str, key_counts: Dict[str, int], local_digests: Dict[str, str]) -> None:
+    try:
+        with open(f"{index_file}.tmp", "w") as f:
+            json.dump({"version": _IMPORT_INDEX_VERSION, "keys": key_counts, "local_digests": local_digests}, f, sort_keys=True)
+        os.replace(f"{index_file}.tmp", index_file)
+    except OSError as ex:
+        # Without the index, renamed recordings would be imported again the next time. Everything else still works
+        print(f"Error saving import index '{index_file}': ", ex, file=sys.stderr)
+
+
+def _copy_and_hash(source: BinaryIO, destination: BinaryIO) -> str:
+    digest = hashlib.sha512()
+    while chunk := source.read(_BUFFER_SIZE):
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
+
+
+def _get_new_recording_id(recording_id: str, random_bytes: int, used_ids: set) -> str:
+    # Keep the time stamp and only replace the random part of the name (see recorder.get_timestamp_filename())
+    prefix = recording_id.rsplit("_", 1)[0] if "_" in os.path.basename(recording_id) else recording_id
+    while True:
+        new_id = f"{prefix}_{secrets.token_hex(random_bytes)}"
+        if new_id not in used_ids:
+            return new_id
+
+
+def import_bundle(output_dir: str, members: Iterable[Tuple[str, BinaryIO]], file_name_random_bytes: int, update_journal: bool, verify_signature: bool = False) -> ImportResult:
+    """
+    Imports the recordings from a bundle, that was created by `export_bundle()`.
+    Members are hashed while they are copied into a staging directory. Nothing is added to the data directory, until all digests match the manifest.
+    Recordings with the same content as a recording in the data directory (see IMPORT_INDEX_FILE_NAME) are skipped, no matter what they are called.
+    Each existing recording only causes one recording in the bundle to be skipped
+    """
+    used_ids = set(get_recording_id_from_metadata_path(output_dir, x) for x in list_metadata_files(output_dir))
+    # The output digests of local recordings are only computed, if the rest of the metadata matches a recording in the bundle
+    local_by_metadata_key: Dict[str, List[SearchableCommand]] = {}
+    for command in get_searchable_commands_from_directory(output_dir, update_journal, create_journal=False):
+        local_by_metadata_key.setdefault(_get_metadata_key(command.metadata), []).append(command)
+    index_file = os.path.join(output_dir, IMPORT_INDEX_FILE_NAME)
+    imported_counts, cached_digests = _load_import_index(index_file)
+    imported_metadata_keys = set(x[:_INDEX_DIGEST_LENGTH // 2] for x in imported_counts)
+    # Only digests of recordings, that still exist, are kept in the index
+    local_digests = {x: y for x, y in cached_digests.items() if x in used_ids}
+    # key -> number of recordings in this bundle. Added to the index, after the import succeeded
+    bundle_counts: Dict[str, int] = {}
+    # key -> number of recordings in this bundle, that were skipped
+    skipped_counts: Dict[str, int] = {}
+    result = ImportResult()
+    # id in the bundle -> staged recording
+    staged: Dict[str, _StagedRecording] = {}
+    # The recording, whose files are read right now. It is checked for duplicates, when all its files are staged
+    current: Optional[_StagedRecording] = None
+
+    def count_existing(key: str, metadata_key: str) -> int:
+        local_count = 0
+        for command in local_by_metadata_key.get(metadata_key, []):
+            recording_id = get_recording_id_from_metadata_path(output_dir, command.file_path)
+            if _get_content_key(metadata_key, _get_local_output_digest(command, recording_id, local_digests)) == key:
+                local_count += 1
+        # Imported recordings may have been deleted locally since
+        return max(local_count, imported_counts.get(key, 0))
+
+    def finish_recording(staged_recording: _StagedRecording) -> None:
+        try:
+            output_digest = None
+            if ".log" in staged_recording.spooled_files:
+                output_digest = get_output_digest(staged_recording.spooled_files[".log"])
+            elif ".log" in staged_recording.extensions:
+                with open(os.path.join(staging_dir, staged_recording.target_id + ".log"), "rb") as log:
+                    output_digest = get_output_digest(log)
+            key = _get_content_key(staged_recording.metadata_key, output_digest)
+            bundle_counts[key] = bundle_counts.get(key, 0) + 1
+            if skipped_counts.get(key, 0) < count_existing(key, staged_recording.metadata_key):
+                skipped_counts[key] = skipped_counts.get(key, 0) + 1
+                del staged[staged_recording.recording_id]
+                used_ids.discard(staged_recording.target_id)
+                result.renamed.pop(staged_recording.recording_id, None)
+                for extension in staged_recording.extensions + [".json"]:
+                    if extension not in staged_recording.spooled_files:
+                        os.remove(os.path.join(staging_dir, staged_recording.target_id + extension))
+                result.skipped += 1
+            else:
+                for extension, spooled_file in staged_recording.spooled_files.items():
+                    spooled_file.seek(0)
+                    with open(os.path.join(staging_dir, staged_recording.target_id + extension), "wb") as staged_file:
+                        shutil.copyfileobj(spooled_file, staged_file, _BUFFER_SIZE)
+        finally:
+            staged_recording.close_spooled_files()
+    # member name -> digest of the data, that was read
+    member_digests: Dict[str, str] = {}
+    manifest: Optional[bytes] = None
+    signature: Optional[bytes] = None
+    is_bundle = False
+
+    # Dot directories are ignored when searching the data directory. Being in the data directory makes moving the files a cheap rename
+    staging_dir = tempfile.mkdtemp(prefix=".import-", dir=output_dir)
+    try:
+        for name, f in members:
+            if name == MANIFEST_NAME:
+                manifest = f.read()
+                continue
+            elif name == SIGNATURE_NAME:
+                signature = f.read()
+                continue
+            elif name == BUNDLE_INFO_NAME:
+                data = f.read()
+                member_digests[name] = hashlib.sha512(data).hexdigest()
+                _check_bundle_info(data)
+                is_bundle = True
+                continue
+            elif not is_bundle:
+                raise BundleException(f"The archive is not a bundle created by 'scl export': '{BUNDLE_INFO_NAME}' needs to be the first file")
+
+            match = _RECORDING_MEMBER_REGEX.match(name)
+            if not match:
+                raise BundleException(f"Unexpected file in bundle: '{name}'")
+            recording_id = f"{match.group(1)}/{match.group(2)}"
+            extension = match.group(3)
+
+            if extension == ".json":
+                if current:
+                    finish_recording(current)
+                data = f.read()
+                try:
+                    metadata = json.loads(data)
+                    metadata_key = _get_metadata_key(parse_metadata_dict(metadata))
+                except Exception:
+                    raise BundleException(f"Invalid metadata file in bundle: '{name}'")
+                target_id = recording_id
+                if recording_id in used_ids:
+                    target_id = _get_new_recording_id(recording_id, file_name_random_bytes, used_ids)
+                    result.renamed[recording_id] = target_id
+                used_ids.add(target_id)
+                may_exist = metadata_key in local_by_metadata_key or metadata_key[:_INDEX_DIGEST_LENGTH // 2] in imported_metadata_keys
+                current = staged[recording_id] = _StagedRecording(recording_id, target_id, metadata, metadata_key, may_exist)
+                os.makedirs(os.path.join(staging_dir, match.group(1)), exist_ok=True)
+                with open(os.path.join(staging_dir, target_id + extension), "wb") as staged_file:
+                    staged_file.write(data)
+                member_digests[name] = hashlib.sha512(data).hexdigest()
+            elif current and current.recording_id == recording_id:
+                if current.may_exist:
+                    # Only written to the staging directory, if the recording is imported (or if it is too large to keep it in memory)
+                    spooled_file = current.spooled_files[extension] = tempfile.SpooledTemporaryFile(_SPOOL_SIZE, dir=staging_dir) # type: ignore
+                    member_digests[name] = _copy_and_hash(f, spooled_file)
+                else:
+                    with open(os.path.join(staging_dir, current.target_id + extension), "wb") as staged_file:
+                        member_digests[name] = _copy_and_hash(f, staged_file)
+                current.extensions.append(extension)
+            else:
+                raise BundleException(f"'{name}' comes before the metadata file of its recording")
+
+        if current:
+            finish_recording(current)
+        if manifest is None:
+            raise BundleException(f"The bundle has no '{MANIFEST_NAME}' file. It may be truncated")
+        expected_digests = _parse_manifest(manifest)
+        for name, digest in member_digests.items():
+            if expected_digests.get(name) != digest:
+                raise BundleException(f"The checksum of '{name}' does not match the manifest. The bundle is damaged or was modified")
+        if verify_signature:
+            if signature is None:
+                raise BundleException(f"The bundle has no signature ('{SIGNATURE_NAME}')")
+            verify_manifest_signature(manifest, signature)
+
+        events = []
+        for staged_recording in staged.values():
+            program = os.path.dirname(staged_recording.target_id)
+            os.makedirs(os.path.join(output_dir, program), exist_ok=True)
+            # The metadata file is moved last, since recordings are found by their metadata files
+            for extension in staged_recording.extensions + [".json"]:
+                os.replace(os.path.join(staging_dir, staged_recording.target_id + extension), os.path.join(output_dir, staged_recording.target_id + extension))
+            events.append(build_record_event(staged_recording.target_id, staged_recording.metadata))
+            result.imported.append(staged_recording.target_id)
+
+        # All recordings are added to the journal and the index at once
+        if update_journal:
+            append_journal_events(output_dir, events)
+        for key, count in bundle_counts.items():
+            # Recordings in the bundle, that were skipped, are not imported again either
+            imported_counts[key] = max(imported_counts.get(key, 0), count)
+        _save_import_index(index_file, imported_counts, local_digests)
+    finally:
+        if current:
+            current.close_spooled_files()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return result
@@ -19,6 +19,7 @@ def populate_agrument_parser(ap) -> None:
     mutex.add_argument("-a", "--add", nargs="+", help="add the given programs to the alias list")
     mutex.add_argument("-d", "--delete", nargs="+", help="delete the given programs from the alias list")
     mutex.add_argument("--reset", "--defaults", action="store_true", help="reset the alias list back to the default value")
+    ap.add_argument("--no-cache", action="store_true", help="with --print: check all programs again instead of using the cached alias commands")
 
 
 def subcommand_main(args) -> int:
@@ -28,7 +29,7 @@ def subcommand_main(args) -> int:
     """
     if args.print:
         shell = args.print
-        print_text_to_source(shell)
+        print_text_to_source(shell, use_cache=not args.no_cache)
     elif args.set is not None:
         with ALIAS_MANAGER as programs_wrapper:
             programs_wrapper.list = args.set
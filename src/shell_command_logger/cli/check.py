@@ -3,6 +3,7 @@ import subprocess
 # local files
 from shell_command_logger import print_color
 from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.selector import BUILTIN_SELECTOR
 
 SUBCOMMAND_NAMES = ["check"]
 ARG_PARSER_OPTIONS = {
@@ -28,6 +29,7 @@ def subcommand_main(args) -> int:
     checker.check_binary("grep", False, "searching command output")
     checker.check_python_package("termcolor", "termcolor", False, "colored output")
     checker.check_python_package("python-dateutil", "dateutil", False, "better date parsing")
+    checker.check_python_package("pyarrow", "pyarrow", False, "exporting metadata as Parquet files")
 
     # Load the config as late as possible, since it may cause an exception
     scl_config = sanitize_config(load_config())
@@ -70,6 +72,9 @@ class DependencyChecker:
 
     def check_interactive_selection(self, command: str, required: bool, reason: str) -> None:
         print(f"Command for interactive selection ({command}) ", end="")
+        if command.strip() == BUILTIN_SELECTOR:
+            print_color("is the built-in selector", "green", bold=required)
+            return
         try:
             correct_choice = b"correct choice"
             input_bytes = b"Please select '" + correct_choice + b"' from the choices offered:\nDo not select me\n" + correct_choice + b"\nAnother bad choice"
@@ -0,0 +1,44 @@
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.journal import append_journal_events, build_move_event
+from shell_command_logger.segment import compact_recordings
+
+SUBCOMMAND_NAMES = ["compact"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command packs old recordings into one segment file per program and week. This reduces the number of files in the data directory, which speeds up searches and backups. Replay and search work with segment files just like with normal files",
+    "help": "pack old recordings into segment files",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-o", "--older-than", metavar="DAYS", type=float, default=7, help="only pack recordings that finished at least DAYS days ago (default: 7)")
+    ap.add_argument("-n", "--dry-run", action="store_true", help="only show what would be packed, do not modify any files")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    if args.older_than < 0:
+        print_color("The value of --older-than can not be negative", "red", bold=True)
+        return 1
+
+    scl_config = sanitize_config(load_config())
+    results = compact_recordings(scl_config.output_dir, args.older_than * 24 * 60 * 60, dry_run=args.dry_run)
+
+    verb = "Would pack" if args.dry_run else "Packed"
+    for result in results:
+        print(f"{verb} {len(result.recordings)} recording(s) ({result.file_count} files, {result.byte_count} bytes) into {result.segment_file}")
+
+    if not results:
+        print("No recordings to pack")
+    elif scl_config.metadata_journal and not args.dry_run:
+        events = [build_move_event(scl_config.output_dir, x.segment_file, x.recordings) for x in results]
+        append_journal_events(scl_config.output_dir, events)
+
+    # By default return 0 (success)
+    return 0
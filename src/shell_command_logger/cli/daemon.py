@@ -0,0 +1,51 @@
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.daemon import REQUEST_PING, REQUEST_STOP, DaemonException, get_daemon_socket, request_daemon, run_daemon
+
+SUBCOMMAND_NAMES = ["daemon"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command starts a daemon, that keeps the metadata of all recordings in memory and answers queries over a Unix socket in the data directory. While it is running, 'scl search', 'scl stats', 'scl timeline' and 'scl replay' ask the daemon instead of reading the data directory. If it is not running, they read the data directory as usual",
+    "help": "keep the metadata in memory to speed up searches",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-i", "--interval", type=float, default=2, metavar="SECONDS", help="how often to check the data directory for changes (default: %(default)s). With the metadata journal new recordings are also picked up on every query")
+    mutex = ap.add_mutually_exclusive_group()
+    mutex.add_argument("--status", action="store_true", help="show if the daemon is running")
+    mutex.add_argument("--stop", action="store_true", help="stop the running daemon")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+
+    if args.status or args.stop:
+        try:
+            header, _ = request_daemon(scl_config.output_dir, REQUEST_STOP if args.stop else REQUEST_PING)
+        except (OSError, ValueError, DaemonException) as ex:
+            print_color(f"The daemon is not running ({get_daemon_socket(scl_config.output_dir)}: {ex})", "red", bold=True)
+            return 1
+        if args.stop:
+            print(f"Stopped the daemon with pid {header.get('pid')}")
+        else:
+            print(f"The daemon is running with pid {header.get('pid')} and knows {header.get('recordings')} recording(s)")
+        return 0
+
+    if args.interval <= 0:
+        print_color("The interval needs to be positive", "red", bold=True)
+        return 1
+    try:
+        run_daemon(scl_config.output_dir, scl_config.metadata_journal, args.interval)
+    except (DaemonException, OSError) as ex:
+        print_color(f"Daemon failed: {ex}", "red", bold=True)
+        return 1
+
+    # By default return 0 (success)
+    return 0
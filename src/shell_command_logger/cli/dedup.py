@@ -0,0 +1,40 @@
+# import the code from this package
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.dedup import collect_garbage, deduplicate_all
+from shell_command_logger.recorder import update_metadata_file
+
+SUBCOMMAND_NAMES = ["dedup"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command stores identical command outputs only once. New recordings are deduplicated automatically, if the 'deduplicate-output' setting is enabled. This command can be used to deduplicate existing recordings and to delete stored outputs, that are no longer used by any recording",
+    "help": "deduplicate outputs and delete unused outputs",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("--gc", action="store_true", help="only delete stored outputs, that are no longer referenced by any recording")
+    ap.add_argument("-n", "--dry-run", action="store_true", help="only show what would be done, do not modify any files")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+
+    if not args.gc:
+        digests = deduplicate_all(scl_config.output_dir, dry_run=args.dry_run)
+        if not args.dry_run:
+            for metadata_file, digest in digests.items():
+                update_metadata_file(scl_config, metadata_file, {"output_digest": digest})
+        verb = "Would deduplicate" if args.dry_run else "Deduplicated"
+        print(f"{verb} {len(digests)} output(s)")
+
+    count, size = collect_garbage(scl_config.output_dir, dry_run=args.dry_run)
+    verb = "Would delete" if args.dry_run else "Deleted"
+    print(f"{verb} {count} unused stored output(s) ({size} bytes)")
+
+    # By default return 0 (success)
+    return 0
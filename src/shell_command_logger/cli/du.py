@@ -0,0 +1,62 @@
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.disk_usage import get_disk_usage
+from shell_command_logger.stats import format_size
+from shell_command_logger.cli.stats import print_table
+from ..backports import Dict, List, Tuple
+
+SUBCOMMAND_NAMES = ["du", "disk-usage"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command shows how much disk space is used by the recordings of each program and each week, as well as the largest recordings. Results are cached per directory, so only changed directories need to be scanned again",
+    "help": "show the disk usage of the recordings",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-n", "--top", type=int, default=10, help="the number of largest recordings to show (default: 10)")
+    ap.add_argument("--no-cache", action="store_true", help="scan all directories and do not read or write the cache")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    if args.top < 0:
+        print_color("The value of --top can not be negative", "red", bold=True)
+        return 1
+
+    scl_config = sanitize_config(load_config())
+    usage = get_disk_usage(scl_config.output_dir, args.top, use_cache=not args.no_cache)
+
+    print_usage_table(["program", "files", "size"], usage.programs, sort_by_size=True)
+    print()
+    # The journal, indexes, deduplicated outputs, plain text copies, etc
+    print_usage_table(["internal", "files", "size"], usage.internal, sort_by_size=True)
+    print()
+    print_usage_table(["week", "recordings", "size"], usage.weeks, sort_by_size=False)
+    if usage.largest:
+        print()
+        rows = [["size", "recording"]]
+        rows += [[format_size(size), path] for size, path in usage.largest]
+        # The size should be right aligned, so it is the last column
+        print_table([list(reversed(row)) for row in rows])
+    print()
+    print(f"Total: {format_size(usage.total_bytes)} in {usage.total_files} file(s)")
+
+    # By default return 0 (success)
+    return 0
+
+
+def print_usage_table(header: List[str], usage_dict: Dict[str, Tuple[int, int]], sort_by_size: bool) -> None:
+    if sort_by_size:
+        items = sorted(usage_dict.items(), key=lambda item: item[1][0], reverse=True)
+    else:
+        items = sorted(usage_dict.items())
+    rows = [header]
+    for key, (byte_count, count) in items:
+        rows.append([key, str(count), format_size(byte_count)])
+    print_table(rows)
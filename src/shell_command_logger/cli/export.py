@@ -0,0 +1,72 @@
+import os
+import sys
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.bundle import BUNDLE_FORMATS, BundleException, check_gpg_available, create_bundle_writer, export_bundle, get_bundle_format
+from shell_command_logger.search import WatermarkException, get_commands_for_export, read_watermark, write_watermark
+
+SUBCOMMAND_NAMES = ["export"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command exports recordings into a tar or zip archive, that can be imported on another machine with 'scl import'. The archive contains a SHA512SUMS manifest, that can optionally be signed with gpg. Recordings are streamed into the archive and hashed at the same time, so each file is only read once",
+    "help": "export recordings into an archive",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("output", help="the archive to write. Use '-' to write to the standard output")
+    ap.add_argument("-f", "--format", choices=BUNDLE_FORMATS, help="the archive format. By default it is guessed from the file name (.zip, .tar.gz or .tgz). Everything else is written as tar")
+    mutex_since = ap.add_mutually_exclusive_group()
+    mutex_since.add_argument("--since", type=int, metavar="EPOCH_SECONDS", help="only export recordings, that finished at or after the given time")
+    mutex_since.add_argument("-w", "--watermark-file", help="for incremental exports: only export recordings, that finished since the time stored in this file. After a successful export the file is updated. If it does not exist, all recordings are exported")
+    ap.add_argument("-s", "--sign", action="store_true", help="sign the manifest with gpg")
+    ap.add_argument("-k", "--gpg-key", metavar="KEY_ID", help="the key to sign the manifest with. Defaults to the default key of gpg. Implies --sign")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    bundle_format = args.format or get_bundle_format(args.output)
+    sign = args.sign or bool(args.gpg_key)
+    if sign:
+        try:
+            # Fail before the export, instead of after writing everything
+            check_gpg_available()
+        except BundleException as ex:
+            print_color(str(ex), "red", bold=True)
+            return 1
+
+    try:
+        since = read_watermark(args.watermark_file, args.since) if args.watermark_file else args.since
+    except WatermarkException as ex:
+        print_color(str(ex), "red", bold=True)
+        return 1
+
+    scl_config = sanitize_config(load_config())
+    commands, until = get_commands_for_export(scl_config)
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        with create_bundle_writer(output, bundle_format) as writer:
+            count = export_bundle(scl_config.output_dir, commands, writer, since, until, sign, args.gpg_key)
+    except (BundleException, OSError) as ex:
+        print_color(f"Export failed: {ex}", "red", bold=True)
+        if args.output != "-":
+            output.close()
+            # Do not leave an incomplete archive behind
+            os.remove(args.output)
+        return 1
+    finally:
+        if args.output != "-":
+            output.close()
+
+    if args.watermark_file:
+        write_watermark(args.watermark_file, until)
+    print(f"Exported {count} recording(s). Next watermark: {until}", file=sys.stderr)
+
+    # By default return 0 (success)
+    return 0
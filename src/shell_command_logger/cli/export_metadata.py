@@ -0,0 +1,69 @@
+import sys
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.columnar import FORMATS, FORMAT_PARQUET, DEFAULT_ROW_GROUP_SIZE, ExportException, JsonColumnarWriter, ParquetColumnarWriter, export_metadata
+from shell_command_logger.search import WatermarkException, get_commands_for_export, read_watermark, write_watermark
+
+SUBCOMMAND_NAMES = ["export-metadata"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command exports the metadata of all finished recordings into a single columnar file (Parquet or JSON), that can be loaded into data analysis tools. The output is written in row groups, but the metadata of all recordings is loaded first, like for the search command",
+    "help": "export the metadata in a columnar format",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("output", help="the file to write to. Use '-' to write the JSON format to the standard output")
+    ap.add_argument("-f", "--format", choices=FORMATS, help="the output format. By default Parquet is used for files ending in '.parquet' and JSON for everything else. Parquet requires the 'pyarrow' package")
+    ap.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help=f"the number of rows per row group (default: {DEFAULT_ROW_GROUP_SIZE})")
+    mutex_since = ap.add_mutually_exclusive_group()
+    mutex_since.add_argument("--since", type=int, metavar="EPOCH_SECONDS", help="only export recordings, that finished at or after the given time")
+    mutex_since.add_argument("-w", "--watermark-file", help="for incremental exports: only export recordings, that finished since the time stored in this file. After a successful export the file is updated. If it does not exist, all recordings are exported")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    if args.row_group_size < 1:
+        print_color("The row group size needs to be a positive number", "red", bold=True)
+        return 1
+
+    output_format = args.format or (FORMAT_PARQUET if args.output.endswith(".parquet") else "json")
+    if output_format == FORMAT_PARQUET and args.output == "-":
+        print_color("Parquet files can not be written to the standard output", "red", bold=True)
+        return 1
+
+    try:
+        since = read_watermark(args.watermark_file, args.since) if args.watermark_file else args.since
+    except WatermarkException as ex:
+        print_color(str(ex), "red", bold=True)
+        return 1
+
+    scl_config = sanitize_config(load_config())
+    commands, until = get_commands_for_export(scl_config)
+
+    try:
+        if output_format == FORMAT_PARQUET:
+            with ParquetColumnarWriter(args.output, args.row_group_size) as writer:
+                count = export_metadata(scl_config.output_dir, commands, writer, since, until)
+        elif args.output == "-":
+            with JsonColumnarWriter(sys.stdout, args.row_group_size) as writer:
+                count = export_metadata(scl_config.output_dir, commands, writer, since, until)
+        else:
+            with open(args.output, "w") as f:
+                with JsonColumnarWriter(f, args.row_group_size) as writer:
+                    count = export_metadata(scl_config.output_dir, commands, writer, since, until)
+    except ExportException as ex:
+        print_color(str(ex), "red", bold=True)
+        return 1
+
+    if args.watermark_file:
+        write_watermark(args.watermark_file, until)
+    print(f"Exported {count} recording(s). Next watermark: {until}", file=sys.stderr)
+
+    # By default return 0 (success)
+    return 0
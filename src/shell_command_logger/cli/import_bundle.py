@@ -0,0 +1,50 @@
+import sys
+import tarfile
+import zipfile
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.bundle import BUNDLE_FORMAT_ZIP, BundleException, get_bundle_format, import_bundle, iterate_tar_members, iterate_zip_members
+
+SUBCOMMAND_NAMES = ["import"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command imports a bundle created by 'scl export' into the data directory. The files are checked against the manifest of the bundle while they are read. Recordings, that already exist in the data directory, are skipped",
+    "help": "import recordings exported with 'scl export'",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("bundle", help="the bundle to import. Use '-' to read a tar bundle from the standard input")
+    ap.add_argument("-v", "--verify-signature", action="store_true", help="require a valid gpg signature of the manifest")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+
+    try:
+        if args.bundle == "-":
+            members = iterate_tar_members(sys.stdin.buffer)
+            result = import_bundle(scl_config.output_dir, members, scl_config.file_name_random_bytes, scl_config.metadata_journal, args.verify_signature)
+        elif get_bundle_format(args.bundle) == BUNDLE_FORMAT_ZIP:
+            members = iterate_zip_members(args.bundle)
+            result = import_bundle(scl_config.output_dir, members, scl_config.file_name_random_bytes, scl_config.metadata_journal, args.verify_signature)
+        else:
+            with open(args.bundle, "rb") as f:
+                members = iterate_tar_members(f)
+                result = import_bundle(scl_config.output_dir, members, scl_config.file_name_random_bytes, scl_config.metadata_journal, args.verify_signature)
+    except (BundleException, OSError, tarfile.TarError, zipfile.BadZipFile) as ex:
+        print_color(f"Import failed: {ex}", "red", bold=True)
+        return 1
+
+    for old_id, new_id in result.renamed.items():
+        print(f"Renamed '{old_id}' to '{new_id}', since a different recording with the same name exists")
+    print(f"Imported {len(result.imported)} recording(s), skipped {result.skipped} existing recording(s)")
+
+    # By default return 0 (success)
+    return 0
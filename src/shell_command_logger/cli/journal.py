@@ -0,0 +1,40 @@
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.journal import get_journal_file, read_journal, rebuild_journal
+
+SUBCOMMAND_NAMES = ["journal"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command manages the metadata journal. The journal contains the metadata of all recordings in a single file, so that searches do not need to read one file per recording",
+    "help": "manage the metadata journal",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-r", "--rebuild", action="store_true", help="recreate the journal from the metadata files. Use this after you manually added or removed recordings")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+
+    if args.rebuild:
+        count = rebuild_journal(scl_config.output_dir)
+        print(f"Rebuilt journal with {count} recording(s)")
+        return 0
+
+    records = read_journal(scl_config.output_dir)
+    if records is None:
+        print_color(f"The journal '{get_journal_file(scl_config.output_dir)}' does not exist or is incomplete. You can create it with 'scl journal --rebuild'", "yellow")
+        return 1
+    else:
+        running = len([x for x in records if not x.is_finished()])
+        print(f"Journal: {get_journal_file(scl_config.output_dir)}")
+        print(f"Recordings: {len(records)}")
+        print(f"Unfinished recordings: {running}")
+        return 0
@@ -1,9 +1,12 @@
 import argparse
 import os
+import sys
 from typing import Optional
 # import the code from this package
-from shell_command_logger.recorder import get_command_path, get_timestamp_filename, record_command
+from shell_command_logger import print_color
+from shell_command_logger.recorder import get_command_path, get_timestamp_filename, record_command, record_metadata_only
 from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.recording_policy import DECISION_METADATA_ONLY, DECISION_RECORD, DECISION_SKIP, get_recording_decision
 from shell_command_logger.main_file import get_python_main_file
 from ..backports import List
 
@@ -66,10 +69,28 @@ def _record_command(command: List[str]):
     command[0] = get_command_path(command[0], get_python_main_file())
 
     command_name = os.path.basename(command[0])
+    try:
+        decision = get_recording_decision(scl_config.output_dir, scl_config.recording_policies, command_name)
+    except OSError as ex:
+        # Better record too much than not running the command at all
+        print(f"Error counting calls of '{command_name}': ", ex, file=sys.stderr)
+        decision = DECISION_RECORD
+
+    if decision == DECISION_SKIP:
+        # Replace this process, so that the command behaves exactly as if it was called directly
+        try:
+            os.execvp(command[0], command)
+        except OSError as ex:
+            print_color(f"Failed to run '{command[0]}': {ex}", "red", bold=True)
+            return 1
+
     output_dir = os.path.join(scl_config.output_dir, command_name)
     os.makedirs(output_dir, exist_ok=True)
 
     output_file = os.path.join(output_dir, get_timestamp_filename(scl_config))
 
+    if decision == DECISION_METADATA_ONLY:
+        return record_metadata_only(scl_config, command, output_file)
+
     exit_code = record_command(scl_config, command, output_file)
     return exit_code
@@ -6,9 +6,9 @@ import shell_command_logger
 from shell_command_logger import print_color
 from shell_command_logger.backports import TimeParseException
 from shell_command_logger.config import InvalidConfigException
-from shell_command_logger.cli import alias, check, config, log, replay, search, symlink
+from shell_command_logger.cli import alias, check, compact, config, daemon, dedup, du, export, export_metadata, import_bundle, journal, log, prune, replay, search, sidecars, stats, symlink, timeline
 from shell_command_logger.main_file import set_python_main_file
-from shell_command_logger.debug import init_debugging
+from shell_command_logger.debug import init_debugging, init_profiling, finish_profiling
 # local files
 from ..backports import Dict
 
@@ -62,9 +62,11 @@ def main(main_python_file: str) -> None:
     )
     ap.add_argument("-V", "--version", action="version", version=shell_command_logger.get_version_string())
     ap.add_argument("-d", "--debug", action="store_true", help="print debugging information")
+    ap.add_argument("--profile", action="store_true", help="measure where the time is spent and print a summary to stderr")
+    ap.add_argument("--profile-output", metavar="PSTATS_FILE", help="also profile the command with cProfile and write the statistics to the given file. Implies --profile")
     handler = SubcommandHandler(ap)
 
-    for module in [alias, check, config, log, replay, search, symlink]:
+    for module in [alias, check, compact, config, daemon, dedup, du, export, export_metadata, import_bundle, journal, log, prune, replay, search, sidecars, stats, symlink, timeline]:
         handler.register_module(module)
 
     # Run the selected submodule
@@ -72,6 +74,8 @@ def main(main_python_file: str) -> None:
 
     if args.debug:
         init_debugging(True)
+    if args.profile or args.profile_output:
+        init_profiling(args.profile_output)
 
     try:
         exit_code = handler.subcommand_main(args)
@@ -83,6 +87,8 @@ def main(main_python_file: str) -> None:
     except TimeParseException as ex:
         print_color(str(ex), "red", bold=True)
         exit_code = 1
+    finally:
+        finish_profiling()
   
     sys.exit(exit_code)
 
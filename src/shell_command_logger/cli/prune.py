@@ -0,0 +1,62 @@
+import argparse
+from datetime import datetime, timezone
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.prune import delete_recordings, list_stored_recordings, parse_size, select_recordings_to_delete
+from shell_command_logger.stats import format_size
+
+SUBCOMMAND_NAMES = ["prune"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command deletes old recordings. Recordings can be deleted based on their age, the total size of all recordings or the size of the recordings of each program. The oldest recordings are deleted first",
+    "help": "delete old recordings",
+}
+
+def size_argument(value: str) -> int:
+    try:
+        return parse_size(value)
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(str(ex))
+
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-o", "--older-than", metavar="DAYS", type=float, help="delete recordings that were started more than DAYS days ago")
+    ap.add_argument("-s", "--max-size", metavar="SIZE", type=size_argument, help="delete the oldest recordings until all recordings together use at most SIZE (like 500M or 10G)")
+    ap.add_argument("-p", "--max-program-size", metavar="SIZE", type=size_argument, help="delete the oldest recordings of each program until the recordings of each program use at most SIZE")
+    ap.add_argument("-n", "--dry-run", action="store_true", help="only show what would be deleted, do not modify any files")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    if args.older_than == None and args.max_size == None and args.max_program_size == None:
+        print_color("You need to specify at least one of --older-than, --max-size and --max-program-size", "red", bold=True)
+        return 1
+    if args.older_than != None and args.older_than < 0:
+        print_color("The value of --older-than can not be negative", "red", bold=True)
+        return 1
+
+    scl_config = sanitize_config(load_config())
+    recordings = list_stored_recordings(scl_config.output_dir)
+    older_than_seconds = args.older_than * 24 * 60 * 60 if args.older_than != None else None
+    to_delete = select_recordings_to_delete(recordings, older_than_seconds, args.max_size, args.max_program_size)
+
+    if args.dry_run:
+        for recording in to_delete:
+            start = datetime.fromtimestamp(recording.start_time, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"Would delete {recording.program}/{recording.name} (started {start} UTC, {format_size(recording.size)})")
+    else:
+        delete_recordings(scl_config.output_dir, to_delete, update_journal=scl_config.metadata_journal)
+
+    verb = "Would delete" if args.dry_run else "Deleted"
+    deleted_size = sum(x.size for x in to_delete)
+    total_size = sum(x.size for x in recordings)
+    print(f"{verb} {len(to_delete)} of {len(recordings)} recording(s) ({format_size(deleted_size)} of {format_size(total_size)})")
+
+    # By default return 0 (success)
+    return 0
@@ -1,6 +1,10 @@
 # import the code from this package
 from shell_command_logger.replay import get_command_file_list, select_formatted, format_filename, format_command_builder, remove_extension, replay_command
+from shell_command_logger import print_color
 from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.saved_results import SavedResultsException, load_results
+from shell_command_logger.search import get_searchable_commands_from_daemon, metadata_to_dict
+from shell_command_logger.cli.search import populate_data_directory_arguments, get_selected_data_directories
 
 
 SUBCOMMAND_NAMES = ["r", "replay"]
@@ -16,9 +20,11 @@ def populate_agrument_parser(ap) -> None:
     mutex = ap.add_mutually_exclusive_group()
     mutex.add_argument("-i", "--input", metavar=("path"), help="the input file containing the command output")
     mutex.add_argument("-f", "--select-file", action="store_true", help="interactively search the file names")
+    ap.add_argument("-r", "--results", metavar="NAME", help="select from the results saved with 'scl search --save NAME' instead of all recordings")
 
     ap.add_argument("-q", "--quiet", action="store_true", help="only show original command output. Do not show metadata")
     ap.add_argument("-s", "--skip", action="store_true", help="skip the replay, only show the final result")
+    populate_data_directory_arguments(ap)
 
 
 def subcommand_main(args) -> int:
@@ -31,14 +37,33 @@ def subcommand_main(args) -> int:
     if args.input:
         path = args.input
     else:
-        # Get a list of all possible files
-        choices = get_command_file_list(scl_config)
+        metadata_by_file = None
+        if args.results:
+            try:
+                saved_results = load_results(scl_config.output_dir, args.results)
+            except SavedResultsException as ex:
+                print_color(str(ex), "red", bold=True)
+                return 1
+            choices = [x.file_path for x in saved_results]
+            metadata_by_file = {x.file_path: metadata_to_dict(x.metadata) for x in saved_results}
+        else:
+            # Get a list of all possible files
+            directories = get_selected_data_directories(scl_config, args)
+            daemon_commands = None
+            if directories == [scl_config.output_dir]:
+                # The daemon already knows the recordings and their metadata, so neither the directories need to be walked nor the metadata files read
+                daemon_commands = get_searchable_commands_from_daemon(scl_config.output_dir, scl_config.metadata_journal)
+            if daemon_commands is not None:
+                choices = [x.file_path for x in daemon_commands]
+                metadata_by_file = {x.file_path: metadata_to_dict(x.metadata) for x in daemon_commands}
+            else:
+                choices = get_command_file_list(scl_config, directories)
         if args.select_file:
             # Show file names
             formatter = format_filename
         else:
             # Show command metadata
-            formatter = format_command_builder(scl_config)
+            formatter = format_command_builder(scl_config, metadata_by_file)
 
         path = select_formatted(scl_config, formatter, choices)
 
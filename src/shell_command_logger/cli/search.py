@@ -1,13 +1,19 @@
+import argparse
 from datetime import datetime
 import os
-import subprocess
-from typing import Any, Callable
+import sys
+from typing import Any, Callable, Optional
 # import the code from this package
-from shell_command_logger.search import get_all_searchable_commands, SearchableCommand, Metadata, is_running_during_timeframe, get_command_output
-from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger import print_color
+from shell_command_logger.search import get_searchable_commands_from_directories, SearchableCommand, Metadata, is_running_during_timeframe, metadata_to_dict
+from shell_command_logger.grep import get_default_grep_jobs, grep_outputs
+from shell_command_logger.sidecar import get_sidecar_file
+from shell_command_logger.config import load_config, sanitize_config, get_data_directories, SclConfig
+from shell_command_logger.debug import profile_span
 from shell_command_logger.backports import parse_datetime_string
 from shell_command_logger.replay import remove_extension, format_command_builder, select_formatted, replay_command
-from ..backports import List, Tuple
+from shell_command_logger.saved_results import SavedResultsException, load_results, save_results
+from ..backports import Dict, List, Tuple
 
 SUBCOMMAND_NAMES = ["s", "search"]
 ARG_PARSER_OPTIONS = {
@@ -15,9 +21,9 @@ ARG_PARSER_OPTIONS = {
     "help": "search logs",
 }
 
-def create_only_or_exclude_filter(ap, short_flag: str, long_flag: str, description: str, **kwargs) -> None:
+def create_only_or_exclude_filter(ap, short_flag: str, long_flag: str, description: str, **kwargs) -> List[argparse.Action]:
     """
-    An helper method to reduce redundant code and thus reduce copy paste errors
+    An helper method to reduce redundant code and thus reduce copy paste errors. Returns the added arguments
     """
     if len(short_flag) != 1:
         raise Exception("short_flag needs to be a single character")
@@ -25,7 +31,7 @@ def create_only_or_exclude_filter(ap, short_flag: str, long_flag: str, descripti
     # The only X and the exclude X options are mutually exclusive
     mutex = ap.add_mutually_exclusive_group()
     # The only show X flag
-    mutex.add_argument(
+    only_action = mutex.add_argument(
         f"-{short_flag.lower()}",
         f"--{long_flag}",
         nargs="+",
@@ -33,41 +39,70 @@ def create_only_or_exclude_filter(ap, short_flag: str, long_flag: str, descripti
         **kwargs,
     )
     # The exclude X flag
-    mutex.add_argument(
+    exclude_action = mutex.add_argument(
         f"-{short_flag.upper()}",
         f"--exclude-{long_flag}",
         nargs="+",
         help=f"exclude commands {description}",
         **kwargs,
     )
+    return [only_action, exclude_action]
 
 
 def populate_agrument_parser(ap) -> None:
     """
     Populates an argparse.ArgumentParser or an subcommand argument parser
     """
-    create_only_or_exclude_filter(ap, "s", "status-codes", "with one of the given status codes. Programs terminated by internal errors have status code -1", type=int)
-    create_only_or_exclude_filter(ap, "u", "users", "run by one of the given users")
+    populate_filter_arguments(ap)
+    populate_data_directory_arguments(ap)
+    ap.add_argument("-w", "--within", metavar="NAME", help="only search the results saved with '--save NAME' instead of the data directories. Uses the metadata from the time the results were saved")
+
+    # These arguments specify what to do with the results
+    # TODO -o
+    mutex_action = ap.add_mutually_exclusive_group()
+    mutex_action.add_argument("-r", "--replay", action="store_true", help="interactively select one of the search results to replay")
+    ap.add_argument("--save", metavar="NAME", help="save the results under the given name. They can be used with 'scl search --within NAME' and 'scl replay --results NAME'")
+
+
+def populate_data_directory_arguments(ap) -> None:
+    """
+    Adds the option to choose the data directories to search. Use `get_selected_data_directories()` to get the chosen directories
+    """
+    ap.add_argument("--root", dest="roots", metavar="DATA_DIRECTORY", action="append", help="search this data directory instead of the configured data directories. Can be used multiple times")
+
+
+def get_selected_data_directories(scl_config: SclConfig, args) -> List[str]:
+    if args.roots:
+        return [os.path.expanduser(x) for x in args.roots]
+    return get_data_directories(scl_config)
+
+
+def populate_filter_arguments(ap) -> None:
+    """
+    Adds the search filters to an argument parser. Can also be used by other subcommands, that operate on search results
+    """
+    actions = create_only_or_exclude_filter(ap, "s", "status-codes", "with one of the given status codes. Programs terminated by internal errors have status code -1", type=int)
+    actions += create_only_or_exclude_filter(ap, "u", "users", "run by one of the given users")
 
     mutex_hostname = ap.add_mutually_exclusive_group()
     # -h is already taken by --help
-    mutex_hostname.add_argument("--hosts", nargs="+", help="only show commands run on one of the given hosts")
-    mutex_hostname.add_argument("-H", "--exclude-hosts", nargs="+", help="exclude commands executed on one of the given hosts")
+    actions.append(mutex_hostname.add_argument("--hosts", nargs="+", help="only show commands run on one of the given hosts"))
+    actions.append(mutex_hostname.add_argument("-H", "--exclude-hosts", nargs="+", help="exclude commands executed on one of the given hosts"))
 
-    create_only_or_exclude_filter(ap, "e", "errors", "that contain one of the given texts in their error message. No argument will match any command with errors")
-    create_only_or_exclude_filter(ap, "p", "program", "that match one of the given program names")
-    create_only_or_exclude_filter(ap, "a", "arguments", "that contain at least one of the given strings in one of its arguments")
-    create_only_or_exclude_filter(ap, "d", "days", "that were running on one of the given days (in UTC)")
+    actions += create_only_or_exclude_filter(ap, "e", "errors", "that contain one of the given texts in their error message. No argument will match any command with errors")
+    actions += create_only_or_exclude_filter(ap, "p", "program", "that match one of the given program names")
+    actions += create_only_or_exclude_filter(ap, "a", "arguments", "that contain at least one of the given strings in one of its arguments")
+    actions += create_only_or_exclude_filter(ap, "d", "days", "that were running on one of the given days (in UTC)")
 
-    ap.add_argument("-g", "--grep-output", metavar=("PATTERN_AND_FLAGS"), help="only show commands, if `echo <COMMAND_OUTPUT> | grep <PATTERN_AND_FLAGS>` returns the status code 0. Generally this means, that matches were found")
+    actions.append(ap.add_argument("--running", action="store_true", help="only show commands, that are still running. Requires the metadata journal"))
+    actions.append(ap.add_argument("-g", "--grep-output", metavar=("PATTERN_AND_FLAGS"), help="only show commands, if `echo <COMMAND_OUTPUT> | grep <PATTERN_AND_FLAGS>` returns the status code 0. Generally this means, that matches were found"))
+    actions.append(ap.add_argument("--grep-jobs", type=int, metavar="N", help="the number of grep processes to run at the same time (default: number of CPUs)"))
+    # Used by `has_active_filters()`
+    ap.set_defaults(filter_defaults={x.dest: ap.get_default(x.dest) for x in actions})
 
     # TODO: start/end x before/after
     # TODO: runtime longer/shorter than
 
-    # These arguments specify what to do with the results
-    # TODO -o
-    mutex_action = ap.add_mutually_exclusive_group()
-    mutex_action.add_argument("-r", "--replay", action="store_true", help="interactively select one of the search results to replay")
 
 def subcommand_main(args) -> int:
     """
@@ -75,19 +110,62 @@ def subcommand_main(args) -> int:
     It returns an unix-like status code (0 -> success, everything else -> error).
     """
     scl_config = sanitize_config(load_config())
-    search_results = get_all_searchable_commands(scl_config)
+    try:
+        if args.within:
+            search_results = load_results(scl_config.output_dir, args.within)
+        else:
+            # Unfinished recordings do not have a metadata file yet, so they are only shown when explicitly searching for them
+            search_results = get_searchable_commands_from_directories(scl_config, get_selected_data_directories(scl_config, args), include_unfinished=args.running)
+        search_results = apply_filters(args, search_results)
+
+        if args.save:
+            save_results(scl_config.output_dir, args.save, search_results, sys.argv[1:])
+            print(f"Saved {len(search_results)} result(s) as '{args.save}'", file=sys.stderr)
+    except SavedResultsException as ex:
+        print_color(str(ex), "red", bold=True)
+        return 1
 
+    if args.replay:
+        file_names = [x.file_path for x in search_results]
+        # The metadata is already known, so the labels can be created without reading the metadata files again
+        format_function = format_command_builder(scl_config, {x.file_path: metadata_to_dict(x.metadata) for x in search_results})
+        path = select_formatted(scl_config, format_function, file_names)
+        if path:
+            replay_command(path, scl_config)
+    else:
+        with profile_span("output"):
+            for result in search_results:
+                print(result.file_path)
+
+    # By default return 0 (success)
+    return 0
+
+
+def has_active_filters(args) -> bool:
+    """
+    Checks if any of the filters added by `populate_filter_arguments()` was used
+    """
+    return any(getattr(args, name) != default for name, default in args.filter_defaults.items())
+
+
+def apply_filters(args, search_results: List[SearchableCommand]) -> List[SearchableCommand]:
+    """
+    Applies the filters added by `populate_filter_arguments()`
+    """
     # Filter by status code
     is_match_status_code = lambda metadata, value_list: metadata.status_code in value_list
-    search_results = filter_by_metadata(search_results, args.status_codes, args.exclude_status_codes, is_match_status_code)
+    with profile_span("filter_status_codes"):
+        search_results = filter_by_metadata(search_results, args.status_codes, args.exclude_status_codes, is_match_status_code)
     
     # Filter by username
     is_match_user = lambda metadata, value_list: metadata.user in value_list
-    search_results = filter_by_metadata(search_results, args.users, args.exclude_users, is_match_user)
+    with profile_span("filter_users"):
+        search_results = filter_by_metadata(search_results, args.users, args.exclude_users, is_match_user)
 
     # Filter by hostname
     is_match_host = lambda metadata, value_list: metadata.hostname in value_list
-    search_results = filter_by_metadata(search_results, args.hosts, args.exclude_hosts, is_match_host)
+    with profile_span("filter_hosts"):
+        search_results = filter_by_metadata(search_results, args.hosts, args.exclude_hosts, is_match_host)
 
     # Filter by error message
     def is_match_error(metadata: Metadata, value_list: List[str]) -> bool:
@@ -106,13 +184,15 @@ def subcommand_main(args) -> int:
         else:
             # If no error message exists, it can not match
             return False
-    search_results = filter_by_metadata(search_results, args.errors, args.exclude_errors, is_match_error)
+    with profile_span("filter_errors"):
+        search_results = filter_by_metadata(search_results, args.errors, args.exclude_errors, is_match_error)
 
     # Filter by program
     def is_match_program(metadata: Metadata, value_list: List[str]) -> bool:
         program_name = os.path.basename(metadata.command[0])
         return program_name in value_list
-    search_results = filter_by_metadata(search_results, args.program, args.exclude_program, is_match_program)
+    with profile_span("filter_program"):
+        search_results = filter_by_metadata(search_results, args.program, args.exclude_program, is_match_program)
 
     # Filter by command arguments
     def is_match_command(metadata: Metadata, value_list: List[str]) -> bool:
@@ -122,47 +202,51 @@ def subcommand_main(args) -> int:
                 if value in arg:
                     return True
         return False
-    search_results = filter_by_metadata(search_results, args.arguments, args.exclude_arguments, is_match_command)
+    with profile_span("filter_arguments"):
+        search_results = filter_by_metadata(search_results, args.arguments, args.exclude_arguments, is_match_command)
 
     if args.days or args.exclude_days:
         # Only parse the dates once, this makes it necessary to first parse the dates and then define a function that uses the results
         date_checker = DateChecker(args.days or args.exclude_days)
         is_match_day = lambda metadata, _: date_checker.is_match(metadata)
 
-        search_results = filter_by_metadata(search_results, args.days, args.exclude_days, is_match_day)
+        with profile_span("filter_days"):
+            search_results = filter_by_metadata(search_results, args.days, args.exclude_days, is_match_day)
 
+    if args.running:
+        with profile_span("filter_running"):
+            search_results = [x for x in search_results if x.metadata.running]
 
     if args.grep_output:
-        search_results = filter_by_grep(search_results, args.grep_output)
+        search_results = filter_by_grep(search_results, args.grep_output, args.grep_jobs)
 
-    if args.replay:
-        file_names = [x.file_path for x in search_results]
-        format_function = format_command_builder(scl_config)
-        path = select_formatted(scl_config, format_function, file_names)
-        if path:
-            replay_command(path, scl_config)
-    else:
-        for result in search_results:
-            print(result.file_path)
+    return search_results
 
-    # By default return 0 (success)
-    return 0
 
+def filter_by_grep(entries: List[SearchableCommand], arguments_and_pattern: str, jobs: Optional[int] = None) -> List[SearchableCommand]:
+    with profile_span("filter_by_grep"):
+        grep_command = f"grep {arguments_and_pattern}"
+        # Deduplicated outputs with the same digest are identical, so grep only needs to check them once
+        log_file_by_key: Dict[str, str] = {}
+        entries_and_keys = []
+        for entry in entries:
+            if not entry.metadata.output_recorded:
+                # There is no output to search
+                continue
+            log_file_name = remove_extension(entry.file_path) + ".log" # Access the .log file which contains the output
+            key = entry.metadata.output_digest or log_file_name
+            if key not in log_file_by_key:
+                # Search the plain text without escape sequences, if it was already created
+                sidecar_file = get_sidecar_file(entry.file_path)
+                log_file_by_key[key] = sidecar_file if os.path.exists(sidecar_file) else log_file_name
+            entries_and_keys.append((entry, key))
 
-def filter_by_grep(entries: List[SearchableCommand], arguments_and_pattern: str) -> List[SearchableCommand]:
-    grep_command = f"grep {arguments_and_pattern}"
-    matches = []
-    for entry in entries:
-        log_file_name = remove_extension(entry.file_path) + ".log" # Access the .log file which contains the output
-        command_output = get_command_output(log_file_name)
+        # Pipe the command outputs into grep processes running in parallel. Accept a result if grep returned with code 0 (results found)
+        keys = list(log_file_by_key)
+        results = grep_outputs(grep_command, [log_file_by_key[key] for key in keys], jobs or get_default_grep_jobs())
+        is_match_by_key = dict(zip(keys, results))
 
-        # pipe the command output into grep
-        result = subprocess.run(grep_command, shell=True, input=command_output, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, timeout=2)
-        # Accept result if grep returned with code 0 (results found)
-        if result.returncode == 0:
-            matches.append(entry)
-    
-    return matches
+        return [entry for entry, key in entries_and_keys if is_match_by_key[key]]
 
 
 class DateChecker:
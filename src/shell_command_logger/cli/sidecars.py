@@ -0,0 +1,46 @@
+# import the code from this package
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.sidecar import create_missing_sidecars, remove_orphaned_sidecars
+from shell_command_logger.search import get_searchable_commands_from_directory
+from shell_command_logger.storage import list_metadata_files
+
+SUBCOMMAND_NAMES = ["sidecars"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command creates a compressed plain text copy of each command output, that does not contain escape sequences (like colors) and lines overwritten by progress bars. 'scl search --grep-output' searches these copies instead of the raw outputs, if they exist. New recordings get a copy automatically, if the 'plain-text-sidecars' setting is enabled",
+    "help": "create plain text copies of the outputs for searching",
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-f", "--force", action="store_true", help="also recreate existing plain text copies")
+    ap.add_argument("--gc", action="store_true", help="only delete plain text copies of recordings, that no longer exist")
+    ap.add_argument("-n", "--dry-run", action="store_true", help="only show how many plain text copies would be deleted (only with --gc)")
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+    if args.gc:
+        metadata_files = list_metadata_files(scl_config.output_dir)
+        count = remove_orphaned_sidecars(scl_config.output_dir, metadata_files, dry_run=args.dry_run)
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {count} unused plain text copies")
+        return 0
+
+    # Recordings without a metadata file may still be running, so they do not get a copy yet.
+    # Recordings, that only store the metadata, have no output to copy
+    commands = get_searchable_commands_from_directory(scl_config.output_dir, scl_config.metadata_journal, create_journal=True, use_daemon=True)
+    metadata_files = [x.file_path for x in commands if x.metadata.output_recorded]
+    created, failed = create_missing_sidecars(metadata_files, force=args.force)
+    print(f"Created {created} plain text copies")
+    if failed:
+        print(f"Failed to create {failed} plain text copies")
+        return 1
+
+    # By default return 0 (success)
+    return 0
@@ -0,0 +1,152 @@
+import os
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config, SclConfig
+from shell_command_logger.search import get_searchable_commands_from_directories, map_data_directories
+from shell_command_logger.stats import GROUP_BY_FUNCTIONS, DURATION_INDEX_GROUPS, OVERHEAD_PHASES, GroupStats, aggregate, format_duration, format_size, update_duration_index, merge_duration_sketches, group_duration_sketches
+from shell_command_logger.cli.search import populate_filter_arguments, populate_data_directory_arguments, get_selected_data_directories, apply_filters, has_active_filters
+from ..backports import List
+
+SUBCOMMAND_NAMES = ["stats"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command shows statistics about the logged commands, like which programs fail most often or run the longest. It accepts the same filters as the search command",
+    "help": "show statistics about the logged commands",
+}
+
+SORT_KEYS = {
+    "count": lambda group: group.count,
+    "failure-rate": lambda group: group.get_failure_rate(),
+    "duration": lambda group: group.total_duration_seconds,
+    "output": lambda group: group.output_bytes,
+    "name": lambda group: group.name,
+}
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("-b", "--group-by", choices=list(GROUP_BY_FUNCTIONS), default="program", help="the value used to group the commands (default: program)")
+    ap.add_argument("--sort", choices=list(SORT_KEYS), default="count", help="the column used to sort the groups (default: count)")
+    ap.add_argument("-n", "--limit", type=int, help="only show the first N groups")
+    ap.add_argument("-o", "--overhead", action="store_true", help="show how much time scl itself needed to start and finish the recordings, instead of the duration of the commands. Older recordings do not contain these timings")
+    ap.add_argument("-q", "--quick", action="store_true", help="only show the number of commands and their duration percentiles. They are read from an index, that is updated incrementally from the metadata journal, so this is fast even for long histories. Can not be combined with the filters and only supports grouping by program, host or day")
+    populate_filter_arguments(ap)
+    populate_data_directory_arguments(ap)
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+    if args.quick:
+        if args.overhead:
+            print_color("The --quick option can not be combined with --overhead", "red", bold=True)
+            return 1
+        return quick_stats(scl_config, args)
+
+    search_results = get_searchable_commands_from_directories(scl_config, get_selected_data_directories(scl_config, args))
+    search_results = apply_filters(args, search_results)
+
+    groups = aggregate(search_results, args.group_by)
+    # Names are sorted alphabetically, everything else with the biggest values first
+    groups.sort(key=SORT_KEYS[args.sort], reverse=args.sort != "name")
+    if args.limit != None:
+        groups = groups[:args.limit]
+
+    if args.overhead:
+        print_overhead_table(args.group_by, groups)
+        return 0
+
+    rows = [[args.group_by, "count", "failed", "total time", "mean time", "p50", "p95", "p99", "output"]]
+    for group in groups:
+        rows.append([
+            group.name,
+            str(group.count),
+            f"{group.get_failure_rate() * 100:.1f}%",
+            format_duration(group.total_duration_seconds),
+            format_duration(group.get_mean_duration_seconds()),
+            format_duration(group.durations.get_quantile(0.5)),
+            format_duration(group.durations.get_quantile(0.95)),
+            format_duration(group.durations.get_quantile(0.99)),
+            format_size(group.output_bytes),
+        ])
+    print_table(rows)
+
+    # By default return 0 (success)
+    return 0
+
+
+def print_overhead_table(group_by: str, groups: List[GroupStats]) -> None:
+    header = [group_by, "count", "timed"]
+    for name, _, _ in OVERHEAD_PHASES:
+        header += [f"{name} p50", f"{name} p95"]
+    header += ["total p50", "total p95", "total p99", "total max"]
+
+    rows = [header]
+    for group in groups:
+        row = [group.name, str(group.count), str(group.total_overhead.count)]
+        if group.total_overhead.count == 0:
+            rows.append(row + ["-"] * (len(header) - len(row)))
+            continue
+        for name, _, _ in OVERHEAD_PHASES:
+            row += [format_duration(group.overheads[name].get_quantile(0.5)), format_duration(group.overheads[name].get_quantile(0.95))]
+        row += [format_duration(group.total_overhead.get_quantile(quantile)) for quantile in [0.5, 0.95, 0.99]]
+        row.append(format_duration(group.total_overhead.max))
+        rows.append(row)
+    print_table(rows)
+
+
+def quick_stats(scl_config: SclConfig, args) -> int:
+    if has_active_filters(args):
+        print_color("The --quick option can not be combined with filters", "red", bold=True)
+        return 1
+    if args.group_by not in DURATION_INDEX_GROUPS:
+        print_color(f"The --quick option only supports grouping by {', '.join(DURATION_INDEX_GROUPS)}", "red", bold=True)
+        return 1
+    if args.sort not in ["count", "name"]:
+        print_color("The --quick option only supports sorting by count or name", "red", bold=True)
+        return 1
+
+    if not scl_config.metadata_journal:
+        print_color("The --quick option requires the metadata journal", "red", bold=True)
+        return 1
+
+    directories = get_selected_data_directories(scl_config, args)
+    own_directory = os.path.abspath(scl_config.output_dir)
+    # The indexes of other data directories are used, but not created or updated
+    sketches_list = map_data_directories(lambda x: update_duration_index(x, save_index=os.path.abspath(x) == own_directory), directories)
+    for directory, sketches in zip(directories, sketches_list):
+        if sketches is None:
+            print_color(f"The --quick option requires a complete metadata journal, but '{directory}' has none. You can create it with 'scl journal --rebuild'", "red", bold=True)
+            return 1
+
+    groups = group_duration_sketches(merge_duration_sketches(sketches_list), args.group_by)  # type: ignore
+    if args.sort == "name":
+        groups.sort(key=lambda group: group[0])
+    else:
+        groups.sort(key=lambda group: group[1].count, reverse=True)
+    if args.limit != None:
+        groups = groups[:args.limit]
+
+    rows = [[args.group_by, "count", "p50", "p95", "p99", "max"]]
+    for name, sketch in groups:
+        rows.append([
+            name,
+            str(sketch.count),
+            format_duration(sketch.get_quantile(0.5)),
+            format_duration(sketch.get_quantile(0.95)),
+            format_duration(sketch.get_quantile(0.99)),
+            format_duration(sketch.max),
+        ])
+    print_table(rows)
+    return 0
+
+
+def print_table(rows: List[List[str]]) -> None:
+    widths = [max(len(row[index]) for row in rows) for index in range(len(rows[0]))]
+    for row in rows:
+        # Left align the name, right align the numbers
+        cells = [row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])]
+        print("  ".join(cells))
@@ -0,0 +1,88 @@
+import os
+import shutil
+# import the code from this package
+from shell_command_logger import print_color
+from shell_command_logger.config import load_config, sanitize_config
+from shell_command_logger.backports import parse_datetime_string
+from shell_command_logger.search import get_searchable_commands_from_directories, is_running_during_timeframe, parse_metadata
+from shell_command_logger.timeline import sweep, get_peak, get_bucket_levels, render_levels
+from shell_command_logger.cli.search import populate_filter_arguments, populate_data_directory_arguments, get_selected_data_directories, apply_filters
+
+SUBCOMMAND_NAMES = ["timeline"]
+ARG_PARSER_OPTIONS = {
+    "description": "This command shows how many of the logged commands were running at the same time during a time window. It accepts the same filters as the search command",
+    "help": "show how many commands were running at the same time",
+}
+# Shown when a time window contains many commands
+MAX_LISTED_COMMANDS = 20
+
+def populate_agrument_parser(ap) -> None:
+    """
+    Populates an argparse.ArgumentParser or an subcommand argument parser
+    """
+    ap.add_argument("--from", dest="window_start", metavar="TIME", help="the start of the time window (in UTC). Defaults to the start of the first command")
+    ap.add_argument("--to", dest="window_end", metavar="TIME", help="the end of the time window (in UTC). Defaults to the end of the last command")
+    ap.add_argument("--overlaps", metavar="METADATA_FILE", help="use the time while the given command was running as the time window and list all commands, that were running at the same time")
+    ap.add_argument("-w", "--width", type=int, help="the number of characters used for the timeline. Defaults to the width of the terminal")
+    ap.add_argument("-l", "--list", action="store_true", help="list the commands, that were running during the time window")
+    populate_filter_arguments(ap)
+    populate_data_directory_arguments(ap)
+
+
+def subcommand_main(args) -> int:
+    """
+    This method expects the parsed arguments from an argument parser that was set up with `populate_agrument_parser()`.
+    It returns an unix-like status code (0 -> success, everything else -> error).
+    """
+    scl_config = sanitize_config(load_config())
+    search_results = get_searchable_commands_from_directories(scl_config, get_selected_data_directories(scl_config, args))
+    search_results = apply_filters(args, search_results)
+
+    if args.overlaps:
+        target_file = os.path.realpath(os.path.expanduser(args.overlaps))
+        target = parse_metadata(target_file)
+        window_start, window_end = target.start_time_utc, target.end_time_utc
+        # Do not list the target itself. The given path may be relative or contain symlinks
+        search_results = [x for x in search_results if os.path.realpath(x.file_path) != target_file]
+    elif search_results:
+        window_start = min(x.metadata.start_time_utc for x in search_results)
+        window_end = max(x.metadata.end_time_utc for x in search_results)
+    else:
+        print("No commands found")
+        return 0
+
+    if args.window_start:
+        window_start = parse_datetime_string(args.window_start)
+    if args.window_end:
+        window_end = parse_datetime_string(args.window_end)
+    if window_end < window_start:
+        print_color("The end of the time window is before its start", "red", bold=True)
+        return 1
+
+    in_window = [x for x in search_results if is_running_during_timeframe(x.metadata, window_start, window_end)]
+    # Only the part of each command inside the time window is relevant
+    intervals = [(max(x.metadata.start_time_utc, window_start), min(x.metadata.end_time_utc, window_end)) for x in in_window]
+    points = sweep(intervals)
+    peak = get_peak(points)
+    max_level = peak.peak if peak else 0
+
+    width = args.width or shutil.get_terminal_size().columns
+    levels = get_bucket_levels(points, window_start, window_end, max(width, 1))
+    start_label = window_start.strftime("%Y-%m-%d %H:%M:%S")
+    end_label = window_end.strftime("%Y-%m-%d %H:%M:%S UTC")
+    print(start_label + end_label.rjust(max(width - len(start_label), len(end_label) + 1)))
+    print(render_levels(levels, max_level))
+    print(f"{len(in_window)} command(s) in the time window")
+    if peak and max_level > 0:
+        print(f"At most {max_level} command(s) were running at the same time (first at {peak.time.strftime('%Y-%m-%d %H:%M:%S')} UTC)")
+
+    if args.list or args.overlaps:
+        in_window.sort(key=lambda x: x.metadata.start_time_utc)
+        for result in in_window[:MAX_LISTED_COMMANDS] if not args.list else in_window:
+            metadata = result.metadata
+            print(f"{metadata.start_time_utc.strftime('%H:%M:%S')} - {metadata.end_time_utc.strftime('%H:%M:%S')}  {result.file_path}")
+        if not args.list and len(in_window) > MAX_LISTED_COMMANDS:
+            print(f"... and {len(in_window) - MAX_LISTED_COMMANDS} more. Use --list to show all")
+
+    # By default return 0 (success)
+    return 0
@@ -0,0 +1,166 @@
+import json
+import os
+from typing import Iterable, Optional, TextIO
+# local files
+from .journal import get_recording_id_from_metadata_path
+from .search import SearchableCommand
+from .backports import Dict, List, Tuple
+
+# Exports the metadata of many recordings into a single file with one column per field.
+# Rows are buffered and written in row groups of a fixed size, so the buffered rows do not depend on the number of recordings.
+# The recordings are listed like for `scl search` before the first row is written, so their parsed metadata is kept in memory during the export.
+# Columns with few distinct values (user, host, program, working directory) are dictionary encoded and timestamps are stored as seconds since the epoch.
+FORMAT_PARQUET = "parquet"
+# One JSON object per line: a header with the column types followed by one object per row group
+FORMAT_JSON = "json"
+FORMATS = [FORMAT_PARQUET, FORMAT_JSON]
+
+_TYPE_STRING = "string"
+_TYPE_DICTIONARY = "dictionary"
+_TYPE_STRING_LIST = "string_list"
+_TYPE_INT = "int"
+# Seconds since the epoch (UTC)
+_TYPE_EPOCH = "epoch_seconds"
+
+COLUMNS: List[Tuple[str, str]] = [
+    ("recording_id", _TYPE_STRING),
+    ("program", _TYPE_DICTIONARY),
+    ("command", _TYPE_STRING_LIST),
+    ("user", _TYPE_DICTIONARY),
+    ("hostname", _TYPE_DICTIONARY),
+    ("working_dir", _TYPE_DICTIONARY),
+    ("start_time", _TYPE_EPOCH),
+    ("end_time", _TYPE_EPOCH),
+    ("status_code", _TYPE_INT),
+    ("error_message", _TYPE_STRING),
+    ("output_bytes", _TYPE_INT),
+]
+DEFAULT_ROW_GROUP_SIZE = 64 * 1024
+JSON_FORMAT_NAME = "scl-columnar-metadata"
+JSON_FORMAT_VERSION = 1
+
+
+class ExportException(Exception):
+    pass
+
+
+class ColumnarWriter:
+    def __init__(self, row_group_size: int) -> None:
+        self.row_group_size = row_group_size
+        self.columns: Dict[str, list] = {name: [] for name, _ in COLUMNS}
+        self.buffered_rows = 0
+        self.row_count = 0
+
+    def add_row(self, row: dict) -> None:
+        for name, values in self.columns.items():
+            values.append(row[name])
+        self.buffered_rows += 1
+        self.row_count += 1
+        if self.buffered_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffered_rows:
+            self.write_row_group()
+            for values in self.columns.values():
+                values.clear()
+            self.buffered_rows = 0
+
+    def write_row_group(self) -> None:
+        raise Exception("Not implemented")
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class JsonColumnarWriter(ColumnarWriter):
+    def __init__(self, output: TextIO, row_group_size: int) -> None:
+        super().__init__(row_group_size)
+        self.output = output
+        header = {"format": JSON_FORMAT_NAME, "version": JSON_FORMAT_VERSION, "columns": dict(COLUMNS)}
+        self.output.write(json.dumps(header) + "\n")
+
+    def write_row_group(self) -> None:
+        encoded_columns = {}
+        for name, column_type in COLUMNS:
+            values = self.columns[name]
+            if column_type == _TYPE_DICTIONARY:
+                dictionary: Dict[str, int] = {}
+                indices = [dictionary.setdefault(value, len(dictionary)) if value != None else None for value in values]
+                encoded_columns[name] = {"dictionary": list(dictionary), "indices": indices}
+            else:
+                encoded_columns[name] = values
+        row_group = {"rows": self.buffered_rows, "columns": encoded_columns}
+        self.output.write(json.dumps(row_group, separators=(",", ":")) + "\n")
+
+
+class ParquetColumnarWriter(ColumnarWriter):
+    def __init__(self, output_file: str, row_group_size: int) -> None:
+        super().__init__(row_group_size)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportException("Writing Parquet files requires the 'pyarrow' package. Install it or use the JSON format instead")
+        self.pa = pyarrow
+        arrow_types = {
+            _TYPE_STRING: pyarrow.string(),
+            _TYPE_DICTIONARY: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+            _TYPE_STRING_LIST: pyarrow.list_(pyarrow.string()),
+            _TYPE_INT: pyarrow.int64(),
+            _TYPE_EPOCH: pyarrow.int64(),
+        }
+        self.schema = pyarrow.schema([(name, arrow_types[column_type]) for name, column_type in COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(output_file, self.schema)
+
+    def write_row_group(self) -> None:
+        arrays = []
+        for name, column_type in COLUMNS:
+            if column_type == _TYPE_DICTIONARY:
+                arrays.append(self.pa.array(self.columns[name], type=self.pa.string()).dictionary_encode())
+            else:
+                arrays.append(self.pa.array(self.columns[name], type=self.schema.field(name).type))
+        table = self.pa.Table.from_arrays(arrays, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.buffered_rows)
+
+    def close(self) -> None:
+        super().close()
+        self.writer.close()
+
+
+def to_row(output_dir: str, command: SearchableCommand) -> dict:
+    metadata = command.metadata
+    return {
+        # Does not change when the recording is moved into a segment
+        "recording_id": get_recording_id_from_metadata_path(output_dir, command.file_path),
+        "program": os.path.basename(metadata.command[0]),
+        "command": metadata.command,
+        "user": metadata.user,
+        "hostname": metadata.hostname,
+        "working_dir": metadata.working_dir,
+        "start_time": int(metadata.start_time_utc.timestamp()),
+        "end_time": int(metadata.end_time_utc.timestamp()),
+        "status_code": metadata.status_code,
+        "error_message": metadata.error_message,
+        "output_bytes": metadata.output_bytes,
+    }
+
+
+def export_metadata(output_dir: str, commands: Iterable[SearchableCommand], writer: ColumnarWriter, since: Optional[int], until: int) -> int:
+    """
+    Writes all recordings, that finished in the time range [since, until), to the writer. Returns the number of exported recordings
+    """
+    for command in commands:
+        if command.metadata.running:
+            continue
+        end_time = int(command.metadata.end_time_utc.timestamp())
+        if (since == None or end_time >= since) and end_time < until:
+            writer.add_row(to_row(output_dir, command))
+    writer.flush()
+    return writer.row_count
@@ -6,7 +6,12 @@ from typing import NamedTuple
 from shell_command_logger.logger import get_best_backend_name, get_logger_backend
 # local
 from . import get_name_and_version, print_error, DoNotPrintMeException, print_color
+from .debug import debug_function
 from .logger.base_class import LoggerBackend
+from .logger.output_limit import OUTPUT_LIMIT_MODES, OUTPUT_LIMIT_STOP
+from .pretty_exec import WRITE_POLICIES, WRITE_POLICY_BATCHED, WRITE_POLICY_FAST
+from .recording_policy import POLICY_SECTION, RecordingPolicyException, parse_recording_policy
+from .backports import Dict, List
 
 class InvalidConfigException(Exception):
     pass
@@ -15,9 +20,25 @@ class InvalidConfigException(Exception):
 class SclConfig(NamedTuple):
     # output settings
     output_dir: str
+    # Other data directories (for example from other hosts on a shared filesystem), that are searched but never written to
+    extra_output_dirs: List[str]
     add_readme: bool
     script_output_limit: int
+    # What to do when the output is larger than script_output_limit: "stop" recording or keep the "head-tail"
+    output_limit_mode: str
+    # The number of bytes to keep from the end of the output in "head-tail" mode
+    output_tail_limit: int
     file_name_random_bytes: int
+    # Append the metadata to a journal file and use it for searching instead of reading every metadata file
+    metadata_journal: bool
+    # How to write metadata files: fast, safe or batched (see pretty_exec.py)
+    metadata_write_policy: str
+    # Store identical outputs only once
+    deduplicate_output: bool
+    # Create a compressed plain text copy of each output (without escape sequences) in the background, which is used for searching
+    plain_text_sidecars: bool
+    # Program name (or "*" for all other programs) -> rules limiting how often it is recorded (see recording_policy.py)
+    recording_policies: Dict[str, str]
     # replay settings
     command_format: str
     replay_speed: float
@@ -37,11 +58,18 @@ NO_BACKEND_INITIALIZED = LoggerBackend()
 
 _KEY_SECTION = "config"
 _KEY_DATA_DIRECTORY = "data-directory"
+_KEY_EXTRA_DATA_DIRECTORIES = "extra-data-directories"
 _KEY_ADD_README_FILE = "create-readme"
 _KEY_COMMAND_FORMAT = "command-format"
 _KEY_REPLAY_SPEED = "replay-speed"
 _KEY_OUTPUT_LIMIT = "script-output-limit"
+_KEY_OUTPUT_LIMIT_MODE = "output-limit-mode"
+_KEY_OUTPUT_TAIL_LIMIT = "output-tail-limit"
 _KEY_FILE_NAME_RANDOM_BYTES = "file-name-random-bytes"
+_KEY_METADATA_JOURNAL = "metadata-journal"
+_KEY_METADATA_WRITE_POLICY = "metadata-write-policy"
+_KEY_DEDUPLICATE_OUTPUT = "deduplicate-output"
+_KEY_PLAIN_TEXT_SIDECARS = "plain-text-sidecars"
 _KEY_FZF_EXECUTABLE = "fzf-command"
 _KEY_SYMLINK_DIR = "symlink-directory"
 _KEY_BACKEND = "backend"
@@ -49,11 +77,19 @@ _KEY_BACKEND = "backend"
 
 DEFAULT_CONFIG = SclConfig(
     output_dir="~/.shell-command-logs/",
+    extra_output_dirs=[],
     add_readme=True,
     command_format="[ {start_time} | {success} ] {command}",
     replay_speed=1.0,
     script_output_limit=1024*1024*1024, # One gigabyte
+    output_limit_mode=OUTPUT_LIMIT_STOP,
+    output_tail_limit=64*1024*1024, # 64 megabytes
     file_name_random_bytes=2,
+    metadata_journal=True,
+    metadata_write_policy=WRITE_POLICY_FAST,
+    deduplicate_output=False,
+    plain_text_sidecars=False,
+    recording_policies={},
     fzf_executable="fzf",
     symlink_dir="~/.local/share/shell-command-logger/bin",
     backend_name=get_best_backend_name(),
@@ -61,9 +97,12 @@ DEFAULT_CONFIG = SclConfig(
 )
 
 
+@debug_function
 def sanitize_config(config: SclConfig) -> SclConfig:
     output_dir = os.path.expanduser(config.output_dir)
     symlink_dir = os.path.expanduser(config.symlink_dir)
+    # The directories may not be mounted right now, so they are only checked when they are searched
+    extra_output_dirs = [os.path.expanduser(x) for x in config.extra_output_dirs]
 
     ensure_directory_exists(output_dir)
     ensure_directory_exists(symlink_dir)
@@ -77,16 +116,51 @@ def sanitize_config(config: SclConfig) -> SclConfig:
     if config.replay_speed <= 0:
         raise InvalidConfigException(f"Config setting '{_KEY_REPLAY_SPEED}' needs to be larger than zero")
 
+    if config.output_limit_mode not in OUTPUT_LIMIT_MODES:
+        raise InvalidConfigException(f"Config setting '{_KEY_OUTPUT_LIMIT_MODE}' needs to be one of: {', '.join(OUTPUT_LIMIT_MODES)}")
+
+    if config.output_tail_limit < 0:
+        raise InvalidConfigException(f"Config setting '{_KEY_OUTPUT_TAIL_LIMIT}' can not be negative")
+
+    if config.metadata_write_policy not in WRITE_POLICIES:
+        raise InvalidConfigException(f"Config setting '{_KEY_METADATA_WRITE_POLICY}' needs to be one of: {', '.join(WRITE_POLICIES)}")
+
+    if config.metadata_write_policy == WRITE_POLICY_BATCHED and not config.metadata_journal:
+        raise InvalidConfigException(f"Config setting '{_KEY_METADATA_WRITE_POLICY}' can only be '{WRITE_POLICY_BATCHED}', if '{_KEY_METADATA_JOURNAL}' is enabled")
+
     if config.file_name_random_bytes < 1 or config.file_name_random_bytes > 100:
         raise InvalidConfigException(f"Config setting '{_KEY_FILE_NAME_RANDOM_BYTES}' needs to be between 1 and 100")
 
+    for program, policy in config.recording_policies.items():
+        try:
+            parse_recording_policy(policy)
+        except RecordingPolicyException as ex:
+            raise InvalidConfigException(f"Invalid recording policy for '{program}' in section '{POLICY_SECTION}': {ex}")
+
     # Try loading the correct backend module
     try:
         backend = get_logger_backend(config.backend_name)
     except Exception as ex:
         raise InvalidConfigException(f"Failed to load backend '{config.backend_name}': {ex}")
 
-    return config._replace(output_dir=output_dir, symlink_dir=symlink_dir, backend=backend)
+    if config.output_limit_mode not in backend.supported_output_limit_modes:
+        raise InvalidConfigException(f"Config setting '{_KEY_OUTPUT_LIMIT_MODE}' can not be '{config.output_limit_mode}' with backend '{config.backend_name}'. Supported modes: {', '.join(backend.supported_output_limit_modes)}")
+
+    return config._replace(output_dir=output_dir, extra_output_dirs=extra_output_dirs, symlink_dir=symlink_dir, backend=backend)
+
+
+def get_data_directories(scl_config: SclConfig) -> List[str]:
+    """
+    Returns the data directory followed by the extra data directories. Directories, that are listed multiple times, are only returned once
+    """
+    results: List[str] = []
+    seen = set()
+    for directory in [scl_config.output_dir] + scl_config.extra_output_dirs:
+        normalized = os.path.abspath(directory)
+        if normalized not in seen:
+            seen.add(normalized)
+            results.append(directory)
+    return results
 
 
 def ensure_directory_exists(path: str) -> None:
@@ -123,6 +197,7 @@ def create_template_file(output_dir: str) -> None:
             print_error("[ERROR] Failed to create the template file", print_stacktrace=True)
 
 
+@debug_function
 def load_config() -> SclConfig:
     try:
         if os.path.isfile(CONFIG_FILE):
@@ -155,6 +230,8 @@ def parse_config_file(path: str) -> SclConfig:
 
     # Read values from the config file. If not defined, use the default value
     output_dir = section_config.get(_KEY_DATA_DIRECTORY, DEFAULT_CONFIG.output_dir)
+    extra_output_dirs_str = section_config.get(_KEY_EXTRA_DATA_DIRECTORIES, os.pathsep.join(DEFAULT_CONFIG.extra_output_dirs))
+    extra_output_dirs = [x.strip() for x in extra_output_dirs_str.split(os.pathsep) if x.strip()]
     add_readme = section_config.getboolean(_KEY_ADD_README_FILE, DEFAULT_CONFIG.add_readme)
     command_format = section_config.get(_KEY_COMMAND_FORMAT, DEFAULT_CONFIG.command_format)
     replay_speed = section_config.getfloat(_KEY_REPLAY_SPEED, DEFAULT_CONFIG.replay_speed)
@@ -162,18 +239,37 @@ def parse_config_file(path: str) -> SclConfig:
         script_output_limit = int(section_config.get(_KEY_OUTPUT_LIMIT, str(DEFAULT_CONFIG.script_output_limit)))
     except ValueError: # Handle the case where the input is not a valid number
         script_output_limit = DEFAULT_CONFIG.script_output_limit
+    output_limit_mode = section_config.get(_KEY_OUTPUT_LIMIT_MODE, DEFAULT_CONFIG.output_limit_mode)
+    try:
+        output_tail_limit = int(section_config.get(_KEY_OUTPUT_TAIL_LIMIT, str(DEFAULT_CONFIG.output_tail_limit)))
+    except ValueError:
+        output_tail_limit = DEFAULT_CONFIG.output_tail_limit
     file_name_random_bytes = section_config.getint(_KEY_FILE_NAME_RANDOM_BYTES, DEFAULT_CONFIG.file_name_random_bytes)
+    metadata_journal = section_config.getboolean(_KEY_METADATA_JOURNAL, DEFAULT_CONFIG.metadata_journal)
+    metadata_write_policy = section_config.get(_KEY_METADATA_WRITE_POLICY, DEFAULT_CONFIG.metadata_write_policy)
+    deduplicate_output = section_config.getboolean(_KEY_DEDUPLICATE_OUTPUT, DEFAULT_CONFIG.deduplicate_output)
+    plain_text_sidecars = section_config.getboolean(_KEY_PLAIN_TEXT_SIDECARS, DEFAULT_CONFIG.plain_text_sidecars)
     fzf_executable = section_config.get(_KEY_FZF_EXECUTABLE, DEFAULT_CONFIG.fzf_executable)
     symlink_dir = section_config.get(_KEY_SYMLINK_DIR, DEFAULT_CONFIG.symlink_dir)
     backend_name = section_config.get(_KEY_BACKEND, DEFAULT_CONFIG.backend_name)
+    # Optional section, the keys are program names
+    recording_policies = dict(config[POLICY_SECTION]) if config.has_section(POLICY_SECTION) else DEFAULT_CONFIG.recording_policies
 
     return SclConfig(
         output_dir=output_dir,
+        extra_output_dirs=extra_output_dirs,
         add_readme=add_readme,
         command_format=command_format,
         replay_speed=replay_speed,
         script_output_limit=script_output_limit,
+        output_limit_mode=output_limit_mode,
+        output_tail_limit=output_tail_limit,
         file_name_random_bytes=file_name_random_bytes,
+        metadata_journal=metadata_journal,
+        metadata_write_policy=metadata_write_policy,
+        deduplicate_output=deduplicate_output,
+        plain_text_sidecars=plain_text_sidecars,
+        recording_policies=recording_policies,
         fzf_executable=fzf_executable,
         symlink_dir=symlink_dir,
         backend_name=backend_name,
@@ -184,11 +280,18 @@ def parse_config_file(path: str) -> SclConfig:
 def config_to_parser(scl_config: SclConfig) -> ConfigParser:
     config_as_dict: dict = {
         _KEY_DATA_DIRECTORY: scl_config.output_dir,
+        _KEY_EXTRA_DATA_DIRECTORIES: os.pathsep.join(scl_config.extra_output_dirs),
         _KEY_ADD_README_FILE: scl_config.add_readme,
         _KEY_COMMAND_FORMAT: scl_config.command_format,
         _KEY_REPLAY_SPEED: scl_config.replay_speed,
         _KEY_OUTPUT_LIMIT: scl_config.script_output_limit,
+        _KEY_OUTPUT_LIMIT_MODE: scl_config.output_limit_mode,
+        _KEY_OUTPUT_TAIL_LIMIT: scl_config.output_tail_limit,
         _KEY_FILE_NAME_RANDOM_BYTES: scl_config.file_name_random_bytes,
+        _KEY_METADATA_JOURNAL: scl_config.metadata_journal,
+        _KEY_METADATA_WRITE_POLICY: scl_config.metadata_write_policy,
+        _KEY_DEDUPLICATE_OUTPUT: scl_config.deduplicate_output,
+        _KEY_PLAIN_TEXT_SIDECARS: scl_config.plain_text_sidecars,
         _KEY_FZF_EXECUTABLE: scl_config.fzf_executable,
         _KEY_SYMLINK_DIR: scl_config.symlink_dir,
         _KEY_BACKEND: scl_config.backend_name,
@@ -196,6 +299,8 @@ def config_to_parser(scl_config: SclConfig) -> ConfigParser:
 
     parser = ConfigParser()
     parser[_KEY_SECTION] = config_as_dict
+    if scl_config.recording_policies:
+        parser[POLICY_SECTION] = scl_config.recording_policies
     return parser
 
 
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from typing import Optional
+# local files
+from .journal import JournalFollower, complete_unfinished_metadata, rebuild_journal
+from .segment import split_segment_path
+from .storage import list_metadata_files, read_recording_file
+from .backports import Dict, List, Tuple
+
+# `scl daemon` keeps the metadata of all recordings in the data directory in memory and answers queries over a Unix socket in the data directory.
+# It follows the journal (or polls the metadata files, if the journal is disabled), so it only reads what changed.
+#
+# Protocol: The client sends one JSON request line and closes its side of the connection.
+# The daemon answers with a JSON header line. For the "commands" request `count` lines follow, each containing [metadata file relative to the data directory, metadata].
+DAEMON_SOCKET_NAME = ".daemon.sock"
+DAEMON_PROTOCOL_VERSION = 2
+REQUEST_PING = "ping"
+REQUEST_COMMANDS = "commands"
+REQUEST_STOP = "stop"
+# The client scans the data directory itself, if the daemon does not answer in time
+_CLIENT_TIMEOUT = 10
+_MAX_REQUEST_SIZE = 64 * 1024
+
+
+class DaemonException(Exception):
+    pass
+
+
+def get_daemon_socket(output_dir: str) -> str:
+    return os.path.join(output_dir, DAEMON_SOCKET_NAME)
+
+
+def request_daemon(output_dir: str, request_type: str, **kwargs) -> Tuple[dict, List[bytes]]:
+    """
+    Sends a request to the daemon and returns the header and the remaining lines of the response
+    """
+    request = {"version": DAEMON_PROTOCOL_VERSION, "request": request_type, **kwargs}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(_CLIENT_TIMEOUT)
+        client.connect(get_daemon_socket(output_dir))
+        client.sendall(json.dumps(request).encode() + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as f:
+            header = json.loads(f.readline() or b"{}")
+            if not header.get("ok"):
+                raise DaemonException(header.get("error", "Empty response"))
+            lines = f.read().splitlines()
+    if len(lines) != header.get("count", 0):
+        raise DaemonException(f"Incomplete response: expected {header.get('count')} lines, got {len(lines)}")
+    return (header, lines)
+
+
+def get_recordings_from_daemon(output_dir: str, use_journal: bool, include_unfinished: bool = False) -> Optional[List[Tuple[str, dict]]]:
+    """
+    Returns the metadata file and metadata of every recording, if a daemon is running for the data directory. Otherwise returns None
+    """
+    if not os.path.exists(get_daemon_socket(output_dir)):
+        return None
+    try:
+        _, lines = request_daemon(output_dir, REQUEST_COMMANDS, metadata_journal=use_journal, include_unfinished=include_unfinished)
+        results = []
+        for line in lines:
+            metadata_path, data = json.loads(line)
+            results.append((os.path.join(output_dir, metadata_path), data))
+        return results
+    except (OSError, ValueError, DaemonException) as ex:
+        # For example a socket left behind by a daemon, that was killed. The caller falls back to reading the data directory
+        logging.debug(f"Not using the daemon: {ex}")
+        return None
+
+
+def _encode_recording(metadata_path: str, data: dict) -> bytes:
+    return json.dumps([metadata_path, data], separators=(",", ":")).encode() + b"\n"
+
+
+class RecordingCache:
+    """
+    The metadata of all recordings in a data directory, already encoded as response lines. `refresh()` only reads what changed since the last call
+    """
+    def __init__(self, output_dir: str, use_journal: bool) -> None:
+        self.output_dir = output_dir
+        self.use_journal = use_journal
+        # Protects the cache, since requests are handled in parallel to the polling
+        self.lock = threading.Lock()
+        self._journal = JournalFollower(output_dir) if use_journal else None
+        # Journal: recording ID -> line (None for recordings that have not finished yet, since their metadata changes while they run)
+        self._journal_lines: Dict[str, Optional[bytes]] = {}
+        # No journal: metadata file -> ((mtime, size) of the file it was read from, line)
+        self._file_lines: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+
+    def refresh(self) -> None:
+        if self._journal:
+            self._refresh_journal(self._journal)
+        else:
+            self._refresh_files()
+
+    def _refresh_journal(self, journal: JournalFollower) -> None:
+        changed_ids = journal.update()
+        if journal.records is None:
+            # Same as `scl search`: the journal does not exist yet or was created before the journal was enabled
+            print("Creating the journal for the data directory. This may take a while", file=sys.stderr)
+            rebuild_journal(self.output_dir)
+            changed_ids = journal.update()
+            if journal.records is None:
+                raise DaemonException("The journal is not usable after rebuilding it")
+
+        if changed_ids is None:
+            self._journal_lines = {}
+            changed_ids = list(journal.records)
+        for recording_id in changed_ids:
+            record = journal.records.get(recording_id)
+            if record is None:
+                self._journal_lines.pop(recording_id, None)
+            elif record.is_finished():
+                self._journal_lines[recording_id] = _encode_recording(record.metadata_path, record.data)
+            else:
+                self._journal_lines[recording_id] = None
+
+    def _refresh_files(self) -> None:
+        file_lines: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+        # Each segment contains many recordings, so it is only checked once
+        stat_cache: Dict[str, Optional[Tuple[int, int]]] = {}
+        for metadata_file in list_metadata_files(self.output_dir):
+            segment_and_name = split_segment_path(metadata_file)
+            stored_file = segment_and_name[0] if segment_and_name else metadata_file
+            if stored_file not in stat_cache:
+                try:
+                    stat = os.stat(stored_file)
+                    stat_cache[stored_file] = (stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    stat_cache[stored_file] = None
+            version = stat_cache[stored_file]
+            if version is None:
+                continue
+
+            cached = self._file_lines.get(metadata_file)
+            if cached and cached[0] == version:
+                file_lines[metadata_file] = cached
+                continue
+            try:
+                data = json.loads(read_recording_file(metadata_file))
+            except Exception as ex:
+                print(f"Error parsing metadata file '{metadata_file}': ", ex, file=sys.stderr)
+                continue
+            file_lines[metadata_file] = (version, _encode_recording(os.path.relpath(metadata_file, self.output_dir), data))
+        self._file_lines = file_lines
+
+    def get_lines(self, include_unfinished: bool = True) -> List[bytes]:
+        if not self._journal:
+            return [line for _, line in self._file_lines.values()]
+
+        records = self._journal.records or {}
+        lines = []
+        for recording_id, line in self._journal_lines.items():
+            if line is None:
+                if not include_unfinished:
+                    continue
+                # Whether the command is still running is checked for every request
+                record = records[recording_id]
+                line = _encode_recording(record.metadata_path, complete_unfinished_metadata(record))
+            lines.append(line)
+        return lines
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, cache: RecordingCache) -> None:
+        self.cache = cache
+        # Only the owner of the data directory may connect
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: _DaemonServer
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline(_MAX_REQUEST_SIZE))
+            if request.get("version") != DAEMON_PROTOCOL_VERSION:
+                raise DaemonException(f"Unsupported protocol version {request.get('version')}, the daemon uses version {DAEMON_PROTOCOL_VERSION}")
+            request_type = request.get("request")
+            cache = self.server.cache
+            if request_type == REQUEST_PING:
+                with cache.lock:
+                    count = len(cache.get_lines())
+                self._respond({"pid": os.getpid(), "output_dir": cache.output_dir, "metadata_journal": cache.use_journal, "recordings": count})
+            elif request_type == REQUEST_COMMANDS:
+                if request.get("metadata_journal") != cache.use_journal:
+                    raise DaemonException("The metadata-journal setting changed since the daemon was started")
+                with cache.lock:
+                    if cache.use_journal:
+                        # Reading the end of the journal is cheap, so the answer is always up to date
+                        cache.refresh()
+                    lines = cache.get_lines(request.get("include_unfinished") == True)
+                self._respond({"count": len(lines)}, lines)
+            elif request_type == REQUEST_STOP:
+                self._respond({"pid": os.getpid()})
+                # shutdown() waits for serve_forever() to return, so it can not be called by the thread serving the request
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                raise DaemonException(f"Unknown request '{request_type}'")
+        except (DaemonException, ValueError, AttributeError) as ex:
+            self._respond_error(str(ex))
+        except Exception as ex:
+            print("Error handling request: ", ex, file=sys.stderr)
+            self._respond_error(f"Internal error: {ex}")
+
+    def _respond(self, header: dict, lines: List[bytes] = []) -> None:
+        try:
+            self.wfile.write(json.dumps({"ok": True, **header}).encode() + b"\n")
+            self.wfile.write(b"".join(lines))
+        except BrokenPipeError:
+            # The client gave up
+            pass
+
+    def _respond_error(self, message: str) -> None:
+        try:
+            self.wfile.write(json.dumps({"ok": False, "error": message}).encode() + b"\n")
+        except BrokenPipeError:
+            pass
+
+
+def _poll(cache: RecordingCache, interval: float, stop_event: threading.Event) -> None:
+    while not stop_event.wait(interval):
+        try:
+            with cache.lock:
+                cache.refresh()
+        except Exception as ex:
+            print("Error updating the metadata: ", ex, file=sys.stderr)
+
+
+def run_daemon(output_dir: str, use_journal: bool, poll_interval: float) -> None:
+    """
+    Serves requests until it is stopped with a stop request, SIGTERM or SIGINT
+    """
+    socket_path = get_daemon_socket(output_dir)
+    if os.path.exists(socket_path):
+        try:
+            header, _ = request_daemon(output_dir, REQUEST_PING)
+            raise DaemonException(f"The daemon is already running with pid {header.get('pid')}")
+        except (OSError, ValueError):
+            # Nobody is listening
+            os.remove(socket_path)
+
+    cache = RecordingCache(output_dir, use_journal)
+    cache.refresh()
+    print(f"Loaded {len(cache.get_lines())} recording(s) from '{output_dir}'", file=sys.stderr)
+
+    server = _DaemonServer(socket_path, cache)
+    socket_id = os.stat(socket_path).st_ino
+    stop_event = threading.Event()
+    threading.Thread(target=_poll, args=(cache, poll_interval, stop_event), daemon=True).start()
+    # Leave serve_forever() through the finally block, so that the socket is removed
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+    print(f"Listening on '{socket_path}'", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+        try:
+            # Do not remove the socket of a daemon, that was started after this one
+            if os.stat(socket_path).st_ino == socket_id:
+                os.remove(socket_path)
+        except FileNotFoundError:
+            pass
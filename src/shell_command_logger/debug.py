@@ -1,8 +1,20 @@
+from contextlib import contextmanager
+import cProfile
 from functools import wraps
 import logging
-from typing import Callable
+import sys
+import time
+from typing import Callable, Iterator, Optional
+# local
+from .backports import Dict, List
 
 _DEBUG_FUNCTIONS = False
+_PROFILING = False
+# Maps span names to [number of calls, total duration in seconds]. Dicts keep the insertion order, so spans are shown in the order they were first entered
+_SPANS: Dict[str, List[float]] = {}
+_PROFILING_START = 0.0
+_PROFILER: Optional[cProfile.Profile] = None
+_PSTATS_FILE: Optional[str] = None
 
 def init_debugging(enabled: bool, debug_functions: bool = True) -> None:
     """
@@ -17,16 +29,86 @@ def init_debugging(enabled: bool, debug_functions: bool = True) -> None:
         logging.basicConfig(level=logging.DEBUG, format="%(levelname)s | %(message)s")
         logging.info("Enabled debugging mode")
 
+
+def init_profiling(pstats_file: Optional[str] = None) -> None:
+    """
+    Starts recording timing spans. If pstats_file is given, the whole run is also profiled with cProfile and the statistics are written to that file by `finish_profiling()`
+    """
+    global _PROFILING, _PROFILING_START, _PROFILER, _PSTATS_FILE
+    _PROFILING = True
+    _SPANS.clear()
+    _PSTATS_FILE = pstats_file
+    if pstats_file:
+        _PROFILER = cProfile.Profile()
+        _PROFILER.enable()
+    _PROFILING_START = time.perf_counter()
+
+
+def finish_profiling() -> None:
+    """
+    Stops profiling, prints the timing spans to stderr and writes the cProfile statistics (if requested)
+    """
+    global _PROFILING, _PROFILER
+    if not _PROFILING:
+        return
+
+    total = time.perf_counter() - _PROFILING_START
+    _PROFILING = False
+    if _PROFILER:
+        _PROFILER.disable()
+        try:
+            _PROFILER.dump_stats(_PSTATS_FILE)
+            print(f"Wrote profiling statistics to '{_PSTATS_FILE}'. You can view them with 'python3 -m pstats {_PSTATS_FILE}'", file=sys.stderr)
+        except OSError as ex:
+            print(f"Error writing profiling statistics to '{_PSTATS_FILE}': ", ex, file=sys.stderr)
+        _PROFILER = None
+
+    print_span_summary(total)
+
+
+def print_span_summary(total: float) -> None:
+    name_width = max([len(name) for name in _SPANS] + [len("span")])
+    print(f"{'span':<{name_width}} {'calls':>8} {'total':>10} {'share':>7}", file=sys.stderr)
+    for name, (calls, duration) in _SPANS.items():
+        share = duration / total * 100 if total > 0 else 0
+        print(f"{name:<{name_width}} {int(calls):>8} {duration * 1000:>8.1f}ms {share:>6.1f}%", file=sys.stderr)
+    print(f"{'total':<{name_width}} {'':>8} {total * 1000:>8.1f}ms", file=sys.stderr)
+
+
+@contextmanager
+def profile_span(name: str) -> Iterator[None]:
+    """
+    Measures the time spent in the with-block, if profiling is enabled. Spans with the same name are added up. Nested spans are counted in both spans
+    """
+    if not _PROFILING:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span = _SPANS.setdefault(name, [0, 0.0])
+        span[0] += 1
+        span[1] += time.perf_counter() - start
+
+
 def debug_function(function: Callable) -> Callable:
+    """
+    Logs the arguments and the return value of the function in debugging mode and records a timing span for each call when profiling
+    """
     @wraps(function)
     def wrapped(*args, **kwargs):
+        if not (_DEBUG_FUNCTIONS or _PROFILING):
+            return function(*args, **kwargs)
+
         if _DEBUG_FUNCTIONS:
             argument_string = f"args={list(args)}, kwargs={kwargs}" if kwargs else list(args)
             logging.debug(f"[Function {function.__name__}] Called with arguments: {argument_string}")
-        return_value = function(*args, **kwargs)
+        with profile_span(function.__name__):
+            return_value = function(*args, **kwargs)
         if _DEBUG_FUNCTIONS:
             logging.debug(f"[Function {function.__name__}] Returned value: {repr(return_value)}")
         return return_value
 
     return wrapped
-
@@ -0,0 +1,249 @@
+import hashlib
+import io
+import json
+import os
+import time
+from typing import BinaryIO
+# local files
+from .logger.output_limit import SCRIPT_FOOTER_START, SCRIPT_HEADER_START
+from .segment import SEGMENT_EXTENSION, read_member_table, open_member
+from .backports import Dict, List, Tuple
+
+# Identical outputs are only stored once in a content-addressed store: `<data_directory>/.blobs/<first two hex digits>/<sha256 digest>`.
+# The log file of a recording is replaced by a small reference file (`<name>.logref`), that contains the digest and the lines,
+# that `script` writes before and after the output (they contain timestamps, so they differ between recordings).
+BLOB_DIR_NAME = ".blobs"
+REFERENCE_SUFFIX = "ref"
+DIGEST_PREFIX = "sha256:"
+
+# The "Script done on ..." line is shorter than this
+_FOOTER_SEARCH_SIZE = 1024
+_BUFFER_SIZE = 1024 * 1024
+# Blobs, that were just created, may not be referenced yet. Temporary blobs may still be written
+_GC_GRACE_PERIOD_SECONDS = 60 * 60
+_TEMP_BLOB_PREFIX = "tmp-"
+
+# reference file -> blob store directory
+_BLOB_STORE_CACHE: Dict[str, str] = {}
+
+
+def get_reference_path(path: str) -> str:
+    return path + REFERENCE_SUFFIX
+
+
+def get_blob_path(blob_store: str, digest: str) -> str:
+    hex_digest = digest[len(DIGEST_PREFIX):]
+    return os.path.join(blob_store, hex_digest[:2], hex_digest)
+
+
+def _get_body_range(f: BinaryIO, file_size: int) -> Tuple[int, int]:
+    """
+    Returns the start and end of the output in a log file written by `script`
+    """
+    f.seek(0)
+    first_line = f.readline()
+    body_start = len(first_line) if first_line.startswith(SCRIPT_HEADER_START) else 0
+
+    search_start = max(body_start, file_size - _FOOTER_SEARCH_SIZE)
+    f.seek(search_start)
+    footer_start = f.read().rfind(SCRIPT_FOOTER_START)
+    body_end = search_start + footer_start if footer_start >= 0 else file_size
+    return (body_start, body_end)
+
+
+def get_output_digest(f: BinaryIO) -> str:
+    """
+    Returns the same digest as `deduplicate_log_file()` for an opened log file, without storing anything
+    """
+    f.seek(0, io.SEEK_END)
+    body_start, body_end = _get_body_range(f, f.tell())
+    f.seek(body_start)
+    hasher = hashlib.sha256()
+    remaining = body_end - body_start
+    while remaining > 0:
+        chunk = f.read(min(_BUFFER_SIZE, remaining))
+        if not chunk:
+            break
+        hasher.update(chunk)
+        remaining -= len(chunk)
+    return DIGEST_PREFIX + hasher.hexdigest()
+
+
+def deduplicate_log_file(output_dir: str, log_file: str) -> str:
+    """
+    Moves the output in the log file to the blob store and replaces the log file with a reference.
+    The output is hashed while it is copied, so the file is only read once. Returns the digest.
+    """
+    blob_store = os.path.join(output_dir, BLOB_DIR_NAME)
+    os.makedirs(blob_store, exist_ok=True)
+    temp_blob = os.path.join(blob_store, f"{_TEMP_BLOB_PREFIX}{os.getpid()}-{os.path.basename(log_file)}")
+
+    try:
+        with open(log_file, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            body_start, body_end = _get_body_range(f, file_size)
+            f.seek(0)
+            header = f.read(body_start)
+
+            hasher = hashlib.sha256()
+            with open(temp_blob, "wb") as blob:
+                remaining = body_end - body_start
+                while remaining > 0:
+                    chunk = f.read(min(_BUFFER_SIZE, remaining))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    blob.write(chunk)
+                    remaining -= len(chunk)
+            footer = f.read()
+
+        digest = DIGEST_PREFIX + hasher.hexdigest()
+        blob_path = get_blob_path(blob_store, digest)
+        if os.path.exists(blob_path):
+            # Update the modification time, so that the garbage collector does not delete it before the reference is written
+            os.utime(blob_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(temp_blob, blob_path)
+    finally:
+        # Not moved to the store: the blob already exists or writing it failed (for example no space left)
+        if os.path.exists(temp_blob):
+            os.remove(temp_blob)
+
+    reference = {
+        "digest": digest,
+        "header": header.decode("utf-8", "surrogateescape"),
+        "footer": footer.decode("utf-8", "surrogateescape"),
+    }
+    reference_path = get_reference_path(log_file)
+    with open(f"{reference_path}.tmp", "w") as f:
+        json.dump(reference, f, ensure_ascii=True)
+    os.replace(f"{reference_path}.tmp", reference_path)
+    os.remove(log_file)
+    return digest
+
+
+class _ConcatReader(io.RawIOBase):
+    """
+    Reads multiple file objects one after another
+    """
+    def __init__(self, parts: List[BinaryIO]) -> None:
+        super().__init__()
+        self._parts = parts
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._parts:
+            count = self._parts[0].readinto(buffer) # type: ignore
+            if count:
+                return count
+            self._parts.pop(0).close()
+        return 0
+
+    def close(self) -> None:
+        for part in self._parts:
+            part.close()
+        super().close()
+
+
+def _find_blob_store(reference_path: str) -> str:
+    # References may be in a program folder or in a segment inside a program folder, so we look for the data directory
+    directory = os.path.dirname(reference_path)
+    cached = _BLOB_STORE_CACHE.get(directory)
+    if cached:
+        return cached
+
+    current = directory
+    while True:
+        candidate = os.path.join(current, BLOB_DIR_NAME)
+        if os.path.isdir(candidate):
+            _BLOB_STORE_CACHE[directory] = candidate
+            return candidate
+        parent = os.path.dirname(current)
+        if parent == current:
+            raise FileNotFoundError(f"No blob store found for '{reference_path}'")
+        current = parent
+
+
+def open_referenced_file(reference_path: str, reference_data: bytes) -> Tuple[BinaryIO, int]:
+    """
+    Returns a file object, that reads the original file (header, stored output and footer) and the size of the original file
+    """
+    reference = json.loads(reference_data)
+    header = reference["header"].encode("utf-8", "surrogateescape")
+    footer = reference["footer"].encode("utf-8", "surrogateescape")
+    blob_path = get_blob_path(_find_blob_store(reference_path), reference["digest"])
+    blob = open(blob_path, "rb")
+    size = len(header) + os.fstat(blob.fileno()).st_size + len(footer)
+    reader = _ConcatReader([io.BytesIO(header), blob, io.BytesIO(footer)]) # type: ignore
+    return (io.BufferedReader(reader, _BUFFER_SIZE), size) # type: ignore
+
+
+def _get_referenced_digests(output_dir: str) -> set:
+    digests = set()
+    for directory, folder_names, file_names in os.walk(output_dir):
+        if directory == output_dir and BLOB_DIR_NAME in folder_names:
+            folder_names.remove(BLOB_DIR_NAME)
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            if file_name.endswith(REFERENCE_SUFFIX):
+                with open(path, "r") as f:
+                    digests.add(json.load(f)["digest"])
+            elif file_name.endswith(SEGMENT_EXTENSION):
+                for name, extensions in read_member_table(path).items():
+                    for extension in extensions:
+                        if extension.endswith(REFERENCE_SUFFIX):
+                            with open_member(os.path.join(path, name + extension)) as f:
+                                digests.add(json.load(f)["digest"])
+    return digests
+
+
+def collect_garbage(output_dir: str, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Deletes all blobs, that are not referenced by any recording, and old temporary blobs. Returns the number of deleted blobs and their size
+    """
+    blob_store = os.path.join(output_dir, BLOB_DIR_NAME)
+    if not os.path.isdir(blob_store):
+        return (0, 0)
+
+    referenced = _get_referenced_digests(output_dir)
+    cutoff = time.time() - _GC_GRACE_PERIOD_SECONDS
+    deleted_count, deleted_bytes = 0, 0
+    for prefix_entry in os.scandir(blob_store):
+        if not prefix_entry.is_dir():
+            # Temporary blobs are left behind, if the process was killed while writing them
+            if prefix_entry.name.startswith(_TEMP_BLOB_PREFIX):
+                stat = prefix_entry.stat()
+                if stat.st_mtime < cutoff:
+                    if not dry_run:
+                        os.remove(prefix_entry.path)
+                    deleted_count += 1
+                    deleted_bytes += stat.st_size
+            continue
+        for entry in os.scandir(prefix_entry.path):
+            stat = entry.stat()
+            if DIGEST_PREFIX + entry.name not in referenced and stat.st_mtime < cutoff:
+                if not dry_run:
+                    os.remove(entry.path)
+                deleted_count += 1
+                deleted_bytes += stat.st_size
+    return (deleted_count, deleted_bytes)
+
+
+def deduplicate_all(output_dir: str, dry_run: bool = False) -> Dict[str, str]:
+    """
+    Deduplicates the log files of all finished recordings, that are stored as normal files. Returns a mapping from metadata files to digests
+    """
+    results: Dict[str, str] = {}
+    for program_entry in os.scandir(output_dir):
+        if program_entry.name.startswith(".") or not program_entry.is_dir(follow_symlinks=False):
+            continue
+        for entry in os.scandir(program_entry.path):
+            base_path, extension = os.path.splitext(entry.path)
+            # Only finished recordings have a metadata file. Recordings, that only store the metadata, have no log file and are skipped
+            if extension == ".log" and os.path.exists(f"{base_path}.json"):
+                results[f"{base_path}.json"] = "" if dry_run else deduplicate_log_file(output_dir, entry.path)
+    return results
+
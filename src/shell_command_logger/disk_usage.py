@@ -0,0 +1,177 @@
+import heapq
+import json
+import os
+import sys
+# local files
+from .segment import SEGMENT_EXTENSION, get_week, read_member_table
+from .backports import Dict, List, Tuple
+
+# The disk usage is summarized per directory. The summaries are cached together with the modification time of the directory.
+# Creating, deleting or renaming a file changes the modification time of its directory, so unchanged directories only need a single stat() call.
+# Files, that are modified in place, do not change it. This only happens for recordings, that are still running,
+# so directories with unfinished recordings (a log file without a metadata file) are always scanned again.
+# The files of scl itself (the journal and indexes in the data directory, the hidden directories like `.blobs` or `.plain-text`) are modified in place too,
+# so they are always scanned again. This only costs a stat() call per file, since they do not contain segment files.
+DISK_USAGE_CACHE_FILE_NAME = ".disk-usage-cache.json"
+_CACHE_VERSION = 2
+# Name of the group for files directly in the data directory (like the journal)
+DATA_DIRECTORY_GROUP = "."
+
+# (bytes, files)
+Usage = Tuple[int, int]
+
+
+class DiskUsage:
+    def __init__(self) -> None:
+        # program directory -> usage
+        self.programs: Dict[str, Usage] = {}
+        # files of scl itself: hidden directory (or DATA_DIRECTORY_GROUP for the files directly in the data directory) -> usage
+        self.internal: Dict[str, Usage] = {}
+        # week (like 2022w22) -> usage. Here the second value is the number of recordings instead of files
+        self.weeks: Dict[str, Usage] = {}
+        # (bytes, path relative to the data directory) of the largest recordings
+        self.largest: List[Tuple[int, str]] = []
+        self.total_bytes = 0
+        self.total_files = 0
+
+
+def _add_usage(usage_dict: Dict[str, Usage], key: str, byte_count: int, file_count: int) -> None:
+    old_bytes, old_files = usage_dict.get(key, (0, 0))
+    usage_dict[key] = (old_bytes + byte_count, old_files + file_count)
+
+
+def _is_internal_directory(relative_path: str) -> bool:
+    return not relative_path or relative_path.split(os.path.sep)[0].startswith(".")
+
+
+def _scan_directory(path: str, relative_path: str, top: int) -> dict:
+    """
+    Summarizes the files directly in a directory. Subdirectories are only listed
+    """
+    internal = _is_internal_directory(relative_path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    subdirs: List[str] = []
+    file_count, byte_count = 0, 0
+    # week -> (bytes, recordings)
+    weeks: Dict[str, Usage] = {}
+    # recording path -> bytes
+    recordings: Dict[str, int] = {}
+    extensions_by_name: Dict[str, List[str]] = {}
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+            file_count += 1
+            byte_count += size
+
+            if internal:
+                # For example the plain text copies have the same names as the recordings
+                continue
+            elif entry.name.endswith(SEGMENT_EXTENSION):
+                try:
+                    members = read_member_table(entry.path)
+                except Exception as ex:
+                    print(f"Error reading segment file '{entry.path}': ", ex, file=sys.stderr)
+                    continue
+                for name, member_extensions in members.items():
+                    member_size = sum(length for _, length in member_extensions.values())
+                    recordings[os.path.join(relative_path, entry.name, name)] = member_size
+            else:
+                name, extension = os.path.splitext(entry.name)
+                extensions_by_name.setdefault(name, []).append(extension)
+                if get_week(name):
+                    recording = os.path.join(relative_path, name)
+                    recordings[recording] = recordings.get(recording, 0) + size
+
+    for recording, size in recordings.items():
+        _add_usage(weeks, get_week(os.path.basename(recording)), size, 1) # type: ignore
+
+    # Running recordings only have a metadata file after they finished
+    has_unfinished = any(".log" in extensions and ".json" not in extensions for extensions in extensions_by_name.values())
+    largest = heapq.nlargest(top, ((size, recording) for recording, size in recordings.items()))
+    return {
+        "mtime_ns": mtime_ns,
+        "internal": internal,
+        "has_unfinished": has_unfinished,
+        "top": top,
+        "subdirs": subdirs,
+        "files": file_count,
+        "bytes": byte_count,
+        "weeks": weeks,
+        "largest": largest,
+    }
+
+
+def _load_cache(cache_file: str) -> Dict[str, dict]:
+    try:
+        with open(cache_file, "r") as f:
+            data = json.load(f)
+        if data.get("version") == _CACHE_VERSION:
+            return data["directories"]
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        print(f"Error loading disk usage cache '{cache_file}': ", ex, file=sys.stderr)
+    return {}
+
+
+def _save_cache(cache_file: str, directories: Dict[str, dict]) -> None:
+    try:
+        with open(f"{cache_file}.tmp", "w") as f:
+            json.dump({"version": _CACHE_VERSION, "directories": directories}, f, separators=(",", ":"))
+        os.replace(f"{cache_file}.tmp", cache_file)
+    except OSError as ex:
+        # The cache is optional, so we can continue without it
+        print(f"Error saving disk usage cache '{cache_file}': ", ex, file=sys.stderr)
+
+
+def _is_cache_valid(summary: dict, path: str, top: int) -> bool:
+    if summary["has_unfinished"] or summary["internal"] or summary["top"] < top:
+        return False
+    try:
+        return os.stat(path).st_mtime_ns == summary["mtime_ns"]
+    except FileNotFoundError:
+        return False
+
+
+def get_disk_usage(output_dir: str, top: int, use_cache: bool = True) -> DiskUsage:
+    """
+    Returns the disk usage per program directory, per week and of the files of scl itself, as well as the `top` largest recordings.
+    Only directories, that changed since the last call, are scanned
+    """
+    cache_file = os.path.join(output_dir, DISK_USAGE_CACHE_FILE_NAME)
+    cache = _load_cache(cache_file) if use_cache else {}
+    new_cache: Dict[str, dict] = {}
+    usage = DiskUsage()
+    largest: List[Tuple[int, str]] = []
+
+    # relative directory paths, "" is the data directory
+    pending = [""]
+    while pending:
+        relative_path = pending.pop()
+        path = os.path.join(output_dir, relative_path) if relative_path else output_dir
+        summary = cache.get(relative_path)
+        if not summary or not _is_cache_valid(summary, path, top):
+            try:
+                summary = _scan_directory(path, relative_path, top)
+            except FileNotFoundError:
+                # Deleted while we were scanning
+                continue
+        new_cache[relative_path] = summary
+
+        group = relative_path.split(os.path.sep)[0] if relative_path else DATA_DIRECTORY_GROUP
+        _add_usage(usage.internal if summary["internal"] else usage.programs, group, summary["bytes"], summary["files"])
+        for week, (byte_count, file_count) in summary["weeks"].items():
+            _add_usage(usage.weeks, week, byte_count, file_count)
+        largest = heapq.nlargest(top, largest + [tuple(x) for x in summary["largest"]]) # type: ignore
+        usage.total_bytes += summary["bytes"]
+        usage.total_files += summary["files"]
+        pending += [os.path.join(relative_path, x) for x in summary["subdirs"]]
+
+    usage.largest = largest
+    if use_cache and new_cache != cache:
+        _save_cache(cache_file, new_cache)
+    return usage
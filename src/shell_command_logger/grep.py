@@ -0,0 +1,66 @@
+import asyncio
+import os
+import subprocess
+import sys
+from typing import Optional
+# local files
+from .search import iterate_command_output
+from .sidecar import SIDECAR_EXTENSION, iterate_sidecar
+from .backports import List
+
+# Each grep process may take at most this long. Outputs, that take longer, are treated as errors
+GREP_TIMEOUT = 2
+
+
+def get_default_grep_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def grep_outputs(grep_command: str, log_files: List[str], jobs: int) -> List[Optional[bool]]:
+    """
+    Pipes the output of each log file into a shell command (usually grep) and runs up to `jobs` commands at the same time.
+    Plain text sidecars can be passed instead of log files.
+    Returns for each log file (in the same order) if the command exited with code 0 or None if the output could not be read or the command timed out
+    """
+    if not log_files:
+        return []
+    return asyncio.run(_grep_all(grep_command, log_files, jobs))
+
+
+async def _grep_all(grep_command: str, log_files: List[str], jobs: int) -> List[Optional[bool]]:
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    # gather() returns the results in the order of the arguments, no matter which process finishes first
+    return await asyncio.gather(*[_grep_output(grep_command, log_file, semaphore) for log_file in log_files])
+
+
+async def _grep_output(grep_command: str, log_file: str, semaphore: asyncio.Semaphore) -> Optional[bool]:
+    async with semaphore:
+        process = await asyncio.create_subprocess_shell(grep_command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            return await asyncio.wait_for(_feed_process(process, log_file), GREP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Error searching output file '{log_file}': ", f"grep did not finish within {GREP_TIMEOUT} seconds", file=sys.stderr)
+        except Exception as ex:
+            print(f"Error reading output file '{log_file}': ", ex, file=sys.stderr)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        return None
+
+
+async def _feed_process(process: asyncio.subprocess.Process, log_file: str) -> bool:
+    stdin = process.stdin
+    assert stdin is not None
+    try:
+        # The chunks are read on demand, so only a small part of each output is in memory
+        chunks = iterate_sidecar(log_file) if log_file.endswith(SIDECAR_EXTENSION) else iterate_command_output(log_file)
+        for chunk in chunks:
+            stdin.write(chunk)
+            # Waits until the pipe has room again, which allows the other processes to run in the meantime
+            await stdin.drain()
+        stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # grep may exit before reading all input (for example with -q or -m)
+        pass
+    return await process.wait() == 0
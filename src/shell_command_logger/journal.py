@@ -0,0 +1,319 @@
+from datetime import datetime, timezone
+import itertools
+import json
+import os
+import platform
+import sys
+from typing import BinaryIO, Optional
+# local files
+from .debug import profile_span
+from .segment import SEGMENT_EXTENSION
+from .storage import list_metadata_files, read_recording_file
+from .backports import Dict, List, Tuple
+
+# The journal is a single append-only file in the data directory, that contains one JSON object (event) per line.
+# pretty_exec.py appends a "start" event before a command is executed and an "end" event afterwards.
+# Since every event is written with a single write() call to a file opened with O_APPEND, multiple recordings can write to it at the same time.
+# Reading the journal replaces reading one metadata file per recording.
+#
+# Event types:
+# - init: first line of a complete journal (created by `rebuild_journal()`). Journals without it are not used for searching
+# - record: all metadata of a recording (written by `rebuild_journal()`)
+# - start / end / update: parts of the metadata of a recording, that are merged in the order they appear
+# - move: recordings were moved into a segment file
+# - delete: recordings were deleted
+JOURNAL_FILE_NAME = "journal.jsonl"
+JOURNAL_VERSION = 1
+
+_EVENT_INIT = "init"
+_EVENT_RECORD = "record"
+_EVENT_START = "start"
+_EVENT_END = "end"
+_EVENT_UPDATE = "update"
+_EVENT_MOVE = "move"
+_EVENT_DELETE = "delete"
+
+
+class JournalRecord:
+    def __init__(self, recording_id: str) -> None:
+        # The path of the recording relative to the data directory, without extension (like `echo/2022w22g_123504_1144`)
+        self.recording_id = recording_id
+        # The metadata file relative to the data directory
+        self.metadata_path = recording_id + ".json"
+        # The metadata in the same format as in the metadata file
+        self.data: dict = {}
+
+    def is_finished(self) -> bool:
+        return "status_code" in self.data
+
+
+def get_journal_file(output_dir: str) -> str:
+    return os.path.join(output_dir, JOURNAL_FILE_NAME)
+
+
+def get_recording_id(output_dir: str, metadata_file: str) -> str:
+    return os.path.relpath(metadata_file, output_dir)[:-len(".json")]
+
+
+def append_journal_events(output_dir: str, events: List[dict]) -> None:
+    if not events:
+        return
+    text = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+    fd = os.open(get_journal_file(output_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, text.encode())
+    finally:
+        os.close(fd)
+
+
+def build_record_event(recording_id: str, data: dict) -> dict:
+    return {"event": _EVENT_RECORD, "id": recording_id, **data}
+
+
+def build_update_event(output_dir: str, metadata_file: str, new_values: dict) -> dict:
+    return {"event": _EVENT_UPDATE, "id": get_recording_id(output_dir, metadata_file), **new_values}
+
+
+def build_move_event(output_dir: str, segment_file: str, names: List[str]) -> dict:
+    return {"event": _EVENT_MOVE, "segment": os.path.relpath(segment_file, output_dir), "names": names}
+
+
+def build_delete_event(output_dir: str, metadata_files: List[str]) -> dict:
+    return {"event": _EVENT_DELETE, "ids": [get_recording_id_from_metadata_path(output_dir, x) for x in metadata_files]}
+
+
+def read_journal(output_dir: str) -> Optional[List[JournalRecord]]:
+    """
+    Returns all recordings listed in the journal or None, if the journal does not exist or is incomplete
+    """
+    with profile_span("read_journal"):
+        try:
+            with open(get_journal_file(output_dir), "rb") as f:
+                first_line = f.readline()
+                if not is_init_event(first_line):
+                    return None
+                records = _replay_events(f)
+        except FileNotFoundError:
+            return None
+        return list(records.values())
+
+
+def is_init_event(line: bytes) -> bool:
+    try:
+        event = json.loads(line)
+        return event.get("event") == _EVENT_INIT and event.get("version") == JOURNAL_VERSION
+    except Exception:
+        return False
+
+
+def _replay_events(lines) -> Dict[str, JournalRecord]:
+    # Recordings in segments are moved, so their ID no longer matches their path
+    moved_ids: Dict[str, str] = {}
+    records: Dict[str, JournalRecord] = {}
+
+    for line_number, line in enumerate(lines, start=2):
+        _apply_event_line(line, line_number, records, moved_ids)
+    return records
+
+
+def _apply_event_line(line: bytes, line_number: int, records: Dict[str, JournalRecord], moved_ids: Dict[str, str]) -> List[str]:
+    """
+    Applies a single event to the records. Returns the IDs of the recordings, that were changed by it
+    """
+    try:
+        event = json.loads(line)
+        event_type = event.pop("event")
+        if event_type in [_EVENT_RECORD, _EVENT_START, _EVENT_END, _EVENT_UPDATE]:
+            recording_id = event.pop("id")
+            record = records.get(recording_id)
+            if not record:
+                record = records[recording_id] = JournalRecord(recording_id)
+                if recording_id in moved_ids:
+                    record.metadata_path = moved_ids[recording_id]
+            record.data.update(event)
+            return [recording_id]
+        elif event_type == _EVENT_MOVE:
+            directory = os.path.dirname(event["segment"])
+            changed_ids = []
+            for name in event["names"]:
+                recording_id = os.path.join(directory, name)
+                metadata_path = os.path.join(event["segment"], name + ".json")
+                moved_ids[recording_id] = metadata_path
+                if recording_id in records:
+                    records[recording_id].metadata_path = metadata_path
+                    changed_ids.append(recording_id)
+            return changed_ids
+        elif event_type == _EVENT_DELETE:
+            for recording_id in event["ids"]:
+                records.pop(recording_id, None)
+                moved_ids.pop(recording_id, None)
+            return list(event["ids"])
+    except Exception as ex:
+        # A line may be broken, if the system crashed while it was written
+        print(f"Error parsing line {line_number} of the journal: ", ex, file=sys.stderr)
+    return []
+
+
+class JournalFollower:
+    """
+    Keeps the replayed journal in memory for long running processes. `update()` only parses the lines, that were appended since the last call
+    """
+    def __init__(self, output_dir: str) -> None:
+        self.journal_file = get_journal_file(output_dir)
+        # None if the journal does not exist or is incomplete
+        self.records: Optional[Dict[str, JournalRecord]] = None
+        self._moved_ids: Dict[str, str] = {}
+        # Identifies the journal file, since `rebuild_journal()` replaces it
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._offset = 0
+        self._line_number = 0
+
+    def update(self) -> Optional[List[str]]:
+        """
+        Returns the IDs of the recordings, that changed since the last call (in the order they were changed).
+        Returns None, if the journal had to be read from the start (or is not usable), since then all records may have changed
+        """
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            self.records = None
+            return None
+
+        file_id = (stat.st_dev, stat.st_ino)
+        if self.records is not None and file_id == self._file_id and stat.st_size >= self._offset:
+            return self._read_new_lines()
+
+        self._file_id = file_id
+        self.records = None
+        with open(self.journal_file, "rb") as f:
+            first_line = f.readline()
+        if is_init_event(first_line):
+            self.records = {}
+            self._moved_ids = {}
+            self._offset = len(first_line)
+            self._line_number = 1
+            self._read_new_lines()
+        return None
+
+    def _read_new_lines(self) -> List[str]:
+        with open(self.journal_file, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # The last line may be incomplete, if it is written right now. It is read by the next call
+        data = data[:data.rfind(b"\n") + 1]
+        self._offset += len(data)
+
+        # Dicts keep the insertion order, so they are used as an ordered set
+        changed_ids: Dict[str, None] = {}
+        for line in data.splitlines():
+            self._line_number += 1
+            changed_ids.update(dict.fromkeys(_apply_event_line(line, self._line_number, self.records, self._moved_ids)))
+        return list(changed_ids)
+
+
+def rebuild_journal(output_dir: str) -> int:
+    """
+    Creates a complete journal from the metadata files. Recordings, that are still running, are taken from the old journal.
+    Returns the number of recordings in the new journal.
+    """
+    journal_file = get_journal_file(output_dir)
+    try:
+        # Kept open, so that lines appended to the old journal can still be read after it was replaced
+        old_journal: Optional[BinaryIO] = open(journal_file, "rb")
+    except FileNotFoundError:
+        old_journal = None
+    try:
+        return _rebuild_journal(output_dir, journal_file, old_journal)
+    finally:
+        if old_journal:
+            old_journal.close()
+
+
+def _rebuild_journal(output_dir: str, journal_file: str, old_journal: Optional[BinaryIO]) -> int:
+    old_size = os.fstat(old_journal.fileno()).st_size if old_journal else 0
+
+    events: List[dict] = [{"event": _EVENT_INIT, "version": JOURNAL_VERSION}]
+    found_ids = set()
+    for metadata_file in list_metadata_files(output_dir):
+        try:
+            data = json.loads(read_recording_file(metadata_file))
+        except Exception as ex:
+            print(f"Error parsing metadata file '{metadata_file}': ", ex, file=sys.stderr)
+            continue
+        recording_id = get_recording_id_from_metadata_path(output_dir, metadata_file)
+        found_ids.add(recording_id)
+        events.append(build_record_event(recording_id, data))
+        if os.path.relpath(metadata_file, output_dir) != recording_id + ".json":
+            events.append(build_move_event(output_dir, os.path.dirname(metadata_file), [os.path.basename(recording_id)]))
+
+    # Keep the recordings, that have not finished yet
+    if old_size:
+        with open(journal_file, "rb") as f:
+            first_line = f.readline()
+            lines = f if is_init_event(first_line) else itertools.chain([first_line], f)
+            for record in _replay_events(lines).values():
+                if record.recording_id not in found_ids and not record.is_finished():
+                    events.append({"event": _EVENT_START, "id": record.recording_id, **record.data})
+
+    temp_file = f"{journal_file}.tmp"
+    with open(temp_file, "wb") as f:
+        for event in events:
+            f.write(json.dumps(event, separators=(",", ":")).encode() + b"\n")
+        # Copy events, that other processes appended while we were reading the metadata files
+        if old_journal:
+            old_journal.seek(old_size)
+            f.write(old_journal.read())
+    os.replace(temp_file, journal_file)
+
+    if old_journal:
+        # Processes, that opened the old journal before it was replaced, append their events to it. They are copied to the new journal
+        appended = old_journal.read()
+        if appended:
+            fd = os.open(journal_file, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, appended)
+            finally:
+                os.close(fd)
+    return len(found_ids)
+
+
+def get_recording_id_from_metadata_path(output_dir: str, metadata_file: str) -> str:
+    relative_path = os.path.relpath(metadata_file, output_dir)[:-len(".json")]
+    # Segment members: <program>/<week>.sclseg/<name> -> <program>/<name>
+    segment_dir, name = os.path.split(relative_path)
+    program_dir = os.path.dirname(segment_dir)
+    if segment_dir.endswith(SEGMENT_EXTENSION):
+        return os.path.join(program_dir, name)
+    else:
+        return relative_path
+
+
+def complete_unfinished_metadata(record: JournalRecord) -> dict:
+    """
+    Fills in the fields, that are only known after a command finished, so that the data can be parsed as normal metadata
+    """
+    data = dict(record.data)
+    if not record.is_finished():
+        running = not _is_process_dead(data)
+        data.update({
+            "end_time": datetime.now(timezone.utc).isoformat("Z", timespec="seconds"),
+            "error_message": "Command is still running" if running else "Recording was interrupted before the command finished",
+            "status_code": -1,
+            "running": running,
+        })
+    return data
+
+
+def _is_process_dead(data: dict) -> bool:
+    # Processes can only be checked on the same machine
+    pid = data.get("pid")
+    if type(pid) != int or data.get("hostname") != platform.node():
+        return False
+    try:
+        os.kill(pid, 0)
+        return False
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # The process exists, but belongs to a different user
+        return False
@@ -1,5 +1,6 @@
 import sys
 # local files
+from ..backports import List
 from .base_class import LoggerBackend
 from .script_linux import LoggerScriptLinux
 from .script_macos import LoggerScriptMacOs
@@ -14,6 +15,10 @@ def get_logger_backend(name: str) -> LoggerBackend:
     raise ValueError(f"No logger backend with name '{name}' found")
 
 
+def get_logger_backend_names() -> List[str]:
+    return [module.name for module in _MODULES]
+
+
 def get_best_backend_name() -> str:
     if sys.platform.startswith("linux"):
         # Linux
@@ -1,6 +1,7 @@
 import logging
 import subprocess
 # local files
+from .output_limit import OUTPUT_LIMIT_STOP
 from ..backports import List
 
 _ONE_GIGABYTE = 1024 * 1024 * 1024
@@ -14,9 +15,13 @@ class RecordingOptions:
     """
     The options to pass to logger backend calls. This uses an object, so that the method signature (of all subclasses) does not need to be updated when new options are added.
     """
-    def __init__(self, allow_recording_of_stdin: bool = True, output_limit: int = _ONE_GIGABYTE) -> None:
+    def __init__(self, allow_recording_of_stdin: bool = True, output_limit: int = _ONE_GIGABYTE, output_limit_mode: str = OUTPUT_LIMIT_STOP, output_tail_limit: int = 0) -> None:
         self.allow_recording_of_stdin = allow_recording_of_stdin
         self.output_limit = output_limit
+        # See output_limit.py for the supported modes
+        self.output_limit_mode = output_limit_mode
+        # Only used by the head-tail mode: the number of bytes to keep from the end of the output
+        self.output_tail_limit = output_tail_limit
 
 class ReplayOptions:
     """
@@ -44,6 +49,8 @@ class LoggerBackend:
     """
 
     name = "abstract_logger_backend_overwrite_this_field"
+    # The output limit modes (see output_limit.py), that the backend implements
+    supported_output_limit_modes = [OUTPUT_LIMIT_STOP]
 
 
     def __init__(self, filter_trailing_carriage_returns: bool = False) -> None:
@@ -59,12 +66,15 @@ class LoggerBackend:
         #
         # Seems fixed on mac: "scl log echo abc | wc -c" returns 4  (abc\n)
         self.filter_trailing_carriage_returns = filter_trailing_carriage_returns
+        # Additional information about the last recording (like output truncation), that should be stored in the metadata
+        self.last_recording_info: dict = {}
     
     def log_command(self, command: List[str], base_file_name: str, options: RecordingOptions) -> int:
         """
         Execute the given command and log the results to file(s) starting with the given base file name (for example "<base_file_name>.log" and "<base_file_name.time>").
         Returns the status code, that the program returned.
         """
+        self.last_recording_info = {}
         record_command = self._build_log_command(command, base_file_name, options)
         return run_command(record_command, self.filter_trailing_carriage_returns)
 
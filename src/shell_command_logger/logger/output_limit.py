@@ -0,0 +1,226 @@
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from typing import BinaryIO, Optional
+# local files
+from ..backports import List, Tuple
+
+# Stop recording when the limit is reached (this is what `script --output-limit` does)
+OUTPUT_LIMIT_STOP = "stop"
+# Keep the first bytes and the last bytes of the output
+OUTPUT_LIMIT_HEAD_TAIL = "head-tail"
+OUTPUT_LIMIT_MODES = [OUTPUT_LIMIT_STOP, OUTPUT_LIMIT_HEAD_TAIL]
+
+# The lines, that `script` writes before and after the output
+SCRIPT_HEADER_START = b"Script started on"
+SCRIPT_FOOTER_START = b"\nScript done on"
+# The "Script done on ..." line is shorter than this
+_FOOTER_RESERVE = 1024
+_READ_SIZE = 64 * 1024
+
+
+class RingBuffer:
+    """
+    Keeps the last `size` bytes written to it. The buffer grows with the data until it reaches `size`, so short outputs do not allocate the whole limit
+    """
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.total_bytes = 0
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data: bytes) -> None:
+        self.total_bytes += len(data)
+        if self.size == 0:
+            return
+        elif len(data) >= self.size:
+            self._buffer[:] = data[-self.size:]
+            self._position = 0
+            return
+        elif len(self._buffer) < self.size:
+            # Not full yet: append in order, the position stays at the start
+            free_space = self.size - len(self._buffer)
+            self._buffer += data[:free_space]
+            data = data[free_space:]
+
+        if data:
+            first_part = min(len(data), self.size - self._position)
+            self._buffer[self._position:self._position + first_part] = data[:first_part]
+            rest = data[first_part:]
+            self._buffer[:len(rest)] = rest
+            self._position = (self._position + len(data)) % self.size
+
+    def has_overflowed(self) -> bool:
+        return self.total_bytes > self.size
+
+    def getvalue(self) -> bytes:
+        if self.has_overflowed():
+            return bytes(self._buffer[self._position:] + self._buffer[:self._position])
+        else:
+            return bytes(self._buffer)
+
+
+def build_truncation_marker(dropped_bytes: int) -> bytes:
+    return f"\r\n[scl] Output truncated: {dropped_bytes} bytes were not recorded\r\n".encode()
+
+
+class HeadTailLog:
+    """
+    Lets a program write its log to a named pipe. The first `head_size` bytes of the output are written to the log file directly,
+    the last `tail_size` bytes are kept in memory and written when the program closes the pipe.
+    Everything in between is replaced with a short marker, so the disk usage stays bounded.
+    The "Script started/done on" lines written by `script` are always kept.
+    """
+    def __init__(self, log_file: str, head_size: int, tail_size: int) -> None:
+        self.log_file = log_file
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self._temp_dir = tempfile.mkdtemp(prefix="scl-")
+        self.fifo_path = os.path.join(self._temp_dir, "log-out")
+        os.mkfifo(self.fifo_path)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._error: Optional[BaseException] = None
+        # These values are known after the pipe was closed
+        self.head_bytes = 0
+        self.tail_bytes = 0
+        self.dropped_bytes = 0
+        self.total_bytes = 0
+
+    def __enter__(self) -> "HeadTailLog":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            if self._thread.is_alive():
+                self._unblock_reader()
+            self._thread.join()
+        finally:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+        if self._error and exc_type is None:
+            raise self._error
+
+    def _unblock_reader(self) -> None:
+        # If the writer never opened the pipe, the reader thread is still waiting in open(). Opening and closing the write end wakes it up
+        try:
+            fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            os.close(fd)
+        except OSError as ex:
+            # ENXIO: the reader is not waiting (any more)
+            if ex.errno != errno.ENXIO:
+                raise
+
+    def _run(self) -> None:
+        try:
+            with open(self.fifo_path, "rb") as fifo:
+                with open(self.log_file, "wb") as log:
+                    self._copy(fifo, log)
+        except BaseException as ex:
+            self._error = ex
+
+    def _copy(self, fifo: BinaryIO, log: BinaryIO) -> None:
+        # Pass the header line through, it is not part of the output and not counted in the timing file
+        pending = b""
+        while True:
+            chunk = fifo.read1(_READ_SIZE) # type: ignore
+            if not chunk:
+                break
+            pending += chunk
+            if not SCRIPT_HEADER_START.startswith(pending[:len(SCRIPT_HEADER_START)]):
+                # Not a script header
+                break
+            if b"\n" in pending:
+                header_end = pending.index(b"\n") + 1
+                log.write(pending[:header_end])
+                pending = pending[header_end:]
+                break
+
+        # The last bytes are held back until the end, since they may be the "Script done on" line, which should not be cut off
+        ring = RingBuffer(self.tail_size)
+        held_back = pending
+        while chunk := fifo.read1(_READ_SIZE): # type: ignore
+            held_back += chunk
+            if len(held_back) > _FOOTER_RESERVE:
+                self._write_output(held_back[:-_FOOTER_RESERVE], log, ring)
+                held_back = held_back[-_FOOTER_RESERVE:]
+
+        footer_start = held_back.rfind(SCRIPT_FOOTER_START)
+        footer = held_back[footer_start:] if footer_start >= 0 else b""
+        self._write_output(held_back[:len(held_back) - len(footer)], log, ring)
+
+        tail = ring.getvalue()
+        self.total_bytes = self.head_bytes + ring.total_bytes
+        self.tail_bytes = len(tail)
+        if ring.has_overflowed():
+            self.dropped_bytes = ring.total_bytes - len(tail)
+            log.write(build_truncation_marker(self.dropped_bytes))
+        log.write(tail)
+        log.write(footer)
+
+    def _write_output(self, data: bytes, log: BinaryIO, ring: RingBuffer) -> None:
+        if self.head_bytes < self.head_size:
+            head_part = data[:self.head_size - self.head_bytes]
+            log.write(head_part)
+            self.head_bytes += len(head_part)
+            data = data[len(head_part):]
+        if data:
+            ring.write(data)
+
+    def is_truncated(self) -> bool:
+        return self.dropped_bytes > 0
+
+    def get_metadata(self) -> dict:
+        return {
+            "mode": OUTPUT_LIMIT_HEAD_TAIL,
+            "total_bytes": self.total_bytes,
+            "head_bytes": self.head_bytes,
+            "tail_bytes": self.tail_bytes,
+            "dropped_bytes": self.dropped_bytes,
+        }
+
+    def fix_timing_file(self, timing_file: str) -> None:
+        """
+        Rewrites a timing file (classic `scriptreplay` format: "<delay> <byte count>" per line), so that it matches the truncated log file
+        """
+        if not self.is_truncated():
+            return
+
+        with open(timing_file, "r") as f:
+            entries = [_parse_timing_line(line) for line in f if line.strip()]
+
+        tail_start = self.total_bytes - self.tail_bytes
+        new_entries: List[Tuple[str, int]] = []
+        pending_delay = 0.0
+        position = 0
+        marker_written = False
+        for delay, count in entries:
+            pending_delay += delay
+            end = position + count
+            head_part = max(0, min(end, self.head_bytes) - position)
+            tail_part = max(0, end - max(position, tail_start))
+            if head_part:
+                new_entries.append((f"{pending_delay:.6f}", head_part))
+                pending_delay = 0
+            if end > self.head_bytes and not marker_written:
+                marker = build_truncation_marker(self.dropped_bytes)
+                new_entries.append((f"{pending_delay:.6f}", len(marker)))
+                pending_delay = 0
+                marker_written = True
+            if tail_part:
+                new_entries.append((f"{pending_delay:.6f}", tail_part))
+                pending_delay = 0
+            position = end
+
+        temp_file = f"{timing_file}.tmp"
+        with open(temp_file, "w") as f:
+            for delay_str, count in new_entries:
+                f.write(f"{delay_str} {count}\n")
+        os.replace(temp_file, timing_file)
+
+
+def _parse_timing_line(line: str) -> Tuple[float, int]:
+    delay, count = line.split()
+    return (float(delay), int(count))
@@ -1,9 +1,11 @@
 import shlex
 import sys
+from typing import Optional
 # Tested on Arch Linux, but should work on pretty much any Linux distro
 from ..backports import List
 # from ..config import SclConfig
-from .base_class import LoggerBackend, LoggerException, ReplayOptions, RecordingOptions
+from .base_class import LoggerBackend, LoggerException, ReplayOptions, RecordingOptions, run_command
+from .output_limit import HeadTailLog, OUTPUT_LIMIT_HEAD_TAIL, OUTPUT_LIMIT_MODES
 from .script_macos import temp_workaround_get_default_trailing_filter_trailing_carriage_returns
 
 class LoggerScriptLinux(LoggerBackend):
@@ -11,24 +13,45 @@ class LoggerScriptLinux(LoggerBackend):
     A logger based on the Linux tools "script" and "scriptreplay", that are almost always automatically installed
     """
     name = "script_linux"
+    supported_output_limit_modes = OUTPUT_LIMIT_MODES
 
     def __init__(self) -> None:
         super().__init__(filter_trailing_carriage_returns=temp_workaround_get_default_trailing_filter_trailing_carriage_returns())
         if sys.platform.startswith("darwin"):
             raise LoggerException("This module does not work on macOS, since the script binary has different options")
 
-    
+
+    def log_command(self, command: List[str], base_file_name: str, options: RecordingOptions) -> int:
+        if options.output_limit_mode != OUTPUT_LIMIT_HEAD_TAIL:
+            return super().log_command(command, base_file_name, options)
+
+        # script writes into a named pipe, the output is limited while reading from it
+        self.last_recording_info = {}
+        with HeadTailLog(f"{base_file_name}.log", options.output_limit, options.output_tail_limit) as log:
+            record_command = self._build_script_command(command, base_file_name, log.fifo_path, None)
+            status_code = run_command(record_command, self.filter_trailing_carriage_returns)
+
+        log.fix_timing_file(f"{base_file_name}.time")
+        if log.is_truncated():
+            self.last_recording_info = {"output_truncation": log.get_metadata()}
+        return status_code
+
     def _build_log_command(self, command: List[str], base_file_name: str, options: RecordingOptions) -> List[str]:
+        return self._build_script_command(command, base_file_name, f"{base_file_name}.log", options.output_limit)
+
+    def _build_script_command(self, command: List[str], base_file_name: str, log_file: str, output_limit: Optional[int]) -> List[str]:
         script_command = [
             "script",
-            "--log-out", f"{base_file_name}.log", # stores the output
+            "--log-out", log_file, # stores the output
             "--log-timing", f"{base_file_name}.time", # also stores the timing, so that the output can be played back to watch when what happened
             "--command", shlex.join(command), # runs our command, which displays the command, timestamp, exit code, etc
             "--return", # return exit code of the child process
-            "--output-limit", str(options.output_limit), # If the output is larger than this, something probably went wrong.
-            # This prevents your harddrive from overflowing.
             "--quiet", # Hide the "Script started/stopped" messages
         ]
+        if output_limit is not None:
+            # If the output is larger than this, something probably went wrong.
+            # This prevents your harddrive from overflowing.
+            script_command += ["--output-limit", str(output_limit)]
 
         return script_command
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import argparse
 import base64
+import fcntl
 from datetime import datetime, timezone
 import getpass
 import json
@@ -9,6 +10,7 @@ import platform
 import signal
 import subprocess
 import sys
+import time
 import traceback
 from typing import Optional
 # avoid importing the whole shell_command_logger package
@@ -22,6 +24,8 @@ else:
     # Use the deprecated versions, since using the modern versions would cause "TypeError: 'type' object is not subscriptable"
     from typing import Tuple, List
 
+# Monotonic clocks are shared by all processes, so this can be compared with the times measured by the scl process
+WRAPPER_START_TIME = time.monotonic()
 
 
 # Since this scriptwill be called using something like `script [...] -c "./pretty_exec ARGUMENTS"` escaping arguments safely and correctly may be hard
@@ -42,15 +46,91 @@ def decode_command(encoded_command_array: str) -> List[str]:
     raise Exception(f"Expected json to contain a list of strings, but got '{command_json}'")
 
 
-def write_json(path, json_data) -> None:
+# How the metadata is written:
+# - fast: write the file directly. A crash may leave an empty or truncated file
+# - safe: write a temporary file, fsync it and rename it. The metadata file is either complete or missing
+# - batched: write the file directly, but fsync the end event in the journal. Recordings finishing at the same time share a single fsync
+WRITE_POLICY_FAST = "fast"
+WRITE_POLICY_SAFE = "safe"
+WRITE_POLICY_BATCHED = "batched"
+WRITE_POLICIES = [WRITE_POLICY_FAST, WRITE_POLICY_SAFE, WRITE_POLICY_BATCHED]
+
+
+def write_json(path, json_data, write_policy: str = WRITE_POLICY_FAST) -> None:
     try:
-        with open(path, "w") as f:
-            json.dump(json_data, f)
+        if write_policy == WRITE_POLICY_SAFE:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(json_data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            # Make sure, that the rename is stored too
+            fsync_directory(os.path.dirname(path) or ".")
+        else:
+            with open(path, "w") as f:
+                json.dump(json_data, f)
     except Exception:
         print(f"[shell-command-logger::error] Failed to write to file '{path}'")
         traceback.print_exc()
 
 
+def fsync_directory(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# @LINK: Same format as journal.py:append_journal_events()
+def append_journal_event(journal_file: str, event: dict, sync: bool = False) -> None:
+    try:
+        line = json.dumps(event, separators=(",", ":")) + "\n"
+        # A single write to a file opened with O_APPEND, so that concurrent recordings do not mix up their lines
+        fd = os.open(journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+            if sync:
+                # With O_APPEND the file position is the end of our line
+                sync_journal(journal_file, fd, os.lseek(fd, 0, os.SEEK_CUR))
+        finally:
+            os.close(fd)
+    except Exception:
+        print(f"[shell-command-logger::error] Failed to write to journal '{journal_file}'")
+        traceback.print_exc()
+
+
+def sync_journal(journal_file: str, fd: int, end_offset: int) -> None:
+    """
+    Group commit: fsync flushes the whole file, including the lines written by other processes.
+    The size up to which the journal is known to be synced is stored in a small file, so that a process can skip the fsync if another process already synced its line.
+    """
+    synced_file = f"{journal_file}.synced"
+    synced_fd = os.open(synced_file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if read_synced_offset(synced_fd) < end_offset:
+            # Lines appended after this point may not be covered by the fsync, so only the size before it is known to be synced
+            journal_size = os.fstat(fd).st_size
+            os.fsync(fd)
+            # The lock makes the compare and write atomic, so a larger value written by another process is never replaced by a smaller one
+            fcntl.flock(synced_fd, fcntl.LOCK_EX)
+            try:
+                if read_synced_offset(synced_fd) < journal_size:
+                    os.pwrite(synced_fd, f"{journal_size:020d}".encode(), 0)
+            finally:
+                fcntl.flock(synced_fd, fcntl.LOCK_UN)
+    finally:
+        os.close(synced_fd)
+
+
+def read_synced_offset(synced_fd: int) -> int:
+    try:
+        return int(os.pread(synced_fd, 20, 0))
+    except ValueError:
+        return 0
+
+
 def current_timestamp() -> str:
     # Z means Zulu time (UTC)
     # Use timespec=seconds to hide the millisecond part
@@ -58,12 +138,18 @@ def current_timestamp() -> str:
     # Can be parsed with datetime.fromisoformat
 
 
-def execute_command(command: List[str]) -> Tuple[int, Optional[str]]:
+def execute_command(command: List[str], timings: Optional[dict] = None) -> Tuple[int, Optional[str]]:
+    """
+    Runs the command. If timings is given, the monotonic times when the child was started and when it exited are stored in it
+    """
+    timings = {} if timings is None else timings
     try:
         # Instead of a simple subprocess.call, we manually handle it so that we can properly handle SIGINT events and pass them through to the inner process
         # @TODO: would it also make sense to handle other events (SIGTERM, etc)
         # Seems to work, at least with a quick "scl log bash" and repeatedly pressing Ctrl-C. However the display in the shell (bash/fish) is severely broken
         process = subprocess.Popen(command)
+        # Popen only returns after the exec call of the child succeeded
+        timings["child_exec"] = time.monotonic()
         while process.poll() == None:
             try:
                 process.wait()
@@ -71,6 +157,7 @@ def execute_command(command: List[str]) -> Tuple[int, Optional[str]]:
                 # print("\n[shell-command-logger] Passing Ctrl-C (SIGINT) to subprocess")
                 # Based on https://stackoverflow.com/questions/75474344/how-do-i-pass-ctrl-c-into-subprocess-popen-using-the-stdin-argument
                 process.send_signal(signal.SIGINT)
+        timings["child_exit"] = time.monotonic()
 
         # Process war executed normally: return the status code without an error message
         return (process.returncode, None)
@@ -94,24 +181,51 @@ def execute_command(command: List[str]) -> Tuple[int, Optional[str]]:
     return (-1, error_message)
 
 
-def main(command: List[str], metadata_file: str) -> int:
+def get_relative_timings(monotonic_times: dict, origin: float) -> dict:
+    """
+    Monotonic times are only meaningful on the same machine until the next reboot, so the seconds since the origin are stored instead
+    """
+    return {name: round(value - origin, 6) for name, value in monotonic_times.items()}
+
+
+def main(command: List[str], metadata_file: str, journal_file: Optional[str] = None, write_policy: str = WRITE_POLICY_FAST, scl_start_time: Optional[float] = None, backend_launch_time: Optional[float] = None, extra_metadata: Optional[dict] = None, in_process: bool = False) -> int:
+    # The phases of the recording. Older callers do not pass the times measured by the scl process, then the start of this script is used as the origin
+    monotonic_times = {"scl_start": WRAPPER_START_TIME if scl_start_time is None else scl_start_time}
+    if backend_launch_time is not None:
+        monotonic_times["backend_launch"] = backend_launch_time
+    if not in_process:
+        # When scl calls this function directly, there is no wrapper process and WRAPPER_START_TIME is only the time this module was imported
+        monotonic_times["wrapper_start"] = WRAPPER_START_TIME
+
     data: dict = {
         "command": command,
         "user": getpass.getuser(),
         "hostname": platform.node(),
         "start_time": current_timestamp(),
         "working_dir": os.getcwd(),
+        **(extra_metadata or {}),
     }
+    if journal_file:
+        # The ID is the path relative to the data directory without the extension
+        recording_id = os.path.relpath(metadata_file, os.path.dirname(journal_file))[:-len(".json")]
+        # The pid is used to detect recordings, that were killed before they could write the end event
+        append_journal_event(journal_file, {"event": "start", "id": recording_id, "pid": os.getpid(), **data})
 
-    status_code, error_message = execute_command(command)
+    status_code, error_message = execute_command(command, monotonic_times)
 
-    data.update({
+    # The metadata can not contain the time after it was written, so the time right before is used
+    monotonic_times["metadata_write"] = time.monotonic()
+    end_data = {
         "end_time": current_timestamp(),
         "error_message": error_message,
         "status_code": status_code,
-    })
+        "timings": get_relative_timings(monotonic_times, monotonic_times["scl_start"]),
+    }
+    data.update(end_data)
 
-    write_json(metadata_file, data)
+    write_json(metadata_file, data, write_policy)
+    if journal_file:
+        append_journal_event(journal_file, {"event": "end", "id": recording_id, **end_data}, sync=write_policy == WRITE_POLICY_BATCHED)
 
     return status_code
 
@@ -120,8 +234,12 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("encoded_command", help="A base64 encoded JSON list containing the command to execute")
     ap.add_argument("metadata_file", help="the file to write the metadata to")
+    ap.add_argument("--journal", metavar="FILE", help="also append the metadata to this journal file")
+    ap.add_argument("--write-policy", choices=WRITE_POLICIES, default=WRITE_POLICY_FAST, help="how to write the metadata")
+    ap.add_argument("--scl-start-time", type=float, help="the monotonic time, when the scl process was started")
+    ap.add_argument("--backend-launch-time", type=float, help="the monotonic time, when the scl process started the logger backend")
     args = ap.parse_args()
 
     command = decode_command(args.encoded_command)
-    exit_code = main(command, args.metadata_file)
+    exit_code = main(command, args.metadata_file, args.journal, args.write_policy, args.scl_start_time, args.backend_launch_time)
     sys.exit(exit_code)
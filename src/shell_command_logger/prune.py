@@ -0,0 +1,191 @@
+from datetime import datetime, timezone
+import heapq
+import os
+import re
+import sys
+from typing import Iterable, Optional
+# local files
+from .dedup import BLOB_DIR_NAME, collect_garbage
+from .journal import append_journal_events, build_delete_event
+from .segment import SEGMENT_EXTENSION, read_member_table, remove_segment_members
+from .sidecar import remove_sidecars
+from .backports import Dict, List, Tuple
+
+# Recordings are selected for deletion based on the start time in their name and the size of their files.
+# This only requires listing the program directories (and reading the tables of segment files), no metadata files need to be parsed.
+
+# Matches names created by recorder.get_timestamp_filename() (like 2022w22g_123504_1144)
+_NAME_REGEX = re.compile(r"^(\d{4})w(\d{2})([a-g])_(\d{6})_")
+_SIZE_REGEX = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+class StoredRecording:
+    def __init__(self, program: str, name: str, start_time: float) -> None:
+        self.program = program
+        self.name = name
+        # Seconds since the epoch
+        self.start_time = start_time
+        # Normal files belonging to this recording
+        self.files: List[str] = []
+        # Segment file containing this recording. A recording can exist in a segment and as normal files at the same time
+        self.segment_file: Optional[str] = None
+        self.size = 0
+
+    def get_metadata_file(self) -> str:
+        for path in self.files:
+            if path.endswith(".json"):
+                return path
+        return os.path.join(self.segment_file or "", self.name + ".json")
+
+    def __lt__(self, other: "StoredRecording") -> bool:
+        # Used by the heap: recordings with the same start time are ordered by name
+        return (self.start_time, self.name) < (other.start_time, other.name)
+
+
+def parse_size(size_string: str) -> int:
+    """
+    Parses sizes like '500M', '1.5G' or '1024'. Units use a factor of 1024
+    """
+    match = _SIZE_REGEX.match(size_string.strip())
+    if not match:
+        raise ValueError(f"Invalid size: '{size_string}'. Expected something like '500M' or '2G'")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def get_start_time(name: str) -> Optional[float]:
+    match = _NAME_REGEX.match(name)
+    if not match:
+        return None
+    year, week, day, time_str = match.groups()
+    day_number = "abcdefg".index(day) + 1
+    start = datetime.strptime(f"{year}-W{week}-{day_number} {time_str}", "%G-W%V-%u %H%M%S")
+    return start.replace(tzinfo=timezone.utc).timestamp()
+
+
+def list_stored_recordings(output_dir: str) -> List[StoredRecording]:
+    """
+    Returns all finished recordings. Recordings without a metadata file may still be running, so they are never returned
+    """
+    results: List[StoredRecording] = []
+    for program_entry in os.scandir(output_dir):
+        # Skip files (like the journal) and internal folders
+        if program_entry.name.startswith(".") or not program_entry.is_dir(follow_symlinks=False):
+            continue
+
+        recordings: Dict[str, StoredRecording] = {}
+        def get_recording(name: str) -> Optional[StoredRecording]:
+            recording = recordings.get(name)
+            if not recording:
+                start_time = get_start_time(name)
+                if start_time == None:
+                    return None
+                recording = recordings[name] = StoredRecording(program_entry.name, name, start_time) # type: ignore
+            return recording
+
+        finished = set()
+        for entry in os.scandir(program_entry.path):
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            name, extension = os.path.splitext(entry.name)
+            if extension == SEGMENT_EXTENSION:
+                try:
+                    members = read_member_table(entry.path)
+                except Exception as ex:
+                    print(f"Error reading segment file '{entry.path}': ", ex, file=sys.stderr)
+                    continue
+                for member_name, member_extensions in members.items():
+                    recording = get_recording(member_name)
+                    if recording and ".json" in member_extensions:
+                        recording.segment_file = entry.path
+                        recording.size += sum(length for _, length in member_extensions.values())
+                        finished.add(member_name)
+            elif extension != ".tmp":
+                recording = get_recording(name)
+                if recording:
+                    recording.files.append(entry.path)
+                    recording.size += entry.stat(follow_symlinks=False).st_size
+                    if extension == ".json":
+                        finished.add(name)
+
+        results += [recording for name, recording in recordings.items() if name in finished]
+    return results
+
+
+def select_recordings_to_delete(recordings: List[StoredRecording], older_than_seconds: Optional[float] = None,
+        max_total_size: Optional[int] = None, max_program_size: Optional[int] = None) -> List[StoredRecording]:
+    """
+    Applies the retention policies and returns the recordings to delete, oldest first.
+    The age policy is applied first, then the quota per program and then the total quota
+    """
+    selected: List[StoredRecording] = []
+    remaining: List[StoredRecording] = []
+    if older_than_seconds != None:
+        cutoff = datetime.now(timezone.utc).timestamp() - older_than_seconds # type: ignore
+        for recording in recordings:
+            (selected if recording.start_time < cutoff else remaining).append(recording)
+    else:
+        remaining = list(recordings)
+
+    if max_program_size != None:
+        by_program: Dict[str, List[StoredRecording]] = {}
+        for recording in remaining:
+            by_program.setdefault(recording.program, []).append(recording)
+        remaining = []
+        for program_recordings in by_program.values():
+            deleted, kept = _delete_oldest_until_below(program_recordings, max_program_size) # type: ignore
+            selected += deleted
+            remaining += kept
+
+    if max_total_size != None:
+        deleted, remaining = _delete_oldest_until_below(remaining, max_total_size) # type: ignore
+        selected += deleted
+
+    selected.sort()
+    return selected
+
+
+def _delete_oldest_until_below(recordings: List[StoredRecording], max_size: int) -> Tuple[List[StoredRecording], List[StoredRecording]]:
+    total_size = sum(x.size for x in recordings)
+    if total_size <= max_size:
+        return ([], recordings)
+
+    # Building the heap is linear and we only pop as many recordings as need to be deleted
+    heap = list(recordings)
+    heapq.heapify(heap)
+    deleted: List[StoredRecording] = []
+    while heap and total_size > max_size:
+        recording = heapq.heappop(heap)
+        deleted.append(recording)
+        total_size -= recording.size
+    return (deleted, heap)
+
+
+def delete_recordings(output_dir: str, recordings: Iterable[StoredRecording], update_journal: bool) -> None:
+    """
+    Deletes the recordings. The metadata file is deleted first, so that a partially deleted recording is no longer listed.
+    Segment files are rewritten once without all recordings to delete
+    """
+    recordings = list(recordings)
+    # segment file -> names
+    segment_members: Dict[str, List[str]] = {}
+    for recording in recordings:
+        for path in sorted(recording.files, key=lambda x: not x.endswith(".json")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if recording.segment_file:
+            segment_members.setdefault(recording.segment_file, []).append(recording.name)
+
+    for segment_file, names in segment_members.items():
+        remove_segment_members(segment_file, names)
+
+    remove_sidecars(x.get_metadata_file() for x in recordings)
+
+    if update_journal and recordings:
+        append_journal_events(output_dir, [build_delete_event(output_dir, [x.get_metadata_file() for x in recordings])])
+
+    if os.path.isdir(os.path.join(output_dir, BLOB_DIR_NAME)):
+        # Outputs, that were only used by the deleted recordings, are no longer needed
+        collect_garbage(output_dir)
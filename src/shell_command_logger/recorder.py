@@ -3,10 +3,16 @@ import json
 import os
 import time
 import secrets
+from typing import Optional
 
 from shell_command_logger.logger.base_class import RecordingOptions
 # local
+from . import print_error, PROCESS_START_TIME
 from .config import SclConfig
+from .dedup import deduplicate_log_file
+from .journal import append_journal_events, build_update_event, get_journal_file
+from .pretty_exec import write_json, main as run_and_write_metadata
+from .sidecar import start_sidecar_creation
 from shell_command_logger.backports import List
 
 
@@ -22,17 +28,83 @@ def encode_command(command_and_arguments: List[str]) -> str:
     return encoded_command.decode("utf-8")
 
 
-# TODO: properly parse the options
-def record_command(scl_config: SclConfig, command_and_arguments: List[str], output_file: str, options: RecordingOptions = RecordingOptions()) -> int:
+def get_recording_options(scl_config: SclConfig) -> RecordingOptions:
+    return RecordingOptions(
+        output_limit=scl_config.script_output_limit,
+        output_limit_mode=scl_config.output_limit_mode,
+        output_tail_limit=scl_config.output_tail_limit,
+    )
+
+
+def record_metadata_only(scl_config: SclConfig, command_and_arguments: List[str], output_file: str) -> int:
+    """
+    Runs the command without a logger backend, so only the metadata file is written (and no output or timing files)
+    """
+    journal_file = get_journal_file(scl_config.output_dir) if scl_config.metadata_journal else None
+    try:
+        return run_and_write_metadata(command_and_arguments, f"{output_file}.json", journal_file, scl_config.metadata_write_policy,
+            scl_start_time=PROCESS_START_TIME, extra_metadata={"output_recorded": False}, in_process=True)
+    except KeyboardInterrupt:
+        return 2
+
+
+def record_command(scl_config: SclConfig, command_and_arguments: List[str], output_file: str, options: Optional[RecordingOptions] = None) -> int:
     pretty_exec = os.path.join(REAL_SCRIPT_DIR, "pretty_exec.py")
     encoded_command = encode_command(command_and_arguments)
     inner_command = ["python3", pretty_exec, encoded_command, f"{output_file}.json"]
+    if scl_config.metadata_journal:
+        inner_command += ["--journal", get_journal_file(scl_config.output_dir)]
+    inner_command += ["--write-policy", scl_config.metadata_write_policy]
+    inner_command += ["--scl-start-time", repr(PROCESS_START_TIME)]
 
     try:
-        return scl_config.backend.log_command(inner_command, output_file, options)
+        backend_launch_time = time.monotonic()
+        status_code = scl_config.backend.log_command(inner_command + ["--backend-launch-time", repr(backend_launch_time)], output_file, options or get_recording_options(scl_config))
     except KeyboardInterrupt:
         return 2
 
+    new_metadata = dict(scl_config.backend.last_recording_info)
+    # Completes the timings written by pretty_exec.py
+    new_metadata["timings"] = {"backend_exit": round(time.monotonic() - PROCESS_START_TIME, 6)}
+    if os.path.exists(f"{output_file}.log"):
+        # Stored in the metadata, so that `scl stats` does not need to access every log file.
+        # The backend may still write to the log (buffered output, the last line) until it exits, so the size is only known here
+        new_metadata["output_bytes"] = os.path.getsize(f"{output_file}.log")
+    if scl_config.deduplicate_output and os.path.exists(f"{output_file}.log"):
+        try:
+            new_metadata["output_digest"] = deduplicate_log_file(scl_config.output_dir, f"{output_file}.log")
+        except Exception:
+            print_error(f"Failed to deduplicate output file '{output_file}.log'", print_stacktrace=True)
+
+    if new_metadata:
+        update_metadata_file(scl_config, f"{output_file}.json", new_metadata)
+    if scl_config.plain_text_sidecars and os.path.exists(f"{output_file}.json"):
+        try:
+            start_sidecar_creation(f"{output_file}.json")
+        except Exception:
+            print_error(f"Failed to start creating the plain text sidecar for '{output_file}.log'", print_stacktrace=True)
+    return status_code
+
+
+def update_metadata_file(scl_config: SclConfig, metadata_file: str, new_values: dict) -> None:
+    """
+    Adds values to the metadata, after the recorded command has finished
+    """
+    try:
+        with open(metadata_file, "r") as f:
+            data = json.load(f)
+        for key, value in new_values.items():
+            # Objects are merged, so that the journal event also contains the complete value
+            if isinstance(value, dict) and isinstance(data.get(key), dict):
+                new_values[key] = {**data[key], **value}
+        data.update(new_values)
+        write_json(metadata_file, data, scl_config.metadata_write_policy)
+
+        if scl_config.metadata_journal:
+            append_journal_events(scl_config.output_dir, [build_update_event(scl_config.output_dir, metadata_file, new_values)])
+    except Exception:
+        print_error(f"Failed to update metadata file '{metadata_file}'", print_stacktrace=True)
+
 
 def get_timestamp_filename(scl_config: SclConfig) -> str:
     now = time.gmtime()
@@ -0,0 +1,120 @@
+import os
+import time
+from typing import NamedTuple, Optional
+# local files
+from .backports import Dict
+
+# Recording policies limit how often programs, that are called very often (for example by scripts), are recorded.
+# They are configured in the `[recording-policies]` section of the config file: `<program> = every=10 max-per-minute=30 metadata-only-above=60`
+#
+# The calls of each program are counted per minute in `<data_directory>/.call-counters/<program>/<minute>`.
+# Each call appends a single byte to the file, which is atomic with O_APPEND. The file offset after the write is the unique number of the call (ticket),
+# so no locks are needed and the decision only costs one open and one write.
+POLICY_SECTION = "recording-policies"
+# Used for all programs without their own policy
+DEFAULT_POLICY_KEY = "*"
+COUNTER_DIR_NAME = ".call-counters"
+
+DECISION_RECORD = "record"
+DECISION_METADATA_ONLY = "metadata-only"
+DECISION_SKIP = "skip"
+
+_KEY_EVERY = "every"
+_KEY_MAX_PER_MINUTE = "max-per-minute"
+_KEY_METADATA_ONLY_ABOVE = "metadata-only-above"
+
+
+class RecordingPolicyException(Exception):
+    pass
+
+
+class RecordingPolicy(NamedTuple):
+    # Only every Nth call in a minute is recorded
+    every: int = 1
+    # At most this many calls (after sampling) are recorded per minute
+    max_per_minute: Optional[int] = None
+    # Calls after this many calls in a minute only store the metadata
+    metadata_only_above: Optional[int] = None
+
+
+def parse_recording_policy(text: str) -> RecordingPolicy:
+    values: Dict[str, int] = {}
+    for item in text.split():
+        key, separator, value = item.partition("=")
+        if not separator or key not in [_KEY_EVERY, _KEY_MAX_PER_MINUTE, _KEY_METADATA_ONLY_ABOVE]:
+            raise RecordingPolicyException(f"Invalid rule '{item}'. Expected {_KEY_EVERY}=<N>, {_KEY_MAX_PER_MINUTE}=<N> or {_KEY_METADATA_ONLY_ABOVE}=<N>")
+        try:
+            values[key] = int(value)
+        except ValueError:
+            raise RecordingPolicyException(f"The value of '{key}' needs to be an integer, but is '{value}'")
+
+    policy = RecordingPolicy(
+        every=values.get(_KEY_EVERY, 1),
+        max_per_minute=values.get(_KEY_MAX_PER_MINUTE),
+        metadata_only_above=values.get(_KEY_METADATA_ONLY_ABOVE),
+    )
+    if policy.every < 1:
+        raise RecordingPolicyException(f"'{_KEY_EVERY}' needs to be at least 1")
+    if policy.max_per_minute is not None and policy.max_per_minute < 0:
+        raise RecordingPolicyException(f"'{_KEY_MAX_PER_MINUTE}' can not be negative")
+    if policy.metadata_only_above is not None and policy.metadata_only_above < 0:
+        raise RecordingPolicyException(f"'{_KEY_METADATA_ONLY_ABOVE}' can not be negative")
+    return policy
+
+
+def get_policy_text(policies: Dict[str, str], program: str) -> Optional[str]:
+    # The config parser stores keys in lower case
+    return policies.get(program.lower(), policies.get(DEFAULT_POLICY_KEY))
+
+
+def take_ticket(output_dir: str, program: str) -> int:
+    """
+    Counts the call and returns its number in the current minute (starting with 1)
+    """
+    minute = time.strftime("%Y%m%d%H%M", time.gmtime())
+    counter_dir = os.path.join(output_dir, COUNTER_DIR_NAME, program)
+    counter_file = os.path.join(counter_dir, minute)
+    try:
+        fd = os.open(counter_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        os.makedirs(counter_dir, exist_ok=True)
+        fd = os.open(counter_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, b".")
+        # With O_APPEND the file position is the end of our byte
+        ticket = os.lseek(fd, 0, os.SEEK_CUR)
+    finally:
+        os.close(fd)
+
+    if ticket == 1:
+        # The first call in a minute removes the counters of older minutes
+        for name in os.listdir(counter_dir):
+            if name < minute:
+                try:
+                    os.remove(os.path.join(counter_dir, name))
+                except FileNotFoundError:
+                    # Removed by a different call at the same time
+                    pass
+    return ticket
+
+
+def decide(policy: RecordingPolicy, ticket: int) -> str:
+    """
+    Calls skipped by `every` or `max-per-minute` are not recorded at all. Of the other calls, the ones above `metadata-only-above` only store the metadata
+    """
+    if (ticket - 1) % policy.every != 0:
+        return DECISION_SKIP
+    sampled_number = (ticket - 1) // policy.every + 1
+    if policy.max_per_minute is not None and sampled_number > policy.max_per_minute:
+        return DECISION_SKIP
+    if policy.metadata_only_above is not None and ticket > policy.metadata_only_above:
+        return DECISION_METADATA_ONLY
+    return DECISION_RECORD
+
+
+def get_recording_decision(output_dir: str, policies: Dict[str, str], program: str) -> str:
+    policy_text = get_policy_text(policies, program)
+    if policy_text is None:
+        # Programs without a policy are not counted
+        return DECISION_RECORD
+    return decide(parse_recording_policy(policy_text), take_ticket(output_dir, program))
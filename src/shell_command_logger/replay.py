@@ -1,7 +1,7 @@
-import glob
 import json
 import os
 import shlex
+import shutil
 import subprocess
 from typing import Optional, Callable
 
@@ -9,8 +9,10 @@ from shell_command_logger.logger.base_class import ReplayOptions
 # local
 from . import print_error, print_color
 from .config import SclConfig, _KEY_FZF_EXECUTABLE
-from .search import parse_metadata, Metadata
-from .backports import List, Tuple
+from .selector import BUILTIN_SELECTOR, SelectorException, select_label
+from .search import parse_metadata, Metadata, map_data_directories
+from .storage import list_metadata_files, materialized_recording, read_recording_file, recording_file_exists
+from .backports import Dict, List, Tuple
 
 # @TODO: always only accept/pass the .json file, since the other files may have arbitrary extensions (could be stuff like .tar.gs)
 
@@ -21,14 +23,19 @@ PRETT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
 def replay_command(output_file: str, scl_config: SclConfig, only_show_original_output: bool = False, skip_replay: bool = False) -> int:
     output_file = remove_extension(output_file)
     metadata_file = f"{output_file}.json"
-    metadata = None if only_show_original_output or not os.path.exists(metadata_file) else parse_metadata(metadata_file)
+    metadata = None if only_show_original_output or not recording_file_exists(metadata_file) else parse_metadata(metadata_file)
     
     if metadata:
         print_header(metadata)
+        if not metadata.output_recorded:
+            print_color("[scl] The output was not recorded because of the recording policy for this program", "yellow", bold=True)
+            print_footer(metadata)
+            return 0
 
     try:
         options = ReplayOptions(replay_speed=scl_config.replay_speed, instant_replay=skip_replay)
-        exit_code = scl_config.backend.replay_command(output_file, options)
+        with materialized_recording(output_file) as replay_file:
+            exit_code = scl_config.backend.replay_command(replay_file, options)
 
         if metadata:
             print_footer(metadata)
@@ -56,6 +63,11 @@ def print_footer(metadata: Metadata) -> None:
         color = "green" if metadata.status_code == 0 else "red"
         print_color(f"[scl] Exited at {end_time} with code {metadata.status_code}", color, bold=True)
 
+    if metadata.output_truncation:
+        dropped_bytes = metadata.output_truncation.get("dropped_bytes", "?")
+        total_bytes = metadata.output_truncation.get("total_bytes", "?")
+        print_color(f"[scl] Output was truncated: {dropped_bytes} of {total_bytes} bytes were not recorded", "yellow", bold=True)
+
 
 def remove_extension(path: str) -> str:
     for extension in EXTENSIONS:
@@ -64,18 +76,29 @@ def remove_extension(path: str) -> str:
     return path
 
 
-def get_command_file_list(scl_config: SclConfig) -> List[str]:
-    pattern = os.path.join(scl_config.output_dir, "**", "*.json")
-    return glob.glob(pattern, recursive=True)
+def get_command_file_list(scl_config: SclConfig, directories: Optional[List[str]] = None) -> List[str]:
+    """
+    Lists the metadata files in the given data directories (by default only the data directory)
+    """
+    if not directories:
+        return list_metadata_files(scl_config.output_dir)
+    results: List[str] = []
+    for metadata_files in map_data_directories(list_metadata_files, directories):
+        results += metadata_files
+    return results
 
 
 def format_filename(metadata_file: str) -> str:
     return metadata_file
 
 
-def format_command_builder(scl_config: SclConfig) -> Callable:
+def format_command_builder(scl_config: SclConfig, metadata_by_file: Optional[Dict[str, dict]] = None) -> Callable:
+    """
+    If the metadata of the files is already known (like for search results), it can be passed to avoid reading every metadata file again
+    """
+    metadata_by_file = metadata_by_file or {}
     def format_function(metadata_file: str) -> str:
-        return CommandFormater(metadata_file).format_command(scl_config.command_format)
+        return CommandFormater(metadata_file, metadata_by_file.get(metadata_file)).format_command(scl_config.command_format)
     return format_function
 
 
@@ -88,8 +111,9 @@ def select_formatted(scl_config: SclConfig, format_function: Callable[[str], str
         only_choice = log_files[0]
         return os.path.join(scl_config.output_dir, only_choice)
     else:
-        log_files = [os.path.join(scl_config.output_dir, x) for x in sorted(log_files)]
-        log_file_labels = [format_function(x).strip() for x in log_files]
+        log_files, log_file_labels = build_labels(scl_config, format_function, log_files)
+        if use_builtin_selector(scl_config.fzf_executable):
+            return select_with_builtin_selector(log_files, log_file_labels)
         # use fzf to let the user select the file
         log_files_labels_text = "\n".join(sorted(log_file_labels))
         # Pass choices via stdin, read result from stdout, pass through stderr to show the menu
@@ -109,10 +133,43 @@ def select_formatted(scl_config: SclConfig, format_function: Callable[[str], str
             return None
 
 
+def use_builtin_selector(fzf_command: str) -> bool:
+    if fzf_command.strip() == BUILTIN_SELECTOR:
+        return True
+    try:
+        program = shlex.split(fzf_command)[0]
+    except (ValueError, IndexError):
+        return False
+    # Commands like 'VAR=value fzf' can not be checked this easily, so they are just run
+    if "=" not in program and not shutil.which(program):
+        print_color(f"[scl] '{program}' not found, using the built-in selector. Set {_KEY_FZF_EXECUTABLE} to '{BUILTIN_SELECTOR}' to hide this message", "yellow")
+        return True
+    return False
+
+
+def select_with_builtin_selector(log_files: List[str], log_file_labels: List[str]) -> Optional[str]:
+    # Show the labels in the same order as they are passed to fzf
+    order = sorted(range(len(log_file_labels)), key=lambda index: log_file_labels[index])
+    try:
+        choice = select_label([log_file_labels[index] for index in order], "Replay command> ")
+    except SelectorException as ex:
+        print_color(f"[ERROR] {ex}", "red", bold=True)
+        return None
+    return None if choice is None else log_files[order[choice]]
+
+
+def build_labels(scl_config: SclConfig, format_function: Callable[[str], str], log_files: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Returns the sorted full paths of the log files and the label for each of them
+    """
+    log_files = [os.path.join(scl_config.output_dir, x) for x in sorted(log_files)]
+    log_file_labels = [format_function(x).strip() for x in log_files]
+    return (log_files, log_file_labels)
+
+
 class CommandFormater:
-    def __init__(self, metadata_file: str) -> None:
-        with open(metadata_file, "r") as f:
-            self.metadata = json.load(f)
+    def __init__(self, metadata_file: str, metadata: Optional[dict] = None) -> None:
+        self.metadata = metadata if metadata != None else json.loads(read_recording_file(metadata_file))
 
     def get_time(self, name: str) -> str:
         time = self.metadata.get(name, "<unknown time>")
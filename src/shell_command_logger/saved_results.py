@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+import gzip
+import json
+import os
+import re
+# local files
+from .search import SearchableCommand, metadata_to_dict, parse_metadata_dict
+from .backports import List
+
+# Saved search results are stored in `<data_directory>/.saved-results/<name>.jsonl.gz`.
+# The first line contains information about the search, every other line one result: [metadata file, metadata].
+# The metadata is a snapshot from the time of the search. It is enough to filter the results again and to show them in the replay selection,
+# so using a saved result set does not need to read the data directory.
+SAVED_RESULTS_DIR_NAME = ".saved-results"
+_SAVED_RESULTS_EXTENSION = ".jsonl.gz"
+_SAVED_RESULTS_VERSION = 1
+_NAME_REGEX = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+class SavedResultsException(Exception):
+    pass
+
+
+def get_saved_results_file(output_dir: str, name: str) -> str:
+    if not _NAME_REGEX.match(name):
+        raise SavedResultsException(f"Invalid name '{name}'. Names may only contain letters, digits, '_', '-' and '.' and may not start with '.'")
+    return os.path.join(output_dir, SAVED_RESULTS_DIR_NAME, name + _SAVED_RESULTS_EXTENSION)
+
+
+def list_saved_results(output_dir: str) -> List[str]:
+    try:
+        file_names = os.listdir(os.path.join(output_dir, SAVED_RESULTS_DIR_NAME))
+    except FileNotFoundError:
+        return []
+    return sorted(x[:-len(_SAVED_RESULTS_EXTENSION)] for x in file_names if x.endswith(_SAVED_RESULTS_EXTENSION))
+
+
+def save_results(output_dir: str, name: str, commands: List[SearchableCommand], query: List[str]) -> str:
+    """
+    Stores the results under the given name and replaces older results with the same name. Returns the path of the file
+    """
+    path = get_saved_results_file(output_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {
+        "version": _SAVED_RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat("Z", timespec="seconds"),
+        "query": query,
+        "count": len(commands),
+    }
+    with gzip.open(f"{path}.tmp", "wt") as f:
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        for command in commands:
+            # Paths inside the data directory are stored relative to it, so that the data directory can be moved
+            file_path = command.file_path
+            if not os.path.relpath(file_path, output_dir).startswith(".."):
+                file_path = os.path.relpath(file_path, output_dir)
+            f.write(json.dumps([file_path, metadata_to_dict(command.metadata)], separators=(",", ":")) + "\n")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def load_results(output_dir: str, name: str) -> List[SearchableCommand]:
+    path = get_saved_results_file(output_dir, name)
+    try:
+        f = gzip.open(path, "rt")
+    except FileNotFoundError:
+        raise SavedResultsException(f"No saved results with name '{name}'. Saved results: {', '.join(list_saved_results(output_dir)) or 'none'}")
+
+    results: List[SearchableCommand] = []
+    with f:
+        try:
+            header = json.loads(f.readline())
+            if header.get("version") != _SAVED_RESULTS_VERSION:
+                raise SavedResultsException(f"The saved results '{name}' have an unsupported version. Please search again")
+            for line in f:
+                file_path, data = json.loads(line)
+                results.append(SearchableCommand(os.path.join(output_dir, file_path), parse_metadata_dict(data)))
+        except (OSError, ValueError) as ex:
+            raise SavedResultsException(f"Failed to read saved results '{path}': {ex}")
+    return results
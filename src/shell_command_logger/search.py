@@ -1,13 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from enum import Enum
-import glob
+import heapq
 import json
 import os
 import sys
-from typing import NamedTuple, Optional
+import time
+from typing import Callable, Iterator, NamedTuple, Optional, TypeVar
 # local modules
 from shell_command_logger.config import SclConfig
-from .backports import List
+from .daemon import get_recordings_from_daemon
+from .debug import profile_span
+from .journal import JournalRecord, complete_unfinished_metadata, read_journal, rebuild_journal
+from .storage import list_metadata_files, open_recording_file, read_recording_file
+from .backports import Dict, List, Tuple
 
 
 class Metadata(NamedTuple):
@@ -19,13 +25,30 @@ class Metadata(NamedTuple):
     error_message: Optional[str]
     status_code: int
     working_dir: Optional[str]
+    # Only set if the output was larger than the output limit and the head-tail mode was used
+    output_truncation: Optional[dict] = None
+    # Only set for commands from the journal, that have not finished yet
+    running: bool = False
+    # Only set if the output was deduplicated. Recordings with the same digest have the same output
+    output_digest: Optional[str] = None
+    # Size of the log file, stored when the recording finished. Older recordings do not have it
+    output_bytes: Optional[int] = None
+    # Seconds since the start of the scl process for each phase of the recording (see pretty_exec.py). Older recordings do not have it
+    timings: Optional[Dict[str, float]] = None
+    # False for recordings, that only store the metadata because of a recording policy (see recording_policy.py)
+    output_recorded: bool = True
 
 
 # TODO: Move to a new metadata module
 def parse_metadata(file_path: str) -> Metadata:
-    with open(file_path, "r") as f:
-        data = json.load(f)
-    
+    try:
+        data = json.loads(read_recording_file(file_path))
+    except FileNotFoundError:
+        raise Exception(f"Metadata file does not exist: '{file_path}'")
+    return parse_metadata_dict(data)
+
+
+def parse_metadata_dict(data: dict) -> Metadata:
     try:
         command = data["command"]
         if type(command) == list:
@@ -50,6 +73,12 @@ def parse_metadata(file_path: str) -> Metadata:
             raise Exception(f"Field 'status_code' should be an integer, but is '{type(status_code)}'")
 
         working_dir = data.get("working_dir") # introduced later, so it may not be in all recordings
+        output_truncation = data.get("output_truncation")
+        if output_truncation != None and type(output_truncation) != dict:
+            raise Exception(f"Field 'output_truncation' should be None or an object, but is '{type(output_truncation)}'")
+        timings = data.get("timings")
+        if timings != None and type(timings) != dict:
+            raise Exception(f"Field 'timings' should be None or an object, but is '{type(timings)}'")
 
         return Metadata(
             command=command,
@@ -60,13 +89,44 @@ def parse_metadata(file_path: str) -> Metadata:
             error_message=error_message,
             status_code=status_code,
             working_dir=working_dir,
+            output_truncation=output_truncation,
+            running=data.get("running") == True,
+            output_digest=data.get("output_digest"),
+            output_bytes=data.get("output_bytes"),
+            timings=timings,
+            output_recorded=data.get("output_recorded", True) != False,
         )
-    except FileNotFoundError:
-        raise Exception(f"Metadata file does not exist: '{file_path}'")
     except KeyError as ex:
         raise Exception(f"Metadata is missing required key: {ex}")
 
 
+def metadata_to_dict(metadata: Metadata) -> dict:
+    """
+    The opposite of `parse_metadata_dict()`. Optional fields, that are not set, are left out
+    """
+    data = {
+        "command": metadata.command,
+        "user": metadata.user,
+        "hostname": metadata.hostname,
+        # Same format as pretty_exec.current_timestamp()
+        "start_time": metadata.start_time_utc.isoformat("Z", timespec="seconds"),
+        "working_dir": metadata.working_dir,
+        "end_time": metadata.end_time_utc.isoformat("Z", timespec="seconds"),
+        "error_message": metadata.error_message,
+        "status_code": metadata.status_code,
+    }
+    optional_fields = {
+        "output_truncation": metadata.output_truncation,
+        "running": metadata.running or None,
+        "output_digest": metadata.output_digest,
+        "output_bytes": metadata.output_bytes,
+        "timings": metadata.timings,
+        "output_recorded": None if metadata.output_recorded else False,
+    }
+    data.update({key: value for key, value in optional_fields.items() if value != None})
+    return data
+
+
 def _get_string_field(data: dict, key: str) -> str:
     field = data[key]
     if type(field) == str:
@@ -76,24 +136,126 @@ def _get_string_field(data: dict, key: str) -> str:
 
 
 class SearchableCommand:
-    def __init__(self, metadata_file: str) -> None:
+    def __init__(self, metadata_file: str, metadata: Optional[Metadata] = None) -> None:
         self.file_path = metadata_file
-        self.metadata = parse_metadata(metadata_file)
+        self.metadata = metadata or parse_metadata(metadata_file)
+
+
+def get_all_searchable_commands(scl_config: SclConfig, include_unfinished: bool = False) -> List[SearchableCommand]:
+    with profile_span("get_all_searchable_commands"):
+        return get_searchable_commands_from_directory(scl_config.output_dir, scl_config.metadata_journal, create_journal=True, use_daemon=True, include_unfinished=include_unfinished)
+
+
+def get_searchable_commands_from_directory(output_dir: str, use_journal: bool, create_journal: bool, use_daemon: bool = False, include_unfinished: bool = False) -> List[SearchableCommand]:
+    """
+    Asks the daemon (if use_daemon is set and it is running). Otherwise reads the journal of the data directory if it exists or all metadata files.
+    create_journal should only be used for the own data directory, since it writes to the directory.
+    Recordings, that have not finished (yet), are only known from the journal. Their metadata file does not exist, so they are only returned if include_unfinished is set
+    """
+    if use_daemon:
+        daemon_commands = get_searchable_commands_from_daemon(output_dir, use_journal, include_unfinished)
+        if daemon_commands is not None:
+            return daemon_commands
 
+    if use_journal:
+        journal_records = read_journal(output_dir)
+        if journal_records is None and create_journal:
+            # The journal does not exist yet or was created by recordings before the journal was enabled
+            print("Creating the journal for the data directory. This may take a while", file=sys.stderr)
+            rebuild_journal(output_dir)
+            journal_records = read_journal(output_dir)
+        if journal_records is not None:
+            return get_searchable_commands_from_journal(output_dir, journal_records, include_unfinished)
 
-def get_all_searchable_commands(scl_config: SclConfig) -> List[SearchableCommand]:
     results: List[SearchableCommand] = []
-    search_pattern = os.path.join(scl_config.output_dir, "**", "*.json")
-
-    for file_path in glob.glob(search_pattern, recursive=True):
-        try:
-            r = SearchableCommand(file_path)
-            results.append(r)
-        except Exception as ex:
-            print(f"Error parsing metadata file '{file_path}': ", ex, file=sys.stderr)
+    metadata_files = list_metadata_files(output_dir)
+    with profile_span("parse_metadata_files"):
+        for file_path in metadata_files:
+            try:
+                r = SearchableCommand(file_path)
+                results.append(r)
+            except Exception as ex:
+                print(f"Error parsing metadata file '{file_path}': ", ex, file=sys.stderr)
     return results
 
 
+def get_searchable_commands_from_daemon(output_dir: str, use_journal: bool, include_unfinished: bool = False) -> Optional[List[SearchableCommand]]:
+    """
+    Returns None, if no daemon is running for the data directory
+    """
+    with profile_span("query_daemon"):
+        recordings = get_recordings_from_daemon(output_dir, use_journal, include_unfinished)
+    if recordings is None:
+        return None
+
+    results: List[SearchableCommand] = []
+    with profile_span("parse_daemon_response"):
+        for file_path, data in recordings:
+            try:
+                results.append(SearchableCommand(file_path, parse_metadata_dict(data)))
+            except Exception as ex:
+                print(f"Error parsing metadata of '{file_path}' received from the daemon: ", ex, file=sys.stderr)
+    return results
+
+
+def get_searchable_commands_from_journal(output_dir: str, journal_records: List[JournalRecord], include_unfinished: bool = False) -> List[SearchableCommand]:
+    results: List[SearchableCommand] = []
+    with profile_span("parse_journal_records"):
+        for record in journal_records:
+            if not include_unfinished and not record.is_finished():
+                continue
+            file_path = os.path.join(output_dir, record.metadata_path)
+            try:
+                metadata = parse_metadata_dict(complete_unfinished_metadata(record))
+                results.append(SearchableCommand(file_path, metadata))
+            except Exception as ex:
+                print(f"Error parsing journal entry for '{file_path}': ", ex, file=sys.stderr)
+    return results
+
+
+_T = TypeVar("_T")
+
+def map_data_directories(function: Callable[[str], _T], directories: List[str]) -> List[_T]:
+    """
+    Calls the function for each data directory with one thread per directory and returns the results in the same order.
+    Most of the time is spent waiting for the (network) filesystem, so the directories are scanned in parallel despite the GIL
+    """
+    if len(directories) == 1:
+        return [function(directories[0])]
+    with ThreadPoolExecutor(max_workers=len(directories), thread_name_prefix="scl-scan") as executor:
+        return list(executor.map(function, directories))
+
+
+def _get_start_time(command: SearchableCommand) -> datetime:
+    return command.metadata.start_time_utc
+
+
+def get_searchable_commands_from_directories(scl_config: SclConfig, directories: List[str], include_unfinished: bool = False) -> List[SearchableCommand]:
+    """
+    Searches multiple data directories at the same time. The journals of the other directories are used if they are complete, but never created.
+    If more than one directory is given, the results are sorted by their start time
+    """
+    with profile_span("get_searchable_commands_from_directories"):
+        own_directory = os.path.abspath(scl_config.output_dir)
+        if len(directories) == 1 and os.path.abspath(directories[0]) == own_directory:
+            return get_all_searchable_commands(scl_config, include_unfinished)
+
+        def scan(directory: str) -> List[SearchableCommand]:
+            if not os.path.isdir(directory):
+                print(f"Error searching data directory '{directory}': ", "Directory does not exist", file=sys.stderr)
+                return []
+            is_own_directory = os.path.abspath(directory) == own_directory
+            commands = get_searchable_commands_from_directory(directory, scl_config.metadata_journal, create_journal=is_own_directory, use_daemon=is_own_directory, include_unfinished=include_unfinished)
+            # Journals are almost sorted already, which makes sorting them cheap
+            commands.sort(key=_get_start_time)
+            return commands
+
+        results_per_directory = map_data_directories(scan, directories)
+        with profile_span("merge_data_directories"):
+            # k-way merge of the sorted lists
+            return list(heapq.merge(*results_per_directory, key=_get_start_time))
+
+
 class RelativeTime(Enum):
     BEFORE = -1
     DURING = 0
@@ -132,16 +294,79 @@ def get_command_output(log_file_path: str) -> bytes:
     Returns only the command output from a log file. This assumes, that the file uses the normal script format.
     If the advanced mode is used, then scriptreplay will need to be used.
     """
-    with open(log_file_path, "rb") as f:
-        file_bytes = f.read()
+    return b"".join(iterate_command_output(log_file_path))
 
-    if file_bytes.startswith(b"Script started on"):
-        first_line_end = file_bytes.index(b"\n") + 1
+
+# The "Script done on" line is searched in this many bytes at the end of the file
+_LAST_LINE_SEARCH_SIZE = 100
+
+def iterate_command_output(log_file_path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Like `get_command_output()`, but yields the output in chunks instead of reading the whole file into memory.
+    Since the end of the output is only known at the end of the file, an exception may be raised after some chunks were yielded
+    """
+    with open_recording_file(log_file_path) as f:
+        if not f.readline().startswith(b"Script started on"):
+            raise Exception("Unexpected file format. Expected file to start with 'Script started on ...'")
+
+        # The newline at the end of the first line is the start of the "Script done on" line, if the command had no output.
+        # So it is added to the buffer, but never yielded
+        pending = b"\n"
+        skip = 1
+        while chunk := f.read(chunk_size):
+            pending += chunk
+            # Hold back the end, since it may contain the "Script done on" line
+            if len(pending) - _LAST_LINE_SEARCH_SIZE > skip:
+                yield pending[skip:-_LAST_LINE_SEARCH_SIZE]
+                pending = pending[-_LAST_LINE_SEARCH_SIZE:]
+                skip = 0
 
         # A heuristic for checking, if the last line is "Script done on"
-        last_line_start = file_bytes.rindex(b"\nScript done on", -100)
+        last_line_start = pending.rindex(b"\nScript done on", -_LAST_LINE_SEARCH_SIZE)
+        if last_line_start > skip:
+            yield pending[skip:last_line_start]
 
-        # Remove the "Script started" / "Script ended" lines
-        return file_bytes[first_line_end:last_line_start]
-    else:
-        raise Exception("Unexpected file format. Expected file to start with 'Script started on ...'")
+
+def get_export_end(commands: List[SearchableCommand], now: int) -> int:
+    """
+    Returns the end of the time range for incremental exports. Commands, that are still running, may finish with an end time before now,
+    but their metadata is only written after the export. They are exported next time, if the range ends before the first of them started
+    """
+    start_times = [int(x.metadata.start_time_utc.timestamp()) for x in commands if x.metadata.running]
+    return min([now] + start_times)
+
+
+def get_commands_for_export(scl_config: SclConfig) -> Tuple[List[SearchableCommand], int]:
+    """
+    Returns all commands and the end of the time range for an export. Unfinished commands are only included to compute the end of the time range.
+    Their end time is the current time, so they are never exported
+    """
+    now = int(time.time())
+    commands = get_all_searchable_commands(scl_config, include_unfinished=True)
+    return (commands, get_export_end(commands, now))
+
+
+class WatermarkException(Exception):
+    pass
+
+
+def read_watermark(watermark_file: str, default: Optional[int]) -> Optional[int]:
+    """
+    Returns the end of the time range of the last incremental export or the default, if the watermark file does not exist yet
+    """
+    if not os.path.exists(watermark_file):
+        return default
+    try:
+        with open(watermark_file, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError) as ex:
+        raise WatermarkException(f"Failed to read watermark file '{watermark_file}': {ex}")
+
+
+def write_watermark(watermark_file: str, watermark: int) -> None:
+    """
+    Stores the end of the time range after a successful export. Recordings that finished while we exported will be exported the next time
+    """
+    with open(f"{watermark_file}.tmp", "w") as f:
+        f.write(f"{watermark}\n")
+    os.replace(f"{watermark_file}.tmp", watermark_file)
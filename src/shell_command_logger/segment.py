@@ -0,0 +1,275 @@
+import io
+import json
+import os
+import re
+import struct
+import time
+from typing import BinaryIO, Optional
+# local files
+from .backports import Dict, List, Tuple
+
+# Segment files pack many recordings of one program and one week into a single file.
+# Layout: <magic> <member data ...> <offset table (JSON)> <footer>
+# The footer has a fixed size and contains the position of the offset table, so that a reader only needs to read the end of the file to find every member.
+SEGMENT_EXTENSION = ".sclseg"
+_MAGIC = b"SCLSEG01"
+# table offset, table length, magic
+_FOOTER = struct.Struct(">QQ8s")
+_COPY_BUFFER_SIZE = 1024 * 1024
+# Matches the week part of names created by recorder.get_timestamp_filename() (like 2022w22 in 2022w22g_123504_1144)
+_WEEK_REGEX = re.compile(r"^(\d{4}w\d{2})[a-g]_")
+
+# member name -> file extension -> (offset, length)
+MemberTable = Dict[str, Dict[str, Tuple[int, int]]]
+
+# The tables are small and never change while a segment exists (compaction replaces the whole file), so they are cached per process
+_TABLE_CACHE: Dict[str, MemberTable] = {}
+
+
+class SegmentException(Exception):
+    pass
+
+
+def get_week(recording_name: str) -> Optional[str]:
+    match = _WEEK_REGEX.match(recording_name)
+    return match.group(1) if match else None
+
+
+def split_segment_path(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Recordings inside a segment are addressed like files in a folder, for example `<dir>/2022w22.sclseg/2022w22g_123504_1144.json`.
+    For such a path return the segment file and the member file name. For normal files return None.
+    """
+    parent = os.path.dirname(path)
+    if parent.endswith(SEGMENT_EXTENSION):
+        return (parent, os.path.basename(path))
+    else:
+        return None
+
+
+def read_member_table(segment_file: str) -> MemberTable:
+    table = _TABLE_CACHE.get(segment_file)
+    if table is None:
+        with open(segment_file, "rb") as f:
+            table = _read_member_table(f, segment_file)
+        _TABLE_CACHE[segment_file] = table
+    return table
+
+
+def _read_member_table(f: BinaryIO, segment_file: str) -> MemberTable:
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    if file_size < len(_MAGIC) + _FOOTER.size:
+        raise SegmentException(f"Segment file is too small: '{segment_file}'")
+
+    f.seek(file_size - _FOOTER.size)
+    table_offset, table_length, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+    if magic != _MAGIC or table_offset + table_length > file_size:
+        raise SegmentException(f"Segment file has an invalid footer: '{segment_file}'")
+
+    f.seek(table_offset)
+    data = json.loads(f.read(table_length))
+    return {
+        name: {extension: (location[0], location[1]) for extension, location in extensions.items()}
+        for name, extensions in data["members"].items()
+    }
+
+
+def find_member(member_path: str) -> Tuple[str, int, int]:
+    """
+    Returns the segment file, offset and length of a file stored in a segment
+    """
+    split = split_segment_path(member_path)
+    if not split:
+        raise SegmentException(f"Path does not point into a segment: '{member_path}'")
+    segment_file, file_name = split
+    name, extension = os.path.splitext(file_name)
+    try:
+        offset, length = read_member_table(segment_file)[name][extension]
+        return (segment_file, offset, length)
+    except (KeyError, FileNotFoundError):
+        raise FileNotFoundError(f"File does not exist: '{member_path}'")
+
+
+class _MemberReader(io.RawIOBase):
+    """
+    Reads a byte range of a segment file as if it was a normal file
+    """
+    def __init__(self, f: BinaryIO, offset: int, length: int) -> None:
+        super().__init__()
+        self._f = f
+        self._position = offset
+        self._end = offset + length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        remaining = self._end - self._position
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:remaining]
+        self._f.seek(self._position)
+        count = self._f.readinto(view) # type: ignore
+        self._position += count
+        return count
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def open_member(member_path: str) -> BinaryIO:
+    segment_file, offset, length = find_member(member_path)
+    return io.BufferedReader(_MemberReader(open(segment_file, "rb"), offset, length), _COPY_BUFFER_SIZE) # type: ignore
+
+
+def _copy(source: BinaryIO, destination: BinaryIO, length: Optional[int] = None) -> int:
+    copied = 0
+    while length is None or copied < length:
+        chunk_size = _COPY_BUFFER_SIZE if length is None else min(_COPY_BUFFER_SIZE, length - copied)
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        destination.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+class SegmentWriter:
+    """
+    Writes a new segment file. The data is written to a temporary file, which replaces the final file atomically when the writer is closed.
+    """
+    def __init__(self, segment_file: str) -> None:
+        self.segment_file = segment_file
+        self.temp_file = f"{segment_file}.tmp"
+        self.members: MemberTable = {}
+        self._f = open(self.temp_file, "wb")
+        self._f.write(_MAGIC)
+
+    def add_member(self, name: str, extension: str, source: BinaryIO, length: Optional[int] = None) -> None:
+        offset = self._f.tell()
+        copied = _copy(source, self._f, length)
+        self.members.setdefault(name, {})[extension] = (offset, copied)
+
+    def close(self) -> None:
+        table = json.dumps({"version": 1, "members": self.members}, separators=(",", ":")).encode()
+        table_offset = self._f.tell()
+        self._f.write(table)
+        self._f.write(_FOOTER.pack(table_offset, len(table), _MAGIC))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.temp_file, self.segment_file)
+        _TABLE_CACHE.pop(self.segment_file, None)
+
+    def abort(self) -> None:
+        self._f.close()
+        os.remove(self.temp_file)
+
+    def __enter__(self) -> "SegmentWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CompactionResult:
+    def __init__(self, segment_file: str) -> None:
+        self.segment_file = segment_file
+        # The names of the recordings, that were moved into the segment
+        self.recordings: List[str] = []
+        self.file_count = 0
+        self.byte_count = 0
+
+
+def compact_recordings(output_dir: str, older_than_seconds: float, dry_run: bool = False) -> List[CompactionResult]:
+    """
+    Packs all finished recordings, whose metadata file is older than the given age, into per-program and per-week segment files.
+    Recordings without a metadata file may still be running, so they are never touched.
+    """
+    cutoff = time.time() - older_than_seconds
+    results: List[CompactionResult] = []
+
+    for program_entry in os.scandir(output_dir):
+        # Skip files (like the README) and internal folders
+        if program_entry.name.startswith(".") or not program_entry.is_dir(follow_symlinks=False):
+            continue
+
+        # recording name -> extension -> directory entry
+        recordings: Dict[str, Dict[str, os.DirEntry]] = {}
+        for entry in os.scandir(program_entry.path):
+            if entry.is_file(follow_symlinks=False):
+                name, extension = os.path.splitext(entry.name)
+                if extension not in [SEGMENT_EXTENSION, ".tmp"]:
+                    recordings.setdefault(name, {})[extension] = entry
+
+        # week -> names
+        weeks: Dict[str, List[str]] = {}
+        for name, files in recordings.items():
+            week = get_week(name)
+            metadata_entry = files.get(".json")
+            if week and metadata_entry and metadata_entry.stat().st_mtime < cutoff:
+                weeks.setdefault(week, []).append(name)
+
+        for week, names in sorted(weeks.items()):
+            segment_file = os.path.join(program_entry.path, week + SEGMENT_EXTENSION)
+            result = CompactionResult(segment_file)
+            result.recordings = sorted(names)
+            for name in names:
+                for entry in recordings[name].values():
+                    result.file_count += 1
+                    result.byte_count += entry.stat().st_size
+
+            if not dry_run:
+                _write_segment(segment_file, names, recordings, program_entry.path)
+                # Only remove the loose files, after the segment was written successfully
+                for name in names:
+                    for entry in recordings[name].values():
+                        os.remove(entry.path)
+            results.append(result)
+
+    return results
+
+
+def _write_segment(segment_file: str, names: List[str], recordings: Dict[str, Dict[str, os.DirEntry]], directory: str) -> None:
+    old_members = read_member_table(segment_file) if os.path.exists(segment_file) else {}
+
+    with SegmentWriter(segment_file) as writer:
+        # Keep the recordings from an existing segment for the same week
+        if old_members:
+            new_names = set(names)
+            with open(segment_file, "rb") as old_segment:
+                for name, extensions in sorted(old_members.items()):
+                    if name not in new_names:
+                        for extension, (offset, length) in extensions.items():
+                            old_segment.seek(offset)
+                            writer.add_member(name, extension, old_segment, length)
+
+        for name in sorted(names):
+            for extension, entry in sorted(recordings[name].items()):
+                with open(os.path.join(directory, entry.name), "rb") as f:
+                    writer.add_member(name, extension, f)
+
+
+def remove_segment_members(segment_file: str, names: List[str]) -> None:
+    """
+    Rewrites a segment file without the given recordings. If no recordings remain, the segment file is deleted
+    """
+    old_members = read_member_table(segment_file)
+    removed_names = set(names)
+    remaining = {name: extensions for name, extensions in old_members.items() if name not in removed_names}
+    if not remaining:
+        os.remove(segment_file)
+        _TABLE_CACHE.pop(segment_file, None)
+        return
+
+    with SegmentWriter(segment_file) as writer:
+        with open(segment_file, "rb") as old_segment:
+            for name, extensions in sorted(remaining.items()):
+                for extension, (offset, length) in extensions.items():
+                    old_segment.seek(offset)
+                    writer.add_member(name, extension, old_segment, length)
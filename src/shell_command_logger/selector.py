@@ -0,0 +1,224 @@
+from contextlib import contextmanager
+import os
+import re
+import sys
+from typing import Iterator, Optional, Pattern
+# local files
+from .backports import List, Tuple
+# Not available on all platforms (for example Windows)
+try:
+    import curses
+except ImportError:
+    curses = None
+
+# Used as `fzf-command` to always use the built-in selector
+BUILTIN_SELECTOR = "builtin"
+
+_KEY_ENTER = ("\n", "\r")
+_KEY_ESCAPE = ("\x1b", "\x03", "\x07") # Escape, Ctrl-C, Ctrl-G
+_KEY_BACKSPACE = ("\x7f", "\x08")
+_KEY_CLEAR = "\x15" # Ctrl-U
+_KEY_UP = ("\x10", "\x0b") # Ctrl-P, Ctrl-K
+_KEY_DOWN = ("\x0e",) # Ctrl-N
+
+
+class SelectorException(Exception):
+    pass
+
+
+def compile_query(query: str) -> Pattern:
+    """
+    Returns a regex that matches all labels containing the characters of the query in the given order.
+    Each character matches its first occurrence after the previous character, so a match is as short as possible for its start position. The matched characters are captured for highlighting.
+    Like fzf the search is case insensitive unless the query contains upper case characters
+    """
+    parts = []
+    for index, char in enumerate(query):
+        if index > 0:
+            # Anything except the next character, so that the gap does not need backtracking
+            parts.append(f"[^{re.escape(char)}]*")
+        parts.append(f"({re.escape(char)})")
+    flags = 0 if query != query.lower() else re.IGNORECASE
+    return re.compile("".join(parts), flags)
+
+
+class FuzzyMatcher:
+    """
+    Filters labels incrementally: When a character is added to the query, only the survivors of the previous query need to be checked.
+    The results of each prefix of the query are kept, so removing characters does not require any work
+    """
+    def __init__(self, labels: List[str]) -> None:
+        self.labels = labels
+        # Stack of (query, indices of the matching labels ordered by score). Each query is a prefix of the next one
+        self._results: List[Tuple[str, List[int]]] = [("", list(range(len(labels))))]
+
+    def filter(self, query: str) -> List[int]:
+        while not query.startswith(self._results[-1][0]):
+            self._results.pop()
+
+        previous_query, candidates = self._results[-1]
+        if query != previous_query:
+            regex = compile_query(query)
+            scored = []
+            for index in candidates:
+                match = regex.search(self.labels[index])
+                if match:
+                    # Short matches first, then matches near the start, then short labels
+                    scored.append((match.end() - match.start(), match.start(), len(self.labels[index]), index))
+            scored.sort()
+            candidates = [x[3] for x in scored]
+            self._results.append((query, candidates))
+        return candidates
+
+
+@contextmanager
+def terminal_on_standard_streams() -> Iterator[None]:
+    """
+    Curses uses stdin and stdout. If they are redirected (for example `scl replay | less`), use the controlling terminal instead.
+    This also works over SSH, since only a TTY is required
+    """
+    if sys.stdin.isatty() and sys.stdout.isatty():
+        yield
+        return
+
+    try:
+        tty_fd = os.open("/dev/tty", os.O_RDWR)
+    except OSError as ex:
+        raise SelectorException(f"The built-in selector requires a terminal: {ex}")
+
+    sys.stdout.flush()
+    saved_fds = (os.dup(0), os.dup(1))
+    try:
+        os.dup2(tty_fd, 0)
+        os.dup2(tty_fd, 1)
+        yield
+    finally:
+        os.dup2(saved_fds[0], 0)
+        os.dup2(saved_fds[1], 1)
+        for fd in [*saved_fds, tty_fd]:
+            os.close(fd)
+
+
+def select_label(labels: List[str], prompt: str = "> ") -> Optional[int]:
+    """
+    Lets the user select one of the labels. Returns the index of the selected label or None, if the selection was cancelled
+    """
+    if curses is None:
+        raise SelectorException("The built-in selector requires the 'curses' module, which is not available on this platform")
+
+    # Otherwise curses waits a full second after escape is pressed, to see if it is the start of an escape sequence
+    os.environ.setdefault("ESCDELAY", "25")
+    with terminal_on_standard_streams():
+        try:
+            return curses.wrapper(lambda screen: _Selector(screen, labels, prompt).run())
+        except curses.error as ex:
+            raise SelectorException(f"Terminal error: {ex}")
+        except KeyboardInterrupt:
+            return None
+
+
+class _Selector:
+    def __init__(self, screen, labels: List[str], prompt: str) -> None:
+        self.screen = screen
+        self.labels = labels
+        self.prompt = prompt
+        self.matcher = FuzzyMatcher(labels)
+        self.query = ""
+        self.results = self.matcher.filter("")
+        # Index into results. The visible window starts at `offset`
+        self.cursor = 0
+        self.offset = 0
+
+    def run(self) -> Optional[int]:
+        while True:
+            self.draw()
+            key = self.screen.get_wch()
+            # Handle all keys, that were typed while the last query was filtered, before filtering again.
+            # This way typing stays responsive, even if filtering a long list takes longer than a key stroke
+            self.screen.nodelay(True)
+            query = self.query
+            try:
+                while key is not None:
+                    if key in _KEY_ENTER:
+                        return self.results[self.cursor] if self.results else None
+                    elif key in _KEY_ESCAPE:
+                        return None
+                    elif key in _KEY_BACKSPACE or key == curses.KEY_BACKSPACE:
+                        query = query[:-1]
+                    elif key == _KEY_CLEAR:
+                        query = ""
+                    # The best result is shown at the bottom, so moving up selects worse results
+                    elif key in _KEY_UP or key == curses.KEY_UP:
+                        self.cursor += 1
+                    elif key in _KEY_DOWN or key == curses.KEY_DOWN:
+                        self.cursor -= 1
+                    elif key == curses.KEY_PPAGE:
+                        self.cursor += self.window_height()
+                    elif key == curses.KEY_NPAGE:
+                        self.cursor -= self.window_height()
+                    elif isinstance(key, str) and key.isprintable():
+                        query += key
+                    try:
+                        key = self.screen.get_wch()
+                    except curses.error:
+                        # No more keys are waiting
+                        key = None
+            finally:
+                self.screen.nodelay(False)
+
+            if query != self.query:
+                self.query = query
+                self.results = self.matcher.filter(query)
+                self.cursor = 0
+
+    def window_height(self) -> int:
+        # The last two lines are used by the status line and the prompt
+        height, _ = self.screen.getmaxyx()
+        return max(1, height - 2)
+
+    def draw(self) -> None:
+        height, width = self.screen.getmaxyx()
+        window_height = self.window_height()
+        self.cursor = max(0, min(self.cursor, len(self.results) - 1))
+        # Scroll the window, so that the cursor stays visible
+        if self.cursor < self.offset:
+            self.offset = self.cursor
+        elif self.cursor >= self.offset + window_height:
+            self.offset = self.cursor - window_height + 1
+        self.offset = max(0, min(self.offset, len(self.results) - window_height))
+
+        self.screen.erase()
+        regex = compile_query(self.query) if self.query else None
+        # Like fzf the best match is shown at the bottom, next to the prompt. Only the visible part of the results is rendered
+        for row, index in enumerate(self.results[self.offset:self.offset + window_height]):
+            y = window_height - 1 - row
+            selected = self.offset + row == self.cursor
+            self._draw_label(y, width, self.labels[index], regex, selected)
+
+        status = f"  {len(self.results)}/{len(self.labels)}"
+        self._add_string(height - 2, 0, status[:width - 1], curses.A_DIM)
+        prompt_line = f"{self.prompt}{self.query}"
+        # Keep the end of a long query visible
+        prompt_line = prompt_line[-(width - 1):] if width > 1 else ""
+        self._add_string(height - 1, 0, prompt_line, curses.A_BOLD)
+        self.screen.move(height - 1, min(len(prompt_line), width - 1))
+        self.screen.refresh()
+
+    def _draw_label(self, y: int, width: int, label: str, regex: Optional[Pattern], selected: bool) -> None:
+        base_attributes = curses.A_REVERSE if selected else curses.A_NORMAL
+        marker = "> " if selected else "  "
+        text = (marker + label.replace("\t", " "))[:width - 1]
+        self._add_string(y, 0, text, base_attributes)
+        match = regex.search(label) if regex else None
+        if match:
+            for group in range(1, len(match.groups()) + 1):
+                x = match.start(group) + len(marker)
+                if x < len(text):
+                    self._add_string(y, x, text[x], base_attributes | curses.A_BOLD | curses.A_UNDERLINE)
+
+    def _add_string(self, y: int, x: int, text: str, attributes: int) -> None:
+        try:
+            self.screen.addstr(y, x, text, attributes)
+        except curses.error:
+            # Writing to the bottom right corner raises an error, even though the text is shown
+            pass
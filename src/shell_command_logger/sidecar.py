@@ -0,0 +1,157 @@
+import argparse
+import gzip
+import os
+import re
+import subprocess
+import sys
+from typing import Iterable, Iterator
+# local files
+from .search import iterate_command_output
+from .segment import split_segment_path
+from .backports import List, Tuple
+
+# Plain text copies of the outputs are stored in `<data_directory>/.plain-text/<program>/<name>.txt.gz`.
+# They do not contain escape sequences (colors, cursor movement, window titles) and lines overwritten with carriage returns (like progress bars) only contain what was visible at the end.
+# They are stored outside of the program folders, so that compacting recordings into segments does not change their path.
+# Outputs do not change after a recording finished, so an existing sidecar is always up to date.
+SIDECAR_DIR_NAME = ".plain-text"
+SIDECAR_EXTENSION = ".txt.gz"
+
+# CSI (colors, cursor movement), OSC terminated by BEL or ST (window titles, links), character set selection and other two byte sequences
+_ESCAPE_SEQUENCE_REGEX = re.compile(rb"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b\n]*(?:\x07|\x1b\\)?|[()*+].|[ -/]*[0-~])")
+# Control characters except backspace, tab, newline and carriage return, which change what is visible
+_CONTROL_CHARACTER_REGEX = re.compile(rb"[\x00-\x07\x0b\x0c\x0e-\x1f\x7f]")
+# A character followed by a backspace is not visible
+_BACKSPACE_REGEX = re.compile(rb"[^\x08]\x08")
+
+
+def get_sidecar_file(metadata_file: str) -> str:
+    """
+    Works for recordings in any data directory, since the data directory is derived from the path of the metadata file
+    """
+    split = split_segment_path(metadata_file)
+    program_dir = os.path.dirname(split[0]) if split else os.path.dirname(metadata_file)
+    name = os.path.basename(metadata_file)[:-len(".json")]
+    return os.path.join(os.path.dirname(program_dir), SIDECAR_DIR_NAME, os.path.basename(program_dir), name + SIDECAR_EXTENSION)
+
+
+def normalize_line(line: bytes) -> bytes:
+    line = _ESCAPE_SEQUENCE_REGEX.sub(b"", line)
+    line = _CONTROL_CHARACTER_REGEX.sub(b"", line)
+    if b"\x08" in line:
+        previous = None
+        while previous != line:
+            previous, line = line, _BACKSPACE_REGEX.sub(b"", line)
+        line = line.replace(b"\x08", b"")
+    # Terminals end lines with \r\n
+    line = line.rstrip(b"\r")
+    if b"\r" in line:
+        # Each part overwrites the beginning of the line
+        visible = b""
+        for part in line.split(b"\r"):
+            visible = part + visible[len(part):]
+        line = visible
+    return line
+
+
+def normalize_output(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Yields the plain text of an output. Only complete lines are normalized, so that escape sequences split between chunks are recognized
+    """
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if lines:
+            yield b"".join(normalize_line(line) + b"\n" for line in lines)
+    if pending:
+        yield normalize_line(pending)
+
+
+def create_sidecar(log_file: str, sidecar_file: str) -> int:
+    """
+    Writes the plain text of the output of a log file to a sidecar file. Returns the size of the plain text
+    """
+    os.makedirs(os.path.dirname(sidecar_file), exist_ok=True)
+    size = 0
+    temp_file = f"{sidecar_file}.{os.getpid()}.tmp"
+    try:
+        with gzip.open(temp_file, "wb") as f:
+            for chunk in normalize_output(iterate_command_output(log_file)):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(temp_file, sidecar_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return size
+
+
+def create_missing_sidecars(metadata_files: List[str], force: bool = False) -> Tuple[int, int]:
+    """
+    Creates the sidecars of all given recordings, that do not have one yet. Returns the number of created sidecars and of failures
+    """
+    created, failed = 0, 0
+    for metadata_file in metadata_files:
+        sidecar_file = get_sidecar_file(metadata_file)
+        if not force and os.path.exists(sidecar_file):
+            continue
+        log_file = metadata_file[:-len(".json")] + ".log"
+        try:
+            create_sidecar(log_file, sidecar_file)
+            created += 1
+        except Exception as ex:
+            print(f"Error creating plain text sidecar for '{log_file}': ", ex, file=sys.stderr)
+            failed += 1
+    return (created, failed)
+
+
+def remove_sidecars(metadata_files: Iterable[str]) -> None:
+    for metadata_file in metadata_files:
+        try:
+            os.remove(get_sidecar_file(metadata_file))
+        except FileNotFoundError:
+            pass
+
+
+def remove_orphaned_sidecars(output_dir: str, metadata_files: List[str], dry_run: bool = False) -> int:
+    """
+    Deletes the sidecars of recordings, that no longer exist. Returns the number of deleted sidecars
+    """
+    expected = set(get_sidecar_file(x) for x in metadata_files)
+    count = 0
+    for directory, _, file_names in os.walk(os.path.join(output_dir, SIDECAR_DIR_NAME)):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            # Temporary files may belong to a sidecar, that is created right now
+            if path not in expected and not file_name.endswith(".tmp"):
+                count += 1
+                if not dry_run:
+                    os.remove(path)
+    return count
+
+
+def iterate_sidecar(sidecar_file: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with gzip.open(sidecar_file, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def start_sidecar_creation(metadata_file: str) -> None:
+    """
+    Creates the sidecar in a detached process, so that the shell does not have to wait for it
+    """
+    package_parent_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    python_path = os.pathsep.join([package_parent_dir] + [x for x in [os.environ.get("PYTHONPATH")] if x])
+    subprocess.Popen([sys.executable, "-m", "shell_command_logger.sidecar", metadata_file],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True, env={**os.environ, "PYTHONPATH": python_path})
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("metadata_file", help="the metadata file of the recording to create the plain text sidecar for")
+    args = ap.parse_args()
+
+    _, failed = create_missing_sidecars([args.metadata_file])
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,73 @@
+import math
+# local files
+from .backports import Dict
+
+# A histogram with logarithmically sized buckets. Every bucket covers the values from gamma^(i-1) to gamma^i,
+# so the quantiles returned by it differ at most by RELATIVE_ACCURACY from the real values.
+# The number of buckets only depends on the range of the values (about 1500 buckets for durations between a millisecond and a year),
+# and two sketches can be merged by adding the counts of their buckets. This makes it possible to store sketches per program and day
+# and combine them later, instead of keeping all durations.
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Smaller durations are counted as zero
+_MIN_VALUE = 0.001
+
+
+class DurationSketch:
+    def __init__(self) -> None:
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.max = max(self.max, seconds)
+        if seconds < _MIN_VALUE:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(seconds) / _LOG_GAMMA)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "DurationSketch") -> None:
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.max = max(self.max, other.max)
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Returns the approximate value, that is larger than the given fraction (0 to 1) of all values
+        """
+        if self.count == 0:
+            return 0.0
+        rank = quantile * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # The value in the middle of the bucket (relative to the bucket size) has the lowest relative error
+                return min(2 * _GAMMA ** index / (_GAMMA + 1), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            # JSON objects only allow strings as keys
+            "buckets": {str(index): count for index, count in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "max": self.max,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "DurationSketch":
+        sketch = DurationSketch()
+        sketch.buckets = {int(index): count for index, count in data["buckets"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.max = data["max"]
+        return sketch
@@ -0,0 +1,311 @@
+from datetime import datetime
+import json
+import os
+import sys
+from typing import BinaryIO, Callable, Iterable, Optional
+# local files
+from .journal import _replay_events, get_journal_file, is_init_event
+from .search import Metadata, SearchableCommand
+from .sketch import DurationSketch
+from .storage import get_recording_file_size
+from .backports import Dict, List, Tuple
+
+# Functions that return the group, that a command belongs to
+GROUP_BY_FUNCTIONS: Dict[str, Callable[[Metadata], str]] = {
+    "program": lambda metadata: os.path.basename(metadata.command[0]),
+    "user": lambda metadata: metadata.user,
+    "host": lambda metadata: metadata.hostname,
+    "status": lambda metadata: str(metadata.status_code),
+    "day": lambda metadata: metadata.start_time_utc.strftime("%Y-%m-%d"),
+}
+# The time spent by scl itself: (name, first phase, last phase). The phases are stored in the timings of the metadata
+OVERHEAD_PHASES = [
+    # Python startup, loading the config, starting the backend and the wrapper script
+    ("startup", "scl_start", "child_exec"),
+    # Writing the metadata and stopping the backend. The deduplication and the metadata update run after backend_exit, so they are not included
+    ("shutdown", "child_exit", "backend_exit"),
+]
+
+
+class GroupStats:
+    """
+    Aggregated values for a group of commands. Values are added one command at a time, so no list of commands needs to be kept
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.count = 0
+        self.failures = 0
+        self.total_duration_seconds = 0.0
+        self.output_bytes = 0
+        self.durations = DurationSketch()
+        # Only contain recordings with timings
+        self.overheads = {name: DurationSketch() for name, _, _ in OVERHEAD_PHASES}
+        self.total_overhead = DurationSketch()
+
+    def add(self, metadata: Metadata, output_bytes: int) -> None:
+        self.count += 1
+        if metadata.status_code != 0:
+            self.failures += 1
+        duration = (metadata.end_time_utc - metadata.start_time_utc).total_seconds()
+        self.total_duration_seconds += duration
+        self.durations.add(duration)
+        self.output_bytes += output_bytes
+        if metadata.timings:
+            self.add_overhead(metadata.timings)
+
+    def add_overhead(self, timings: Dict[str, float]) -> None:
+        # Recordings, that failed to start the command, do not have all phases
+        if not all(first in timings and last in timings for _, first, last in OVERHEAD_PHASES):
+            return
+        total = 0.0
+        for name, first, last in OVERHEAD_PHASES:
+            overhead = max(timings[last] - timings[first], 0.0)
+            self.overheads[name].add(overhead)
+            total += overhead
+        self.total_overhead.add(total)
+
+    def get_failure_rate(self) -> float:
+        return self.failures / self.count if self.count else 0.0
+
+    def get_mean_duration_seconds(self) -> float:
+        return self.total_duration_seconds / self.count if self.count else 0.0
+
+
+def get_output_bytes(command: SearchableCommand) -> int:
+    if command.metadata.output_bytes != None:
+        return command.metadata.output_bytes # type: ignore
+    if not command.metadata.output_recorded:
+        # Only the metadata was stored, there is no log file
+        return 0
+    # Older recordings: check the size of the log file
+    log_file = command.file_path[:-len(".json")] + ".log"
+    try:
+        return get_recording_file_size(log_file)
+    except FileNotFoundError:
+        return 0
+    except Exception as ex:
+        print(f"Error getting size of output file '{log_file}': ", ex, file=sys.stderr)
+        return 0
+
+
+def aggregate(commands: Iterable[SearchableCommand], group_by: str) -> List[GroupStats]:
+    """
+    Groups the commands and computes the statistics for each group in a single pass
+    """
+    get_group = GROUP_BY_FUNCTIONS[group_by]
+    groups: Dict[str, GroupStats] = {}
+    for command in commands:
+        if command.metadata.running:
+            # The end time and status code are not known yet
+            continue
+        name = get_group(command.metadata)
+        group = groups.get(name)
+        if not group:
+            group = groups[name] = GroupStats(name)
+        group.add(command.metadata, get_output_bytes(command))
+    return list(groups.values())
+
+
+def format_size(byte_count: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if byte_count < 1024:
+            return f"{byte_count:.0f} {unit}" if unit == "B" else f"{byte_count:.1f} {unit}"
+        byte_count /= 1024
+    return f"{byte_count:.1f} TiB"
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    elif seconds < 60:
+        return f"{seconds:.1f}s"
+    elif seconds < 60 * 60:
+        return f"{seconds / 60:.1f}m"
+    else:
+        return f"{seconds / 3600:.1f}h"
+
+
+# The duration index contains a duration sketch for each combination of program, host and day.
+# It is updated from the journal: only events, that were appended since the last update, need to be read.
+DURATION_INDEX_FILE_NAME = ".duration-index.json"
+_DURATION_INDEX_VERSION = 1
+# Groups, that can be computed from the keys of the duration index
+DURATION_INDEX_GROUPS = ["program", "host", "day"]
+
+
+def _new_duration_index() -> dict:
+    return {
+        "version": _DURATION_INDEX_VERSION,
+        # Used to detect when the journal was replaced (for example by `scl journal --rebuild`)
+        "journal_inode": None,
+        "offset": 0,
+        # recording id -> [key, start time] for recordings that have not finished yet
+        "pending": {},
+        # "<program>\t<host>\t<day>" -> sketch
+        "sketches": {},
+    }
+
+
+def _load_duration_index(index_file: str) -> dict:
+    try:
+        with open(index_file, "r") as f:
+            index = json.load(f)
+        if index.get("version") == _DURATION_INDEX_VERSION:
+            index["sketches"] = {key: DurationSketch.from_dict(value) for key, value in index["sketches"].items()}
+            return index
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        print(f"Error loading duration index '{index_file}': ", ex, file=sys.stderr)
+    return _new_duration_index()
+
+
+def _save_duration_index(index_file: str, index: dict) -> None:
+    data = dict(index)
+    data["sketches"] = {key: value.to_dict() for key, value in index["sketches"].items()}
+    try:
+        with open(f"{index_file}.tmp", "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(f"{index_file}.tmp", index_file)
+    except OSError as ex:
+        # The index is only a cache, so we can continue without it
+        print(f"Error saving duration index '{index_file}': ", ex, file=sys.stderr)
+
+
+def _get_index_key(data: dict) -> str:
+    day = data["start_time"][:len("YYYY-MM-DD")]
+    return "\t".join([os.path.basename(data["command"][0]), data["hostname"], day])
+
+
+def _get_duration_seconds(start_time: str, end_time: str) -> float:
+    return (datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)).total_seconds()
+
+
+def _add_to_index(index: dict, key: str, duration: float) -> None:
+    sketch = index["sketches"].get(key)
+    if not sketch:
+        sketch = index["sketches"][key] = DurationSketch()
+    sketch.add(duration)
+
+
+def _read_journal_events(index: dict, f: BinaryIO) -> bool:
+    """
+    Adds the durations of all recordings, that finished in the unread part of the journal.
+    Returns False, if recordings were deleted. Sketches can not remove values, so the index needs to be rebuilt with `_rebuild_duration_index()` in this case
+    """
+    pending = index["pending"]
+    for line in f:
+        if not line.endswith(b"\n"):
+            # A recording is just writing this line, we will read it next time
+            break
+        index["offset"] += len(line)
+        try:
+            event = json.loads(line)
+            event_type = event.get("event")
+            if event_type == "record":
+                if "status_code" in event:
+                    _add_to_index(index, _get_index_key(event), _get_duration_seconds(event["start_time"], event["end_time"]))
+                else:
+                    pending[event["id"]] = [_get_index_key(event), event["start_time"]]
+            elif event_type == "start":
+                pending[event["id"]] = [_get_index_key(event), event["start_time"]]
+            elif event_type == "end":
+                started = pending.pop(event["id"], None)
+                if started:
+                    key, start_time = started
+                    _add_to_index(index, key, _get_duration_seconds(start_time, event["end_time"]))
+            elif event_type == "delete":
+                return False
+        except Exception as ex:
+            print("Error parsing journal event for the duration index: ", ex, file=sys.stderr)
+    return True
+
+
+def _rebuild_duration_index(f: BinaryIO, first_line_length: int, journal_inode: int) -> dict:
+    """
+    Creates the index from the complete journal. The events are replayed like for searching, so deleted recordings are left out
+    """
+    index = _new_duration_index()
+    index["journal_inode"] = journal_inode
+    f.seek(first_line_length)
+    data = f.read()
+    # The last line may be incomplete, if it is written right now. It is read next time
+    data = data[:data.rfind(b"\n") + 1]
+    index["offset"] = first_line_length + len(data)
+
+    for record in _replay_events(data.splitlines()).values():
+        try:
+            if record.is_finished():
+                _add_to_index(index, _get_index_key(record.data), _get_duration_seconds(record.data["start_time"], record.data["end_time"]))
+            else:
+                index["pending"][record.recording_id] = [_get_index_key(record.data), record.data["start_time"]]
+        except Exception as ex:
+            print("Error parsing journal event for the duration index: ", ex, file=sys.stderr)
+    return index
+
+
+def update_duration_index(output_dir: str, save_index: bool = True) -> Optional[Dict[str, DurationSketch]]:
+    """
+    Brings the duration index up to date with the journal and returns its sketches.
+    Returns None, if the journal does not exist or is incomplete.
+    Use save_index=False for data directories, that should not be written to (an existing index is still used)
+    """
+    journal_file = get_journal_file(output_dir)
+    index_file = os.path.join(output_dir, DURATION_INDEX_FILE_NAME)
+    try:
+        f = open(journal_file, "rb")
+    except FileNotFoundError:
+        return None
+
+    with f:
+        first_line = f.readline()
+        if not is_init_event(first_line):
+            return None
+
+        index = _load_duration_index(index_file)
+        old_offset = index["offset"]
+        journal_stat = os.fstat(f.fileno())
+        if index["journal_inode"] != journal_stat.st_ino or index["offset"] > journal_stat.st_size:
+            index = _new_duration_index()
+
+        if index["offset"] > 0:
+            f.seek(index["offset"])
+        else:
+            index["journal_inode"] = journal_stat.st_ino
+            index["offset"] = len(first_line)
+        if not _read_journal_events(index, f):
+            index = _rebuild_duration_index(f, len(first_line), journal_stat.st_ino)
+
+    if index["offset"] != old_offset and save_index:
+        _save_duration_index(index_file, index)
+    return index["sketches"]
+
+
+def merge_duration_sketches(sketches_list: List[Dict[str, DurationSketch]]) -> Dict[str, DurationSketch]:
+    """
+    Merges the duration indexes of multiple data directories
+    """
+    if len(sketches_list) == 1:
+        return sketches_list[0]
+    merged: Dict[str, DurationSketch] = {}
+    for sketches in sketches_list:
+        for key, sketch in sketches.items():
+            if key not in merged:
+                merged[key] = DurationSketch()
+            merged[key].merge(sketch)
+    return merged
+
+
+def group_duration_sketches(sketches: Dict[str, DurationSketch], group_by: str) -> List[Tuple[str, DurationSketch]]:
+    """
+    Merges the sketches from the duration index into one sketch per program, host or day
+    """
+    position = DURATION_INDEX_GROUPS.index(group_by)
+    groups: Dict[str, DurationSketch] = {}
+    for key, sketch in sketches.items():
+        name = key.split("\t")[position]
+        group = groups.get(name)
+        if not group:
+            group = groups[name] = DurationSketch()
+        group.merge(sketch)
+    return list(groups.items())
@@ -0,0 +1,166 @@
+from contextlib import contextmanager
+import glob
+import os
+import sys
+import tempfile
+from typing import BinaryIO, Iterator
+# local files
+from .debug import profile_span
+from .dedup import REFERENCE_SUFFIX, get_reference_path, open_referenced_file
+from .segment import SEGMENT_EXTENSION, split_segment_path, read_member_table, open_member, find_member
+from .backports import List, Tuple
+
+# This module hides where the files of a recording are stored.
+# A recording is either a group of normal files (like `<name>.json`, `<name>.log`, `<name>.time`) or a member of a segment file.
+# Paths of segment members look like `<program_dir>/<week>.sclseg/<name>.json`, so callers can treat both cases the same.
+# In both cases a file may also be replaced by a reference to the deduplicated blob store (like `<name>.logref`).
+
+
+def list_metadata_files(output_dir: str) -> List[str]:
+    """
+    Returns the metadata file paths of all recordings. If a recording exists as normal files and in a segment, the normal files are used.
+    """
+    with profile_span("list_metadata_files"):
+        results: List[str] = []
+        segment_files: List[str] = []
+        _scan_directory(output_dir, results, segment_files)
+        loose_recordings = set(x[:-len(".json")] for x in results)
+
+        for segment_file in segment_files:
+            try:
+                members = read_member_table(segment_file)
+            except Exception as ex:
+                print(f"Error reading segment file '{segment_file}': ", ex, file=sys.stderr)
+                continue
+
+            directory = os.path.dirname(segment_file)
+            for name, extensions in members.items():
+                if ".json" in extensions and os.path.join(directory, name) not in loose_recordings:
+                    results.append(os.path.join(segment_file, name + ".json"))
+        return results
+
+
+def _scan_directory(directory: str, metadata_files: List[str], segment_files: List[str]) -> None:
+    """
+    Collects the metadata files and segment files in a single walk over the directory tree.
+    Hidden files and directories (like the blob store and the plain text copies) are skipped
+    """
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        if entry.name.endswith(".json"):
+            if entry.is_file():
+                metadata_files.append(entry.path)
+        elif entry.name.endswith(SEGMENT_EXTENSION):
+            if entry.is_file():
+                segment_files.append(entry.path)
+        elif entry.is_dir():
+            _scan_directory(entry.path, metadata_files, segment_files)
+
+
+def _open_stored_file(path: str) -> BinaryIO:
+    if split_segment_path(path):
+        return open_member(path)
+    else:
+        return open(path, "rb")
+
+
+def _open_recording_file_with_size(path: str) -> Tuple[BinaryIO, int]:
+    try:
+        f = _open_stored_file(path)
+        return (f, get_stored_file_size(path))
+    except FileNotFoundError:
+        reference_path = get_reference_path(path)
+        try:
+            with _open_stored_file(reference_path) as reference:
+                reference_data = reference.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File does not exist: '{path}'")
+        return open_referenced_file(reference_path, reference_data)
+
+
+def open_recording_file(path: str) -> BinaryIO:
+    f, _ = _open_recording_file_with_size(path)
+    return f
+
+
+def read_recording_file(path: str) -> bytes:
+    with open_recording_file(path) as f:
+        return f.read()
+
+
+def _stored_file_exists(path: str) -> bool:
+    if split_segment_path(path):
+        try:
+            find_member(path)
+            return True
+        except (FileNotFoundError, OSError):
+            return False
+    else:
+        return os.path.exists(path)
+
+
+def recording_file_exists(path: str) -> bool:
+    return _stored_file_exists(path) or _stored_file_exists(get_reference_path(path))
+
+
+def get_stored_file_size(path: str) -> int:
+    if split_segment_path(path):
+        _, _, length = find_member(path)
+        return length
+    else:
+        return os.path.getsize(path)
+
+
+def get_recording_file_size(path: str) -> int:
+    """
+    Returns the size of the original file. For deduplicated files, this is the size of the file before deduplication
+    """
+    try:
+        return get_stored_file_size(path)
+    except FileNotFoundError:
+        f, size = _open_recording_file_with_size(path)
+        f.close()
+        return size
+
+
+def get_stored_extensions(base_path: str) -> List[str]:
+    """
+    Returns the extensions of all stored files of a recording. References keep their own extension (like `.logref`)
+    """
+    split = split_segment_path(base_path)
+    if split:
+        segment_file, name = split
+        return list(read_member_table(segment_file).get(name, {}))
+    else:
+        return [os.path.splitext(x)[1] for x in glob.glob(glob.escape(base_path) + ".*")]
+
+
+def get_recording_extensions(base_path: str) -> List[str]:
+    extensions = get_stored_extensions(base_path)
+    return [x[:-len(REFERENCE_SUFFIX)] if x.endswith(REFERENCE_SUFFIX) else x for x in extensions]
+
+
+@contextmanager
+def materialized_recording(base_path: str) -> Iterator[str]:
+    """
+    Tools like `scriptreplay` need real files. For recordings stored in segments or deduplicated recordings the files are extracted to a temporary folder.
+    Yields a base path (without extension), for which all files of the recording exist on disk.
+    """
+    stored_extensions = get_stored_extensions(base_path)
+    if not split_segment_path(base_path) and not any(x.endswith(REFERENCE_SUFFIX) for x in stored_extensions):
+        yield base_path
+        return
+
+    with tempfile.TemporaryDirectory(prefix="scl-") as temp_dir:
+        temp_base_path = os.path.join(temp_dir, os.path.basename(base_path))
+        for extension in get_recording_extensions(base_path):
+            with open_recording_file(base_path + extension) as source:
+                with open(temp_base_path + extension, "wb") as destination:
+                    while chunk := source.read(1024 * 1024):
+                        destination.write(chunk)
+        yield temp_base_path
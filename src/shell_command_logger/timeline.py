@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple, Optional
+# local files
+from .backports import List, Tuple
+
+# Concurrency is computed with a sweep line: every command creates a start and an end event, the events are sorted by time
+# and a counter is increased for every start and decreased for every end. This needs O(n log n) time instead of comparing every pair of commands.
+# Like in search.is_running_during_timeframe() intervals are closed: a command ending at the same time another one starts counts as overlapping,
+# so at the same time start events are processed before end events.
+_EVENT_START = 0
+_EVENT_END = 1
+# Characters used to render the concurrency level, from lowest to highest
+_LEVEL_CHARACTERS = " ▁▂▃▄▅▆▇█"
+
+
+class ConcurrencyPoint(NamedTuple):
+    time: datetime
+    # Number of commands running at exactly this time
+    peak: int
+    # Number of commands running after this time (until the next point)
+    level_after: int
+
+
+def sweep(intervals: Iterable[Tuple[datetime, datetime]]) -> List[ConcurrencyPoint]:
+    """
+    Returns a point for each time where the number of running commands changes
+    """
+    events: List[Tuple[datetime, int]] = []
+    for start, end in intervals:
+        events.append((start, _EVENT_START))
+        events.append((end, _EVENT_END))
+    events.sort()
+
+    points: List[ConcurrencyPoint] = []
+    level = 0
+    index = 0
+    while index < len(events):
+        time = events[index][0]
+        while index < len(events) and events[index] == (time, _EVENT_START):
+            level += 1
+            index += 1
+        peak = level
+        while index < len(events) and events[index] == (time, _EVENT_END):
+            level -= 1
+            index += 1
+        points.append(ConcurrencyPoint(time, peak, level))
+    return points
+
+
+def get_peak(points: List[ConcurrencyPoint]) -> Optional[ConcurrencyPoint]:
+    """
+    Returns the first point with the highest number of running commands
+    """
+    peak: Optional[ConcurrencyPoint] = None
+    for point in points:
+        if not peak or point.peak > peak.peak:
+            peak = point
+    return peak
+
+
+def get_bucket_levels(points: List[ConcurrencyPoint], start: datetime, end: datetime, bucket_count: int) -> List[int]:
+    """
+    Splits the time window into buckets and returns the highest number of running commands in each bucket
+    """
+    bucket_size = max((end - start) / bucket_count, timedelta(microseconds=1))
+    levels = [0] * bucket_count
+    level_before = 0
+    point_index = 0
+    for bucket in range(bucket_count):
+        bucket_end = start + bucket_size * (bucket + 1)
+        highest = level_before
+        # The last bucket also contains the end of the window
+        while point_index < len(points) and (points[point_index].time < bucket_end or bucket == bucket_count - 1):
+            point = points[point_index]
+            if point.time >= start:
+                highest = max(highest, point.peak)
+            level_before = point.level_after
+            point_index += 1
+        levels[bucket] = highest
+    return levels
+
+
+def render_levels(levels: List[int], max_level: int) -> str:
+    if max_level == 0:
+        return _LEVEL_CHARACTERS[0] * len(levels)
+    highest_index = len(_LEVEL_CHARACTERS) - 1
+    # Every non-zero level gets at least the lowest bar, so that short commands are still visible
+    return "".join(_LEVEL_CHARACTERS[0 if level == 0 else max(1, round(level * highest_index / max_level))] for level in levels)